@@ -2,19 +2,43 @@ import random
 
 import numpy as np
 from datetime import datetime, timedelta
-from derivatives import Call, Put
+from contracts import ContractBook
+from derivatives import STRIKE_ITERATIONS, option_class, solve_strikes
+from instrumentation import NULL_INSTRUMENTATION
 from market import Asset
 
 
 class Bank:
-    def __init__(self, name, risk_free_rate=0.025):
+    def __init__(self, name, risk_free_rate=0.025, strike_solver='bisect'):
         self.name = name
         self.risk_free_rate = risk_free_rate
-        self.total_value = 0
-        self.derivatives_portfolio = []
+        self.strike_solver = strike_solver  # 'bisect' for the deterministic solver, 'random' for the random search
+        self.total_payouts = 0
+        self.book = ContractBook()
+        # Hedging account, used when the bank trades the underlyings of its book
+        self.cash = 0
+        self.stocks_portfolio = {}
+        self.event_log = None  # Set by EventLog.attach
+        self.instruments = NULL_INSTRUMENTATION  # Set by Instrumentation.attach
         self.today = datetime.now().date()  # Initialize today's date
 
-    def sell_option(self, option_type, asset, expiration_date, risk=1):
+    @property
+    def total_value(self):
+        """
+        float: Premiums collected for the options the holders actually bought, net of the options sold back. Quotes
+            and options nobody bought bring in nothing.
+        """
+        return self.book.premiums_received
+
+    @total_value.setter
+    def total_value(self, value):
+        self.book.premiums_received = value
+
+    def __getstate__(self):
+        # The event log and instrumentation belong to a run, not to the state of the game
+        return dict(self.__dict__, event_log=None, instruments=NULL_INSTRUMENTATION)
+
+    def sell_option(self, option_type, asset, expiration_date, risk=1, american=False):
         """
         Sell an option (either Call or Put) and add it to the bank's derivatives portfolio.
 
@@ -22,10 +46,14 @@ class Bank:
         option_type (str): Type of option to sell ('Call' or 'Put').
         asset (Asset): Asset object representing the underlying asset.
         expiration_date (str): Expiration date of the option (in YYYY-MM-DD format).
+        risk (float): Target premium of the option.
+        american (bool): Sell an American option, which the holder can exercise on any day until it expires.
 
         Returns:
         str: Confirmation message indicating the successful sale of the option.
         """
+        if self.strike_solver == 'bisect':
+            return self.sell_options([option_type], [asset], [expiration_date], risks=[risk], american=american)[0]
 
         # Calculate underlying price as the average of historical prices
         underlying_price = asset.price_history[-1]
@@ -33,9 +61,8 @@ class Bank:
         # Calculate risk-free rate (considering a constant rate for simplicity)
         risk_free_rate = 0.025  # Example rate, can be based on historical data or other factors
 
-        # Calculate volatility from historical prices
-        returns = np.diff(asset.price_history) / asset.price_history[:-1]
-        volatility = np.std(returns) * np.sqrt(252)  # Assuming 252 trading days in a year
+        # Volatility of the returns, kept up to date by the asset on every price update
+        volatility = asset.volatility
 
         # Calculate time to expiration
         time_to_expiration = (expiration_date - self.today).days / 365.25  # Time in years
@@ -44,36 +71,219 @@ class Bank:
             i = 1
             while premium < risk:
                 strike_price = underlying_price * random.uniform(1 - 0.001*i, 1 + 0.001*i)
-                option = Call(underlying_asset=asset.name,
-                              strike_price=strike_price,
-                              expiration_date=expiration_date,
-                              underlying_price=underlying_price,
-                              time_to_expiration=time_to_expiration,
-                              volatility=volatility,
-                              risk_free_rate=risk_free_rate
-                              )
+                option = option_class(True, american)(underlying_asset=asset.name,
+                                                      strike_price=strike_price,
+                                                      expiration_date=expiration_date,
+                                                      underlying_price=underlying_price,
+                                                      time_to_expiration=time_to_expiration,
+                                                      volatility=volatility,
+                                                      risk_free_rate=risk_free_rate
+                                                      )
                 premium = option.premium
                 i += 1
         elif option_type.lower() == 'put':
             i = 1
             while premium < risk:
                 strike_price = underlying_price * random.uniform(1 - 0.001*i, 1 + 0.001*i)
-                option = Put(underlying_asset=asset.name,
-                             strike_price=strike_price,
-                             expiration_date=expiration_date,
-                             underlying_price=underlying_price,
-                             time_to_expiration=time_to_expiration,
-                             volatility=volatility,
-                             risk_free_rate=risk_free_rate
-                             )
+                option = option_class(False, american)(underlying_asset=asset.name,
+                                                       strike_price=strike_price,
+                                                       expiration_date=expiration_date,
+                                                       underlying_price=underlying_price,
+                                                       time_to_expiration=time_to_expiration,
+                                                       volatility=volatility,
+                                                       risk_free_rate=risk_free_rate
+                                                       )
                 premium = option.premium
                 i += 1
         else:
             raise ValueError("Invalid option type. Please choose 'Call' or 'Put'.")
-        self.total_value += option.premium
-        self.derivatives_portfolio.append(option)
+        self.instruments.count('strike_search_iterations', i - 1)
+        self.instruments.count('options_sold')
+        ids = self.book.add([option])
+        if self.event_log is not None:
+            self.event_log.record_option_sales(self.book, ids, [0.0])  # The premium is paid when the option is bought
         return option
 
+    def sell_options(self, option_types, assets, expiration_dates, risks=1, american=False):
+        """
+        Sell a batch of options, solving the strikes of all of them at once.
+
+        The strike of each option is chosen so that its premium is (just above) the requested risk.
+
+        Parameters:
+        option_types (list): Types of the options to sell ('Call' or 'Put').
+        assets (list): Asset objects representing the underlying assets.
+        expiration_dates (list or datetime.date): Expiration dates of the options, or one date for all of them.
+        risks (array_like): Target premiums of the options.
+        american (bool): Sell American options, priced on the binomial lattice.
+
+        Returns:
+        list: The sold option objects, in the order of the requests.
+        """
+        option_types = [option_type.lower() for option_type in option_types]
+        if any(option_type not in ('call', 'put') for option_type in option_types):
+            raise ValueError("Invalid option type. Please choose 'Call' or 'Put'.")
+        if not isinstance(expiration_dates, (list, tuple)):
+            expiration_dates = [expiration_dates] * len(assets)
+
+        underlying_prices = np.array([asset.price_history[-1] for asset in assets], dtype=float)
+        volatilities = np.array([asset.volatility for asset in assets], dtype=float)
+        times_to_expiration = np.array([(expiration_date - self.today).days / 365.25
+                                        for expiration_date in expiration_dates])
+        is_call = np.array([option_type == 'call' for option_type in option_types])
+
+        strike_prices, premiums = solve_strikes(risks, underlying_prices, times_to_expiration, volatilities,
+                                                self.risk_free_rate, is_call, american=american)
+        self.instruments.count('strike_search_iterations', STRIKE_ITERATIONS * len(assets) * (1 + american))
+        self.instruments.count('options_sold', len(assets))
+
+        options = []
+        for i, asset in enumerate(assets):
+            options.append(option_class(is_call[i], american)(underlying_asset=asset.name,
+                                                              strike_price=float(strike_prices[i]),
+                                                              expiration_date=expiration_dates[i],
+                                                              underlying_price=underlying_prices[i],
+                                                              time_to_expiration=times_to_expiration[i],
+                                                              volatility=volatilities[i],
+                                                              risk_free_rate=self.risk_free_rate,
+                                                              premium=float(premiums[i])))
+        ids = self.book.add(options)
+        if self.event_log is not None:
+            self.event_log.record_option_sales(self.book, ids, np.zeros(len(ids)))  # Paid when bought
+        return options
+
+    def quote_option_arrays(self, is_call, underlying_prices, volatilities, expiration_date, risks=1, american=False):
+        """
+        Quote strikes and premiums for a batch of options given as arrays, without selling them.
+
+        Parameters:
+        is_call (numpy.ndarray): True for calls, False for puts.
+        underlying_prices (numpy.ndarray): Prices of the underlying assets.
+        volatilities (numpy.ndarray): Annualized volatilities of the underlying assets.
+        expiration_date (datetime.date): Expiration date of all the options.
+        risks (array_like): Target premiums of the options.
+        american (bool): Quote American options.
+
+        Returns:
+        tuple: Strike prices and premiums as NumPy arrays.
+        """
+        time_to_expiration = (expiration_date - self.today).days / 365.25
+        self.instruments.count('strike_search_iterations', STRIKE_ITERATIONS * len(underlying_prices) * (1 + american))
+        return solve_strikes(risks, underlying_prices, time_to_expiration, volatilities, self.risk_free_rate, is_call,
+                             american=american)
+
+    def sell_option_arrays(self, is_call, asset_names, asset_index, strike_prices, premiums, expiration_date,
+                           holder, slots, quantities, american=False):
+        """
+        Sell quoted options given as arrays to the accounts of a holder, booking them without option objects.
+
+        Parameters:
+        is_call (numpy.ndarray): True for calls, False for puts.
+        asset_names (list): Names of the assets that asset_index refers to.
+        asset_index (numpy.ndarray): Index of each option's underlying in asset_names.
+        strike_prices (numpy.ndarray): Strike prices from quote_option_arrays.
+        premiums (numpy.ndarray): Premiums from quote_option_arrays.
+        expiration_date (datetime.date): Expiration date of all the options.
+        holder (object): Holder of the options, e.g. an AgentPopulation.
+        slots (numpy.ndarray): Account of each option within the holder.
+        quantities (numpy.ndarray): Quantity bought of each option.
+        american (bool): The options are American.
+
+        Returns:
+        numpy.ndarray: Contract ids of the sold options.
+        """
+        self.instruments.count('options_sold', len(is_call))
+        ids = self.book.add_columns(is_call, asset_names, asset_index, strike_prices, expiration_date.toordinal(),
+                                    premiums, holder, slots, quantities, american)
+        if self.event_log is not None:
+            self.event_log.record_option_sales(self.book, ids, premiums * quantities)
+        return ids
+
+    @property
+    def derivatives_portfolio(self):
+        """
+        list: Option objects of the open contracts in the bank's book.
+        """
+        return self.book.open_contracts()
+
+    def settle_expired(self, current_date, assets):
+        """
+        Settle the contracts expiring up to the current date and pay their holders.
+
+        Parameters:
+        current_date (datetime.date): Current date.
+        assets (list): Asset objects, including every underlying in the book.
+
+        Returns:
+        tuple: Ids of the settled contracts and their payoffs.
+        """
+        settled, payoffs = self.book.settle(current_date, self.book.asset_prices(assets))
+        self.total_payouts += float(payoffs.sum())
+        self.instruments.count('contracts_settled', len(settled))
+        self.instruments.gauge('contracts_open', self.book.open_count)
+        if self.event_log is not None:
+            self.event_log.record_settlements(self.book, settled, payoffs)
+        return settled, payoffs
+
+    def exercise_option(self, holder, option, quantity, asset):
+        """
+        Exercise American options of a holder before they expire, paying their intrinsic value at the last price.
+
+        Parameters:
+        holder (Player): Holder of the options.
+        option (Derivative): American option sold by this bank.
+        quantity (int): Quantity to exercise, at most the quantity held.
+        asset (Asset): Underlying asset of the option.
+
+        Returns:
+        float: Payoff paid to the holder.
+        """
+        if not option.american:
+            raise ValueError("Only American options can be exercised before they expire.")
+        if option.book is not self.book or option.underlying_asset != asset.name:
+            raise ValueError("The option was not sold by this bank on this asset.")
+        if option.expiration_date < self.today:
+            raise ValueError("The option has expired.")
+        quantity = holder.derivatives_portfolio.remove(option, quantity)
+        if not quantity:
+            return 0.0
+        quantity, payoff = self.book.exercise(option.contract_id, quantity, asset.price_history[-1])
+        holder.cash += payoff
+        self.total_payouts += payoff
+        self.instruments.count('contracts_exercised', quantity)
+        self.instruments.gauge('contracts_open', self.book.open_count)
+        if self.event_log is not None:
+            self.event_log.record_exercise(holder, option.contract_id, quantity, payoff)
+        return payoff
+
+    def trade_stock(self, asset, quantity):
+        """
+        Buy (positive quantity) or sell (negative quantity) shares of an asset for the hedging account, at its last
+        price and without fees. The account may go short and its cash may go negative.
+
+        Parameters:
+        asset (Asset): Asset to trade.
+        quantity (int): Number of shares.
+        """
+        price = asset.price_history[-1]
+        self.stocks_portfolio[asset.name] = self.stocks_portfolio.get(asset.name, 0) + quantity
+        self.cash -= quantity * price
+        if self.event_log is not None:
+            self.event_log.record_stock_trade(self, asset.name, quantity, price, -quantity * price)
+
+    def calculate_hedge_value(self, assets):
+        """
+        Value of the hedging account: its cash and its stock positions at the last prices.
+
+        Parameters:
+        assets (list): Asset objects, including every asset the bank has traded.
+
+        Returns:
+        float: Value of the hedging account.
+        """
+        prices = {asset.name: asset.price_history[-1] for asset in assets}
+        return self.cash + sum(quantity * prices[name] for name, quantity in self.stocks_portfolio.items())
+
     def calculate_portfolio_value(self):
         """
         Calculate the total value of the bank's derivatives portfolio.
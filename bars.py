@@ -0,0 +1,177 @@
+import numpy as np
+
+FIELDS = ('open', 'high', 'low', 'close', 'variance')
+
+
+class BarAggregator:
+    """
+    Folds a stream of price ticks into OHLC bars of a fixed number of ticks, with realized-variance statistics.
+
+    Ticks are folded as they arrive, whole bars at a time through one reshape, and are never stored. Completed bars
+    are kept in a ring buffer of the last `capacity` bars, and the running sum of squared log returns over all ticks
+    gives the realized volatility of the whole stream, so memory stays bounded however many ticks pass through.
+    """
+    def __init__(self, last_prices, ticks_per_bar, capacity=256):
+        """
+        Parameters:
+        last_prices (array_like): Price of every asset before the first tick, the reference of the first return.
+        ticks_per_bar (int): Ticks folded into every bar.
+        capacity (int): Completed bars kept, the oldest ones are dropped first.
+        """
+        self.last = np.array(last_prices, dtype=float)
+        num_assets = len(self.last)
+        self.ticks_per_bar = ticks_per_bar
+        self.capacity = capacity
+        self.count = 0  # Completed bars so far, including the ones dropped from the buffer
+        self.ticks = 0
+        self.sum_squares = np.zeros(num_assets)  # Squared log returns of all ticks, per asset
+        for field in FIELDS:
+            setattr(self, field, np.zeros((capacity, num_assets)))
+        # Bar in progress
+        self.filled = 0
+        self._open = np.zeros(num_assets)
+        self._high = np.zeros(num_assets)
+        self._low = np.zeros(num_assets)
+        self._variance = np.zeros(num_assets)
+
+    def __getstate__(self):
+        # Snapshots keep only the bars stored so far
+        state = dict(self.__dict__)
+        for field in FIELDS:
+            state[field] = getattr(self, field)[:min(self.count, self.capacity)].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for field in FIELDS:
+            stored = getattr(self, field)
+            if len(stored) < self.capacity:
+                buffer = np.zeros((self.capacity, stored.shape[1]))
+                buffer[:len(stored)] = stored
+                setattr(self, field, buffer)
+
+    def update(self, ticks):
+        """
+        Fold a block of ticks into the bars.
+
+        Parameters:
+        ticks (numpy.ndarray): Prices with shape (ticks, assets), oldest first. The block may start and end anywhere
+            within a bar.
+        """
+        ticks = np.asarray(ticks, dtype=float)
+        if not len(ticks):
+            return
+        log_prices = np.log(ticks)
+        returns = np.diff(log_prices, axis=0, prepend=np.log(self.last)[None])
+        squares = returns * returns
+        self.sum_squares += squares.sum(axis=0)
+        self.ticks += len(ticks)
+        self.last = ticks[-1].copy()
+
+        # Finish the bar in progress
+        start = 0
+        if self.filled:
+            start = min(self.ticks_per_bar - self.filled, len(ticks))
+            self._extend(ticks[:start], squares[:start])
+            if self.filled == self.ticks_per_bar:
+                self._store(self._open[None], self._high[None], self._low[None], ticks[start - 1][None],
+                            self._variance[None])
+                self.filled = 0
+
+        # Whole bars in one pass
+        num_bars = (len(ticks) - start) // self.ticks_per_bar
+        if num_bars:
+            stop = start + num_bars * self.ticks_per_bar
+            bars = ticks[start:stop].reshape(num_bars, self.ticks_per_bar, -1)
+            variances = squares[start:stop].reshape(num_bars, self.ticks_per_bar, -1).sum(axis=1)
+            self._store(bars[:, 0], bars.max(axis=1), bars.min(axis=1), bars[:, -1], variances)
+            start = stop
+
+        # Start the next bar with what is left
+        if start < len(ticks):
+            self._extend(ticks[start:], squares[start:])
+
+    def realized_volatility(self, ticks_per_year):
+        """
+        Annualized realized volatility of every asset over all ticks so far, from the mean squared log return.
+
+        Parameters:
+        ticks_per_year (float): Ticks in a year, e.g. ticks per day times 252 trading days.
+
+        Returns:
+        numpy.ndarray: Volatility per asset, NaN before the first tick.
+        """
+        if not self.ticks:
+            return np.full(len(self.sum_squares), np.nan)
+        return np.sqrt(self.sum_squares / self.ticks * ticks_per_year)
+
+    def bars(self, num_bars=None):
+        """
+        The last completed bars, oldest first.
+
+        Parameters:
+        num_bars (int): Number of bars, all stored bars if None.
+
+        Returns:
+        dict: Arrays with shape (bars, assets) for open, high, low, close and the realized variance of every bar.
+        """
+        stored = min(self.count, self.capacity)
+        num_bars = stored if num_bars is None else min(num_bars, stored)
+        rows = np.arange(self.count - num_bars, self.count) % self.capacity
+        return {field: getattr(self, field)[rows] for field in FIELDS}
+
+    def merged(self, num_bars):
+        """
+        The last completed bars merged into one bar, e.g. the bars of one day into a daily bar.
+
+        Returns:
+        dict: Arrays with shape (assets,) for open, high, low, close and realized variance.
+        """
+        bars = self.bars(num_bars)
+        return {'open': bars['open'][0], 'high': bars['high'].max(axis=0), 'low': bars['low'].min(axis=0),
+                'close': bars['close'][-1], 'variance': bars['variance'].sum(axis=0)}
+
+    def _extend(self, ticks, squares):
+        if not len(ticks):
+            return
+        if self.filled == 0:
+            self._open = ticks[0].copy()
+            self._high = ticks.max(axis=0)
+            self._low = ticks.min(axis=0)
+            self._variance = squares.sum(axis=0)
+        else:
+            np.maximum(self._high, ticks.max(axis=0), out=self._high)
+            np.minimum(self._low, ticks.min(axis=0), out=self._low)
+            self._variance += squares.sum(axis=0)
+        self.filled += len(ticks)
+
+    def _store(self, opens, highs, lows, closes, variances):
+        # Only the bars that still fit in the ring buffer are written
+        keep = min(len(opens), self.capacity)
+        rows = np.arange(self.count + len(opens) - keep, self.count + len(opens)) % self.capacity
+        for field, values in zip(FIELDS, (opens, highs, lows, closes, variances)):
+            getattr(self, field)[rows] = values[-keep:]
+        self.count += len(opens)
+
+
+# Example usage:
+if __name__ == "__main__":
+    import time
+
+    # One year of one-second ticks for 5 assets, folded into 5-minute bars in blocks of one day
+    ticks_per_day = 6 * 3600
+    rng = np.random.default_rng(1)
+    aggregator = BarAggregator(np.full(5, 100.0), ticks_per_bar=300)
+    last = aggregator.last
+    start = time.perf_counter()
+    for _ in range(252):
+        ticks = last * np.exp(np.cumsum(0.2 / np.sqrt(252 * ticks_per_day) * rng.standard_normal((ticks_per_day, 5)),
+                                        axis=0))
+        aggregator.update(ticks)
+        last = ticks[-1]
+    elapsed = time.perf_counter() - start
+    print(f"{aggregator.ticks * 5:,} ticks in {elapsed:.2f}s, {aggregator.count:,} bars, "
+          f"{min(aggregator.count, aggregator.capacity)} kept")
+    print("Realized volatility:", aggregator.realized_volatility(252 * ticks_per_day).round(4))
+    last_bar = aggregator.bars(1)
+    print("Last bar:", {field: last_bar[field][0].round(2) for field in ('open', 'high', 'low', 'close')})
@@ -0,0 +1,338 @@
+import json
+import math
+import platform
+import random
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from bank import Bank
+from derivatives import Call
+from headless import SimulationConfig, run_headless
+from main import initialize_assets, simulate_day
+from market import Market
+from player import Player
+from strategies import AgentPopulation, RandomStockBuyer
+
+SEED = 2024
+TODAY = date(2024, 1, 2)  # Fixed date, so option times to expiration are the same in every run
+TOLERANCE = 0.25  # Relative slowdown against the baseline that counts as a regression
+
+
+class Benchmark:
+    """
+    A timed hot path with the parameters it scales over.
+
+    The setup builds fresh, seeded state for one repeat and returns the function to time, so benchmarks that change
+    their state (settling contracts, appending prices) time the same work in every repeat.
+    """
+    def __init__(self, name, setup, defaults, axes, number=1):
+        """
+        Parameters:
+        name (str): Name of the benchmark.
+        setup (callable): Called with a seed and the parameters, returns the function to time.
+        defaults (dict): Value of every parameter while another one is scaled.
+        axes (dict): Parameter names and the values to scale them over.
+        number (int): Calls of the timed function per repeat, the time is reported per call.
+        """
+        self.name = name
+        self.setup = setup
+        self.defaults = defaults
+        self.axes = axes
+        self.number = number
+
+    def cases(self):
+        """
+        Parameters of every case: each axis scaled over its values with the other parameters at their defaults.
+
+        Returns:
+        list: Tuples of the case key, the scaled axis and the parameters.
+        """
+        cases = []
+        for axis, values in self.axes.items():
+            for value in values:
+                params = dict(self.defaults, **{axis: value})
+                cases.append((f"{self.name}[{axis}={value}]", axis, params))
+        return cases
+
+    def run(self, params, repeats=5):
+        """
+        Time one case.
+
+        Returns:
+        float: Fastest time per call over the repeats, in seconds.
+        """
+        best = math.inf
+        for _ in range(repeats):
+            random.seed(SEED)
+            function = self.setup(SEED, **params)
+            start = time.perf_counter()
+            for _ in range(self.number):
+                function()
+            best = min(best, (time.perf_counter() - start) / self.number)
+        return best
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name, defaults, axes, number=1):
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, defaults, axes, number)
+        return setup
+    return register
+
+
+def _market(seed, num_assets, num_days=30):
+    # Assets with some price history, so volatilities are estimated from real returns
+    rng = random.Random(seed)
+    assets = initialize_assets(num_assets, rng)
+    market = Market.of(assets, seed=rng.getrandbits(64))
+    market.update_prices(num_days)
+    return assets, market
+
+
+def _bank():
+    bank = Bank(name="ABC Bank")
+    bank.today = TODAY
+    return bank
+
+
+@benchmark('calculate_premium', defaults={'num_options': 100}, axes={'num_options': (1, 100, 1000)})
+def setup_calculate_premium(seed, num_options):
+    rng = np.random.default_rng(seed)
+    option = Call(underlying_asset="Asset 1", strike_price=100, expiration_date=TODAY + timedelta(days=14),
+                  underlying_price=100, time_to_expiration=14 / 365.25, volatility=0.2, risk_free_rate=0.025)
+    inputs = list(zip(rng.uniform(90, 110, num_options).tolist(), rng.uniform(90, 110, num_options).tolist(),
+                      rng.uniform(0.01, 1, num_options).tolist(), rng.uniform(0.1, 0.5, num_options).tolist()))
+
+    def run():
+        for spot, strike, time_to_expiration, volatility in inputs:
+            option.calculate_premium(spot, strike, time_to_expiration, volatility, 0.025)
+    return run
+
+
+@benchmark('sell_option', defaults={'risk': 1, 'strike_solver': 'bisect'},
+           axes={'risk': (0.5, 1, 5, 20), 'strike_solver': ('bisect', 'random')}, number=20)
+def setup_sell_option(seed, risk, strike_solver):
+    assets, _ = _market(seed, 5)
+    bank = _bank()
+    bank.strike_solver = strike_solver
+    expiration_date = TODAY + timedelta(days=14)
+    calls = iter(range(10 ** 9))
+
+    def run():
+        i = next(calls)
+        bank.sell_option('Call' if i % 2 == 0 else 'Put', assets[i % len(assets)], expiration_date, risk=risk)
+    return run
+
+
+@benchmark('settle_expired', defaults={'num_contracts': 10000},
+           axes={'num_contracts': (1000, 10000, 100000, 1000000)})
+def setup_settle_expired(seed, num_contracts, num_assets=5, num_holders=1000):
+    # A book of contracts held by a population of agents, expiring over two weeks, of which one day is settled
+    assets, market = _market(seed, num_assets)
+    bank = _bank()
+    rng = np.random.default_rng(seed)
+    holders = AgentPopulation("Holders", num_holders, num_assets, RandomStockBuyer(), seed=seed)
+    names = [asset.name for asset in assets]
+    asset_index = rng.integers(0, num_assets, num_contracts)
+    is_call = rng.random(num_contracts) < 0.5
+    strikes = market.last_prices[asset_index] * rng.uniform(0.9, 1.1, num_contracts)
+    premiums = np.ones(num_contracts)
+    slots = rng.integers(0, num_holders, num_contracts)
+    quantities = np.ones(num_contracts, dtype=np.int64)
+    expiry_days = rng.integers(0, 14, num_contracts)
+    for day in range(14):
+        sold = expiry_days == day
+        bank.sell_option_arrays(is_call[sold], names, asset_index[sold], strikes[sold], premiums[sold],
+                                TODAY + timedelta(days=day), holders, slots[sold], quantities[sold])
+    return lambda: bank.settle_expired(TODAY, assets)
+
+
+@benchmark('calculate_portfolio_value', defaults={'num_assets': 20}, axes={'num_assets': (5, 50, 500)}, number=100)
+def setup_calculate_portfolio_value(seed, num_assets):
+    assets, _ = _market(seed, num_assets)
+    player = Player(name="Player 1", initial_cash=1000, verbose=False)
+    rng = random.Random(seed)
+    player.stocks_portfolio.update({asset.name: rng.randint(1, 10) for asset in assets})
+    return lambda: player.calculate_portfolio_value(assets)
+
+
+@benchmark('update_prices', defaults={'num_assets': 20, 'num_steps': 1},
+           axes={'num_assets': (5, 50, 500), 'num_steps': (1, 30, 252)}, number=20)
+def setup_update_prices(seed, num_assets, num_steps):
+    _, market = _market(seed, num_assets)
+    return lambda: market.update_prices(num_steps)
+
+
+@benchmark('tick_day', defaults={'num_assets': 20, 'ticks_per_day': 390},
+           axes={'num_assets': (5, 20, 100), 'ticks_per_day': (39, 390, 3900)}, number=5)
+def setup_tick_day(seed, num_assets, ticks_per_day):
+    # One day of intraday ticks folded into 39 bars, on a market that already has a month of ticks
+    rng = random.Random(seed)
+    assets = initialize_assets(num_assets, rng)
+    market = Market.of(assets, seed=rng.getrandbits(64), ticks_per_day=ticks_per_day,
+                       ticks_per_bar=ticks_per_day // 39)
+    market.update_prices(30)
+    return lambda: market.update_prices()
+
+
+@benchmark('simulate_day', defaults={'num_assets': 5, 'num_players': 2},
+           axes={'num_assets': (5, 20, 100), 'num_players': (2, 20, 200)}, number=5)
+def setup_simulate_day(seed, num_assets, num_players, warmup_days=20):
+    # One day of a headless game, timed after enough days that the bank's book holds two weeks of contracts
+    rng = random.Random(seed)
+    assets = initialize_assets(num_assets, rng)
+    market = Market.of(assets, seed=rng.getrandbits(64))
+    bank = _bank()
+    players = [Player(name=f"Player {i+1}", initial_cash=1000, verbose=False) for i in range(num_players)]
+    days = iter(range(10 ** 9))
+
+    def run():
+        current_date = TODAY + timedelta(days=next(days))
+        bank.today = current_date
+        simulate_day(market, bank, players[0::2], players[1::2], current_date, current_date + timedelta(days=14), rng)
+
+    for _ in range(warmup_days):
+        run()
+    return run
+
+
+@benchmark('headless_game', defaults={'num_days': 30, 'num_assets': 5},
+           axes={'num_days': (30, 252, 1260), 'num_assets': (5, 20, 100)})
+def setup_headless_game(seed, num_days, num_assets):
+    config = SimulationConfig(num_assets=num_assets, num_players=4, num_days=num_days, seed=seed)
+    return lambda: run_headless(config)
+
+
+def run_benchmarks(names=None, repeats=5, verbose=True):
+    """
+    Run benchmarks and collect the time of every case.
+
+    Parameters:
+    names (list): Names (or name prefixes) of the benchmarks to run, all of them if None.
+    repeats (int): Repeats of every case, the fastest one counts.
+    verbose (bool): Print every case as it finishes.
+
+    Returns:
+    dict: Case keys and their seconds per call.
+    """
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        timed = {}  # The defaults are a case of every axis, time them once
+        for key, _, params in bench.cases():
+            case = tuple(sorted(params.items()))
+            if case not in timed:
+                timed[case] = bench.run(params, repeats)
+            results[key] = timed[case]
+            if verbose:
+                print(f"{key:<55} {format_seconds(results[key])}")
+    return results
+
+
+def scaling_curves(results):
+    """
+    Group results into one curve per benchmark and scaled parameter, with the growth exponent of each curve.
+
+    The exponent is the slope of a log-log fit, about 1 for linear scaling and about 0 for constant time.
+
+    Parameters:
+    results (dict): Case keys and seconds, from run_benchmarks.
+
+    Returns:
+    dict: (benchmark name, parameter) -> (values, seconds, exponent), exponent is None for non-numeric parameters.
+    """
+    curves = {}
+    for name, bench in BENCHMARKS.items():
+        for axis, values in bench.axes.items():
+            keys = [f"{name}[{axis}={value}]" for value in values]
+            if not all(key in results for key in keys):
+                continue
+            seconds = [results[key] for key in keys]
+            exponent = None
+            if all(isinstance(value, (int, float)) for value in values) and len(values) > 1:
+                exponent = float(np.polyfit(np.log(values), np.log(seconds), 1)[0])
+            curves[(name, axis)] = (list(values), seconds, exponent)
+    return curves
+
+
+def save_baseline(results, path):
+    """
+    Store results as a JSON baseline, along with the machine they were measured on.
+    """
+    baseline = {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': SEED,
+        'results': results,
+    }
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def compare(results, path, tolerance=TOLERANCE):
+    """
+    Compare results against a stored baseline.
+
+    Parameters:
+    results (dict): Case keys and seconds, from run_benchmarks.
+    path (str): Path of the JSON baseline written by save_baseline.
+    tolerance (float): Relative slowdown that counts as a regression, 0.25 for 25% slower.
+
+    Returns:
+    list: Tuples of case key, baseline seconds, current seconds, their ratio and the verdict, for every case in both.
+        The verdict is 'regression' when the case got slower by more than the tolerance, 'faster' when it got faster
+        by as much, and '' otherwise.
+    """
+    with open(path) as file:
+        baseline = json.load(file)['results']
+    rows = []
+    for key, seconds in results.items():
+        if key in baseline:
+            ratio = seconds / baseline[key]
+            verdict = 'regression' if ratio > 1 + tolerance else 'faster' if ratio < 1 / (1 + tolerance) else ''
+            rows.append((key, baseline[key], seconds, ratio, verdict))
+    return rows
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def print_report(results, baseline_path=None, tolerance=TOLERANCE):
+    """
+    Print the scaling curves and, if a baseline is given, the comparison against it.
+
+    Returns:
+    list: Case keys that are slower than the baseline by more than the tolerance.
+    """
+    print("\nScaling:")
+    for (name, axis), (values, seconds, exponent) in scaling_curves(results).items():
+        points = ", ".join(f"{value}: {format_seconds(time_taken).strip()}"
+                           for value, time_taken in zip(values, seconds))
+        growth = f" (~n^{exponent:.2f})" if exponent is not None else ""
+        print(f"{name} over {axis}{growth}: {points}")
+    regressions = []
+    if baseline_path is not None:
+        print(f"\nAgainst {baseline_path}:")
+        for key, before, after, ratio, verdict in compare(results, baseline_path, tolerance):
+            if verdict == 'regression':
+                regressions.append(key)
+            flag = f"  {verdict.upper() if verdict == 'regression' else verdict}" if verdict else ""
+            print(f"{key:<55} {format_seconds(before)} -> {format_seconds(after)}  x{ratio:.2f}{flag}")
+    return regressions
+
+
+# Example usage:
+if __name__ == "__main__":
+    results = run_benchmarks(['calculate_premium', 'settle_expired', 'simulate_day'], repeats=3)
+    print_report(results)
@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Wall-clock seconds allowed for starting a fresh interpreter and importing the game up to the headless runner and
+# the tournament. Measured at about 0.35 s on one core (1.6 s before SciPy and matplotlib were imported lazily);
+# neither may be imported on this path.
+COLD_START_BUDGET = 0.75
+HEAVY_MODULES = ('scipy', 'matplotlib', 'pandas')
+# Prefix of the environment variables that set parameters, which win over the config file and lose to the flags
+ENV_PREFIX = 'DERIVATIVES_GAME_'
+
+# Parameters shared by the headless, tournament and plot commands, passed to SimulationConfig
+GAME_OPTIONS = (
+    ('num_assets', int, "Number of assets in the market."),
+    ('num_players', int, "Number of automated players."),
+    ('num_days', int, "Number of days to simulate."),
+    ('seed', int, "Seed of the game (of the whole tournament for the tournament command)."),
+    ('initial_cash', float, "Starting cash of every player."),
+    ('option_duration_days', int, "Days until the options sold on a day expire."),
+    ('risk_free_rate', float, "Risk-free rate used by the bank."),
+    ('num_bots', int, "Number of array-backed bot agents."),
+)
+
+
+def load_config(path):
+    """
+    Read parameters from a JSON or TOML (.toml) config file, e.g. {"num_days": 252, "num_assets": 20}.
+
+    Parameters:
+    path (str): Path of the file, or None.
+
+    Returns:
+    dict: Parameter names and values.
+    """
+    if path is None:
+        return {}
+    with open(path, 'rb') as file:
+        if path.endswith('.toml'):
+            import tomllib
+
+            return tomllib.load(file)
+        return json.load(file)
+
+
+def load_environment(environ=None):
+    """
+    Read parameters from environment variables named ENV_PREFIX plus the parameter in upper case, e.g.
+    DERIVATIVES_GAME_NUM_DAYS=252. Values are parsed as JSON where they can be, so numbers and booleans keep their
+    type, and kept as strings otherwise.
+
+    Parameters:
+    environ (dict): Environment to read, os.environ by default.
+
+    Returns:
+    dict: Parameter names and values.
+    """
+    environ = os.environ if environ is None else environ
+    settings = {}
+    for key, value in environ.items():
+        if key.startswith(ENV_PREFIX):
+            try:
+                settings[key[len(ENV_PREFIX):].lower()] = json.loads(value)
+            except ValueError:
+                settings[key[len(ENV_PREFIX):].lower()] = value
+    return settings
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Stock and derivatives market game.")
+    parser.add_argument('--config', help="JSON or TOML file with parameters, overridden by DERIVATIVES_GAME_* "
+                                         "environment variables and the command line.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    interactive = commands.add_parser('interactive', help="Play the game with Player 3 buying through the console.")
+    interactive.add_argument('--num-assets', dest='num_assets', type=int, help="Number of assets in the market.")
+    interactive.add_argument('--num-days', dest='num_days', type=int, help="Number of days to play.")
+    interactive.add_argument('--initial-cash', dest='initial_cash', type=float, help="Starting cash of each player.")
+    interactive.add_argument('--seed', type=int, help="Seed of the game.")
+    interactive.add_argument('--no-plot', dest='show_plot', action='store_false', default=None,
+                             help="Do not show the live plot.")
+
+    headless = commands.add_parser('headless', help="Simulate a game without output and print its results.")
+    _add_game_options(headless)
+    headless.add_argument('--event-log', dest='event_log_path', help="Directory to write the event log to.")
+    headless.add_argument('--history', dest='history_path', help="Directory to keep the price history in.")
+    headless.add_argument('--render', dest='render_path', help="PNG frame directory, .gif or .mp4 to render into.")
+    headless.add_argument('--render-fps', dest='render_fps', type=int, help="Frames per second when rendering.")
+    headless.add_argument('--delta-hedge', dest='delta_hedge', action='store_true', default=None,
+                          help="Let the bank hedge the delta of its book.")
+    headless.add_argument('--order-book', dest='order_book', action='store_true', default=None,
+                          help="Trade stocks through limit order books with a market maker.")
+    headless.add_argument('--american', dest='american_options', action='store_true', default=None,
+                          help="Sell American options that can be exercised before they expire.")
+    headless.add_argument('--output', help="Write the per-day results to this .npz file.")
+    headless.add_argument('--instrument', action='store_true', default=None,
+                          help="Time the phases of the day loop and print them with the counters.")
+    headless.add_argument('--metrics', dest='metrics_path',
+                          help="Export the timers and counters to this file, Prometheus text for .prom, else JSON.")
+    headless.add_argument('--profile-days', dest='profile_days', type=_day_range,
+                          help="Run cProfile for a range of days, e.g. 100:110 (both included).")
+    headless.add_argument('--profile-output', dest='profile_path', help="File to dump the profile to.")
+    headless.add_argument('--snapshot-every', dest='snapshot_every', type=int,
+                          help="Snapshot the game state every this many days.")
+    headless.add_argument('--snapshot-dir', dest='snapshot_path', help="Directory to save the snapshots to.")
+    headless.add_argument('--ticks-per-day', dest='ticks_per_day', type=int,
+                          help="Simulate intraday ticks, folded into OHLC bars and realized volatilities.")
+    headless.add_argument('--ticks-per-bar', dest='ticks_per_bar', type=int, help="Ticks per OHLC bar.")
+    headless.add_argument('--resume', help="Continue the game from a snapshot file up to --num-days.")
+
+    tournament = commands.add_parser('tournament', help="Play many seeded games in parallel processes.")
+    _add_game_options(tournament)
+    tournament.add_argument('--games', dest='num_games', type=int, help="Number of games to play.")
+    tournament.add_argument('--workers', dest='max_workers', type=int, help="Number of worker processes.")
+    tournament.add_argument('--games-per-task', dest='games_per_task', type=int, help="Games per worker batch.")
+    tournament.add_argument('--ruin-level', dest='ruin_level', type=float,
+                            help="Share of the initial cash below which a player counts as ruined.")
+
+    plot = commands.add_parser('plot', help="Simulate a game and plot its prices and equities.")
+    _add_game_options(plot)
+    plot.add_argument('--output', help="Save the figure to this image file instead of showing it.")
+
+    serve = commands.add_parser('serve', help="Run a game server for many clients over TCP or a Unix socket.")
+    serve.add_argument('--host', help="Host to listen on, 127.0.0.1 by default.")
+    serve.add_argument('--port', type=int, help="TCP port to listen on, 8765 by default.")
+    serve.add_argument('--unix', dest='path', help="Listen on this Unix socket instead of TCP.")
+    serve.add_argument('--num-assets', dest='num_assets', type=int, help="Number of assets in the market.")
+    serve.add_argument('--num-days', dest='num_days', type=int, help="Number of days to play, unlimited by default.")
+    serve.add_argument('--day-seconds', dest='day_seconds', type=float,
+                       help="Deadline of a day if not every player is ready before.")
+    serve.add_argument('--min-players', dest='min_players', type=int, help="Players to wait for before day one.")
+    serve.add_argument('--initial-cash', dest='initial_cash', type=float, help="Starting cash of each player.")
+    serve.add_argument('--seed', type=int, help="Seed of the game.")
+
+    bench = commands.add_parser('bench', help="Run the benchmarks and compare them against a stored baseline.")
+    bench.add_argument('names', nargs='*', help="Benchmarks to run (name prefixes), all of them by default.")
+    bench.add_argument('--repeats', type=int, help="Repeats of every case, the fastest one counts.")
+    bench.add_argument('--save', help="Store the results as a JSON baseline.")
+    bench.add_argument('--compare', help="JSON baseline to compare against, exits with 1 on regressions.")
+    bench.add_argument('--tolerance', type=float, help="Relative slowdown that counts as a regression.")
+
+    commands.add_parser('startup', help="Measure the cold-start time against its budget.")
+    return parser
+
+
+def _day_range(text):
+    first, _, last = text.partition(':')
+    return int(first), int(last or first)
+
+
+def _add_game_options(parser):
+    for name, option_type, help_text in GAME_OPTIONS:
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, type=option_type, help=help_text)
+
+
+def _settings(args, settings, names):
+    # Command-line values win over the config file and the environment, unset parameters keep the defaults of the code
+    values = {name: settings[name] for name in names if name in settings}
+    values.update({name: getattr(args, name) for name in names if getattr(args, name, None) is not None})
+    return values
+
+
+def game_config(args, settings):
+    """
+    Build the SimulationConfig of a command from the config file, the environment and the command line.
+
+    Returns:
+    SimulationConfig: Parameters of the game.
+    """
+    from headless import SimulationConfig
+
+    names = [name for name, _, _ in GAME_OPTIONS] + ['event_log_path', 'history_path', 'render_path', 'render_fps',
+                                                     'delta_hedge', 'order_book', 'instrument', 'metrics_path',
+                                                     'profile_days', 'profile_path', 'american_options',
+                                                     'snapshot_every', 'snapshot_path', 'ticks_per_day',
+                                                     'ticks_per_bar']
+    return SimulationConfig(**_settings(args, settings, names))
+
+
+def run_interactive(args, settings):
+    from main import main
+
+    main(**_settings(args, settings, ['num_assets', 'num_days', 'initial_cash', 'seed', 'show_plot']))
+
+
+def run_headless_command(args, settings):
+    import numpy as np
+
+    from headless import run_headless
+
+    state = None
+    resume = getattr(args, 'resume', None) or settings.get('resume')
+    if resume is not None:
+        from snapshot import GameSnapshot
+
+        state = GameSnapshot.load(resume).restore()
+    start = time.perf_counter()
+    result = run_headless(game_config(args, settings), state)
+    if not result.dates:
+        print("Nothing to simulate, the game is already past --num-days.")
+        return
+    print(f"Simulated {len(result.dates)} days in {time.perf_counter() - start:.2f}s")
+    print("Final equity:", dict(zip(result.player_names, result.equity[-1].round(2).tolist())))
+    print("Bank P&L:", round(float(result.bank_pnl[-1]), 2), "contracts sold:", int(result.contracts_sold.sum()),
+          "settled:", int(result.contracts_settled.sum()))
+    if result.instruments is not None:
+        result.instruments.print_info()
+        if result.instruments.profile_days is not None and result.instruments.profile_path is None:
+            result.instruments.profile_stats().print_stats(20)
+    output = args.output if args.output is not None else settings.get('output')
+    if output is not None:
+        np.savez(output, dates=np.array([day.isoformat() for day in result.dates]),
+                 asset_names=np.array(result.asset_names), player_names=np.array(result.player_names),
+                 prices=result.prices, equity=result.equity, bank_pnl=result.bank_pnl,
+                 contracts_sold=result.contracts_sold, contracts_settled=result.contracts_settled)
+        print(f"Results written to {output}")
+
+
+def run_tournament_command(args, settings):
+    from tournament import run_tournament
+
+    config = game_config(args, settings)
+    options = _settings(args, settings, ['num_games', 'max_workers', 'games_per_task', 'ruin_level'])
+    start = time.perf_counter()
+    tournament = run_tournament(options.pop('num_games', 64), config, seed=config.seed, **options)
+    tournament.print_info()
+    print(f"Played in {time.perf_counter() - start:.2f}s")
+
+
+def run_plot_command(args, settings):
+    from headless import run_headless
+
+    result = run_headless(game_config(args, settings))
+    output = args.output if args.output is not None else settings.get('output')
+    if output is not None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(10, 10))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots(2, 1)
+    else:
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(2, 1, figsize=(10, 10))
+    days = range(1, len(result.dates) + 1)
+    for i, name in enumerate(result.asset_names):
+        ax[0].plot(range(len(result.prices)), result.prices[:, i], label=name)
+    for i, name in enumerate(result.player_names):
+        ax[1].plot(days, result.equity[:, i], label=name)
+    for axis, title, ylabel in ((ax[0], "Stock Values Over Time", "Stock Value"),
+                                (ax[1], "Player Asset Values Over Time", "Asset Value")):
+        axis.set_title(title)
+        axis.set_xlabel("Day")
+        axis.set_ylabel(ylabel)
+        axis.legend()
+        axis.grid(True)
+    if output is not None:
+        fig.savefig(output)
+        print(f"Plot written to {output}")
+    else:
+        plt.show()
+
+
+def run_serve_command(args, settings):
+    import asyncio
+    import random
+
+    from bank import Bank
+    from main import initialize_assets, initialize_players
+    from market import Market
+    from server import GameServer
+
+    options = _settings(args, settings, ['host', 'port', 'path', 'num_assets', 'num_days', 'day_seconds',
+                                         'min_players', 'initial_cash', 'seed'])
+    rng = random.Random(options.pop('seed', None))
+    assets = initialize_assets(options.pop('num_assets', 5), rng)
+    Market.of(assets, seed=rng.getrandbits(64))
+    initial_cash = options.pop('initial_cash', 1000)
+    player1, player2 = initialize_players(initial_cash)
+    player1.verbose = player2.verbose = False
+    address = {name: options.pop(name) for name in ('host', 'port', 'path') if name in options}
+    server = GameServer(assets, Bank(name="ABC Bank"), [player1], [player2], initial_cash=initial_cash,
+                        seed=rng.getrandbits(64), **options)
+    print("Serving on", address.get('path') or f"{address.get('host', '127.0.0.1')}:{address.get('port', 8765)}")
+    asyncio.run(server.serve(**address))
+
+
+def run_bench_command(args, settings):
+    import benchmarks
+
+    options = _settings(args, settings, ['repeats', 'save', 'compare', 'tolerance'])
+    results = benchmarks.run_benchmarks(args.names or None, options.get('repeats', 5))
+    regressions = benchmarks.print_report(results, options.get('compare'),
+                                          options.get('tolerance', benchmarks.TOLERANCE))
+    if 'save' in options:
+        benchmarks.save_baseline(results, options['save'])
+        print(f"Baseline written to {options['save']}")
+    if regressions:
+        sys.exit(1)
+
+
+def measure_cold_start(repeats=5):
+    """
+    Time fresh interpreters that import the game up to the headless runner and the tournament.
+
+    Parameters:
+    repeats (int): Number of interpreters to start, the fastest one counts.
+
+    Returns:
+    tuple: Fastest start in seconds and the heavy modules that were imported.
+    """
+    code = ("import sys, cli, headless, tournament; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=sys.path[0] or None).stdout.strip()
+        best = min(best, time.perf_counter() - start)
+    return best, [module for module in loaded.split(',') if module]
+
+
+def run_startup_command(args, settings):
+    seconds, loaded = measure_cold_start()
+    print(f"Cold start: {seconds * 1000:.0f} ms (budget {COLD_START_BUDGET * 1000:.0f} ms)")
+    if loaded:
+        print("Heavy modules imported at start:", ", ".join(loaded))
+    if seconds > COLD_START_BUDGET or loaded:
+        sys.exit(1)
+
+
+COMMANDS = {
+    'interactive': run_interactive,
+    'headless': run_headless_command,
+    'tournament': run_tournament_command,
+    'plot': run_plot_command,
+    'serve': run_serve_command,
+    'bench': run_bench_command,
+    'startup': run_startup_command,
+}
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    settings = dict(load_config(args.config), **load_environment())
+    COMMANDS[args.command](args, settings)
+
+
+if __name__ == "__main__":
+    main()
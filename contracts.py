@@ -0,0 +1,276 @@
+import heapq
+from datetime import date
+
+import numpy as np
+
+COLUMNS = ('is_call', 'american', 'asset_index', 'strike', 'expiry', 'premium', 'holder', 'slot', 'quantity', 'open')
+
+
+class ContractBook:
+    """
+    Columnar store of the option contracts sold by the bank.
+
+    Every contract is a row in a set of NumPy columns (type, asset, strike, expiry, premium, holder, quantity), and its
+    id is its row number. Contracts are indexed by expiration day, so settling a day only touches the contracts
+    expiring on it.
+    """
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.open_count = 0
+        self.premiums_received = 0.0  # Premiums paid by holders for the quantities they bought, net of sales back
+        self.is_call = np.zeros(capacity, dtype=bool)
+        self.american = np.zeros(capacity, dtype=bool)
+        self.asset_index = np.zeros(capacity, dtype=np.int32)
+        self.strike = np.zeros(capacity)
+        self.expiry = np.zeros(capacity, dtype=np.int64)  # Expiration date as a proleptic Gregorian ordinal
+        self.premium = np.zeros(capacity)
+        self.holder = np.full(capacity, -1, dtype=np.int32)
+        self.slot = np.zeros(capacity, dtype=np.int64)  # Account of the contract within its holder, e.g. an agent
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.open = np.zeros(capacity, dtype=bool)
+
+        self.asset_names = []
+        self.asset_ids = {}  # Asset name -> asset index
+        self.holders = []
+        self.holder_ids = {}  # id(holder) -> holder index
+        self.options = {}  # Contract id -> option object, for the open contracts that were added as objects
+        self._expiry_buckets = {}  # Expiration ordinal -> arrays of contract ids
+        self._expiry_heap = []
+
+    def __len__(self):
+        return self.open_count
+
+    def __getstate__(self):
+        # Snapshots keep only the filled rows of the columns
+        state = dict(self.__dict__)
+        for column in COLUMNS:
+            state[column] = getattr(self, column)[:self.size].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Holders are indexed by object identity, which a copied book has to rebuild for its own holders
+        self.holder_ids = {id(holder): i for i, holder in enumerate(self.holders)}
+
+    def register_asset(self, asset_name):
+        if asset_name not in self.asset_ids:
+            self.asset_ids[asset_name] = len(self.asset_names)
+            self.asset_names.append(asset_name)
+        return self.asset_ids[asset_name]
+
+    def register_holder(self, holder):
+        key = id(holder)
+        if key not in self.holder_ids:
+            self.holder_ids[key] = len(self.holders)
+            self.holders.append(holder)
+        return self.holder_ids[key]
+
+    def add(self, options):
+        """
+        Add newly sold options to the book.
+
+        Parameters:
+        options (list): Call or Put objects.
+
+        Returns:
+        numpy.ndarray: Contract ids of the options, which are also stored on the options themselves.
+        """
+        count = len(options)
+        self._reserve(self.size + count)
+        ids = np.arange(self.size, self.size + count)
+        rows = slice(self.size, self.size + count)
+        self.is_call[rows] = [option.is_call for option in options]
+        self.american[rows] = [option.american for option in options]
+        self.asset_index[rows] = [self.register_asset(option.underlying_asset) for option in options]
+        self.strike[rows] = [option.strike_price for option in options]
+        self.expiry[rows] = [option.expiration_date.toordinal() for option in options]
+        self.premium[rows] = [option.premium for option in options]
+        self.open[rows] = True
+        self.size += count
+        self.open_count += count
+
+        for contract_id, option in zip(ids.tolist(), options):
+            option.contract_id = contract_id
+            option.book = self
+            self.options[contract_id] = option
+        self._index_expiries(ids)
+        return ids
+
+    def add_columns(self, is_call, asset_names, asset_index, strike, expiry, premium, holder=None, slots=0,
+                    quantity=0, american=False):
+        """
+        Add newly sold contracts straight from arrays, without creating option objects.
+
+        Parameters:
+        is_call (numpy.ndarray): True for calls, False for puts.
+        asset_names (list): Names of the assets that asset_index refers to.
+        asset_index (numpy.ndarray): Index of each contract's underlying in asset_names.
+        strike (numpy.ndarray): Strike prices.
+        expiry (numpy.ndarray or int): Expiration dates as ordinals.
+        premium (numpy.ndarray): Premiums per contract.
+        holder (object): Holder of all the contracts, or None.
+        slots (numpy.ndarray or int): Account of each contract within the holder.
+        quantity (numpy.ndarray or int): Quantity held of each contract.
+        american (numpy.ndarray or bool): True for American contracts.
+
+        Returns:
+        numpy.ndarray: Contract ids.
+        """
+        count = len(is_call)
+        self._reserve(self.size + count)
+        ids = np.arange(self.size, self.size + count)
+        rows = slice(self.size, self.size + count)
+        book_index = np.array([self.register_asset(name) for name in asset_names], dtype=np.int32)
+        self.is_call[rows] = is_call
+        self.american[rows] = american
+        self.asset_index[rows] = book_index[asset_index]
+        self.strike[rows] = strike
+        self.expiry[rows] = expiry
+        self.premium[rows] = premium
+        self.holder[rows] = self.register_holder(holder) if holder is not None else -1
+        self.slot[rows] = slots
+        self.quantity[rows] = quantity
+        self.open[rows] = True
+        self.size += count
+        self.open_count += count
+        self.premiums_received += float(np.sum(self.premium[rows] * self.quantity[rows]))
+        self._index_expiries(ids)
+        return ids
+
+    def _index_expiries(self, ids):
+        expiries = self.expiry[ids]
+        for expiry in np.unique(expiries).tolist():
+            if expiry not in self._expiry_buckets:
+                self._expiry_buckets[expiry] = []
+                heapq.heappush(self._expiry_heap, expiry)
+            self._expiry_buckets[expiry].append(ids[expiries == expiry])
+
+    def assign(self, contract_id, holder, quantity):
+        """
+        Record that a holder bought a quantity of a contract.
+        """
+        holder_id = self.register_holder(holder)
+        if self.holder[contract_id] not in (-1, holder_id):
+            holder_name = self.holders[self.holder[contract_id]].name
+            raise ValueError(f"Contract {contract_id} is already held by {holder_name}.")
+        self.holder[contract_id] = holder_id
+        self.quantity[contract_id] += quantity
+        self.premiums_received += float(self.premium[contract_id]) * quantity
+
+    def release(self, contract_id, quantity):
+        """
+        Record that the holder sold a quantity of a contract back, at its premium.
+        """
+        quantity = min(quantity, int(self.quantity[contract_id]))
+        self.premiums_received -= float(self.premium[contract_id]) * quantity
+        self.quantity[contract_id] -= quantity
+        if self.quantity[contract_id] == 0:
+            self.holder[contract_id] = -1
+
+    def exercise(self, contract_id, quantity, price):
+        """
+        Exercise a quantity of a contract before its expiration, closing the contract once none of it is held.
+
+        Parameters:
+        contract_id (int): Id of the contract.
+        quantity (int): Quantity to exercise, at most the quantity held.
+        price (float): Current price of the underlying asset.
+
+        Returns:
+        tuple: Quantity exercised and its total payoff.
+        """
+        quantity = min(quantity, int(self.quantity[contract_id]))
+        sign = 1.0 if self.is_call[contract_id] else -1.0
+        payoff = max(sign * (float(price) - float(self.strike[contract_id])), 0.0) * quantity
+        self.quantity[contract_id] -= quantity
+        if self.quantity[contract_id] == 0 and self.open[contract_id]:
+            # The contract stays in its expiry bucket, settlement skips it as it is no longer open
+            self.open[contract_id] = False
+            self.open_count -= 1
+            self.options.pop(contract_id, None)
+        return quantity, payoff
+
+    def open_contracts(self):
+        """
+        list: Option objects of all open contracts. Contracts added from arrays get their object on first access.
+        """
+        from derivatives import option_class
+
+        ids = np.flatnonzero(self.open[:self.size])
+        for contract_id in ids.tolist():
+            if contract_id not in self.options:
+                option_type = option_class(self.is_call[contract_id], self.american[contract_id])
+                option = option_type(underlying_asset=self.asset_names[self.asset_index[contract_id]],
+                                     strike_price=float(self.strike[contract_id]),
+                                     expiration_date=date.fromordinal(int(self.expiry[contract_id])),
+                                     underlying_price=None, time_to_expiration=None, volatility=None,
+                                     risk_free_rate=None, premium=float(self.premium[contract_id]))
+                option.contract_id = contract_id
+                option.book = self
+                self.options[contract_id] = option
+        return [self.options[contract_id] for contract_id in ids.tolist()]
+
+    def asset_prices(self, assets):
+        """
+        Last prices of the assets, ordered by the book's asset index.
+
+        Parameters:
+        assets (list): Asset objects, including at least every underlying in the book.
+
+        Returns:
+        numpy.ndarray: Price per asset index.
+        """
+        prices = {asset.name: asset.price_history[-1] for asset in assets}
+        return np.array([prices[name] for name in self.asset_names], dtype=float)
+
+    def settle(self, current_date, prices):
+        """
+        Settle all contracts that expire on or before the current date and credit the payoffs to their holders.
+
+        Parameters:
+        current_date (datetime.date): Current date.
+        prices (numpy.ndarray): Price of every asset, ordered by the book's asset index.
+
+        Returns:
+        tuple: Ids of the settled contracts and their total payoffs (payoff per contract times quantity held).
+        """
+        today = current_date.toordinal()
+        expired = [np.zeros(0, dtype=np.int64)]
+        while self._expiry_heap and self._expiry_heap[0] <= today:
+            expired.extend(self._expiry_buckets.pop(heapq.heappop(self._expiry_heap)))
+        ids = np.concatenate(expired)
+        ids = ids[self.open[ids]]
+        if len(ids) == 0:
+            return ids, np.zeros(0)
+
+        sign = np.where(self.is_call[ids], 1.0, -1.0)
+        payoffs = np.maximum(sign * (prices[self.asset_index[ids]] - self.strike[ids]), 0.0) * self.quantity[ids]
+
+        self.open[ids] = False
+        self.open_count -= len(ids)
+        options = [self.options.pop(contract_id, None) for contract_id in ids.tolist()]
+
+        # Credit every holder once with the sum of its payoffs and close the contracts in its position ledger.
+        # Holders with many accounts (agent populations) settle all of their contracts in one call.
+        holders = self.holder[ids]
+        for holder_id in np.unique(holders[holders >= 0]).tolist():
+            holder = self.holders[holder_id]
+            mine = np.flatnonzero(holders == holder_id)
+            if hasattr(holder, 'settle_contracts'):
+                holder.settle_contracts(ids[mine], self.slot[ids[mine]], payoffs[mine])
+                continue
+            holder.cash += float(payoffs[mine].sum())
+            for i in mine.tolist():
+                holder.derivatives_portfolio.close(options[i])
+        return ids, payoffs
+
+    def _reserve(self, size):
+        capacity = len(self.open)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        for column in COLUMNS:
+            old = getattr(self, column)
+            new = np.full(capacity, -1 if column == 'holder' else 0, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, column, new)
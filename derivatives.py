@@ -1,22 +1,623 @@
+import functools
 import math
-from scipy.stats import norm
+
+import numpy as np
+
+# Arrays at least this large are passed to SciPy's ndtr, which is only imported once such an array shows up
+SCIPY_MIN_SIZE = 1024
+
+# Chebyshev coefficients of erfc(z) for z >= 0 (Numerical Recipes, 3rd edition), accurate to about 1e-16
+_ERFC_COEFFICIENTS = (
+    -1.3026537197817094, 6.4196979235649026e-1, 1.9476473204185836e-2, -9.561514786808631e-3,
+    -9.46595344482036e-4, 3.66839497852761e-4, 4.2523324806907e-5, -2.0278578112534e-5, -1.624290004647e-6,
+    1.303655835580e-6, 1.5626441722e-8, -8.5238095915e-8, 6.529054439e-9, 5.059343495e-9, -9.91364156e-10,
+    -2.27365122e-10, 9.6467911e-11, 2.394038e-12, -6.886027e-12, 8.94487e-13, 3.13092e-13, -1.12708e-13, 3.81e-16,
+    7.106e-15, -1.523e-15, -9.4e-17, 1.21e-16, -2.8e-17)
+
+
+def normal_cdf(x):
+    """
+    Cumulative distribution function of the standard normal distribution.
+
+    Small arrays go through math.erfc element by element, which beats the call overhead of NumPy ufuncs. Large
+    arrays use SciPy's ndtr if SciPy is installed, or a Chebyshev approximation of erfc in plain NumPy otherwise.
+
+    Parameters:
+    x (array_like): Points to evaluate.
+
+    Returns:
+    numpy.ndarray: Probabilities, with the shape of x.
+    """
+    x = np.asarray(x, dtype=float)
+    if x.size < SCIPY_MIN_SIZE:
+        erfc = math.erfc
+        scale = -math.sqrt(0.5)
+        return np.array([0.5 * erfc(scale * value) for value in x.ravel().tolist()]).reshape(x.shape)
+    ndtr = _scipy_ndtr()
+    if ndtr is not None:
+        return ndtr(x)
+
+    # erfc(z) for z = |x| / sqrt(2) by Clenshaw's recurrence, mirrored for positive x
+    t = 2 / (2 + np.abs(x) * math.sqrt(0.5))
+    ty = 4 * t - 2
+    d = np.zeros_like(x)
+    dd = np.zeros_like(x)
+    for coefficient in _ERFC_COEFFICIENTS[:0:-1]:
+        d, dd = ty * d - dd + coefficient, d
+    tail = 0.5 * t * np.exp(-0.5 * x * x + 0.5 * (_ERFC_COEFFICIENTS[0] + ty * d) - dd)
+    return np.where(x < 0, tail, 1 - tail)
+
+
+@functools.lru_cache(maxsize=None)
+def _scipy_ndtr():
+    try:
+        from scipy.special import ndtr
+    except ImportError:
+        return None
+    return ndtr
+
+
+def black_scholes_prices(underlying_prices, strike_prices, times_to_expiration, volatilities, risk_free_rates,
+                         is_call=True):
+    """
+    Price a batch of European options with the Black-Scholes model in one vectorized pass.
+
+    All parameters are broadcast against each other, so scalars and NumPy arrays can be mixed freely.
+
+    Parameters:
+    underlying_prices (array_like): Current market prices of the underlying assets.
+    strike_prices (array_like): Strike prices of the options.
+    times_to_expiration (array_like): Time remaining until the options expire, in years.
+    volatilities (array_like): Annualized volatilities of the underlying assets.
+    risk_free_rates (array_like): Risk-free interest rates.
+    is_call (array_like of bool): True for calls, False for puts.
+
+    Returns:
+    numpy.ndarray: Premiums of the options. Expired options (time <= 0) are priced at their intrinsic value.
+    """
+    spot, strike, time, vol, rate, is_call = np.broadcast_arrays(
+        np.asarray(underlying_prices, dtype=float), np.asarray(strike_prices, dtype=float),
+        np.asarray(times_to_expiration, dtype=float), np.asarray(volatilities, dtype=float),
+        np.asarray(risk_free_rates, dtype=float), np.asarray(is_call, dtype=bool))
+
+    live = time > 0
+    sqrt_time = np.sqrt(np.where(live, time, 1.0))
+    vol_sqrt_time = vol * sqrt_time
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * vol ** 2) * time) / vol_sqrt_time
+    d2 = d1 - vol_sqrt_time
+    discounted_strike = strike * np.exp(-rate * np.where(live, time, 0.0))
+
+    # Calls and puts share d1/d2, the put follows from N(-x) = 1 - N(x)
+    sign = np.where(is_call, 1.0, -1.0)
+    premiums = sign * (spot * normal_cdf(sign * d1) - discounted_strike * normal_cdf(sign * d2))
+    intrinsic = np.maximum(sign * (spot - strike), 0.0)
+    return np.where(live, premiums, intrinsic)
+
+
+GREEKS = ('delta', 'gamma', 'vega', 'theta', 'rho')
+
+
+def black_scholes_greeks(underlying_prices, strike_prices, times_to_expiration, volatilities, risk_free_rates,
+                         is_call=True):
+    """
+    Compute the Black-Scholes Greeks of a batch of European options in one vectorized pass.
+
+    Parameters are broadcast like in black_scholes_prices.
+
+    Parameters:
+    underlying_prices (array_like): Current market prices of the underlying assets.
+    strike_prices (array_like): Strike prices of the options.
+    times_to_expiration (array_like): Time remaining until the options expire, in years.
+    volatilities (array_like): Annualized volatilities of the underlying assets.
+    risk_free_rates (array_like): Risk-free interest rates.
+    is_call (array_like of bool): True for calls, False for puts.
+
+    Returns:
+    dict: Arrays of 'delta', 'gamma', 'vega' (per 1.0 of volatility), 'theta' (per year) and 'rho' (per 1.0 of
+    rate) of every option. Expired options have the delta of their payoff and no other Greeks.
+    """
+    spot, strike, time, vol, rate, is_call = np.broadcast_arrays(
+        np.asarray(underlying_prices, dtype=float), np.asarray(strike_prices, dtype=float),
+        np.asarray(times_to_expiration, dtype=float), np.asarray(volatilities, dtype=float),
+        np.asarray(risk_free_rates, dtype=float), np.asarray(is_call, dtype=bool))
+
+    sign = 2.0 * is_call - 1.0
+    live = time > 0
+    if not live.all():
+        # Price the live options on their own, so the common case needs no masking
+        greeks = {greek: np.zeros(spot.shape) for greek in GREEKS}
+        greeks['delta'] = sign * (sign * (spot - strike) > 0)
+        if live.any():
+            for greek, values in black_scholes_greeks(spot[live], strike[live], time[live], vol[live], rate[live],
+                                                      is_call[live]).items():
+                greeks[greek][live] = values
+        return greeks
+
+    sqrt_time = np.sqrt(time)
+    vol_sqrt_time = vol * sqrt_time
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * vol ** 2) * time) / vol_sqrt_time
+        density = np.exp(-0.5 * d1 ** 2) * (1 / np.sqrt(2 * np.pi))
+        exercise = strike * np.exp(-rate * time) * normal_cdf(sign * (d1 - vol_sqrt_time))
+        spot_density = spot * density
+        return {
+            'delta': sign * normal_cdf(sign * d1),
+            'gamma': density / (spot * vol_sqrt_time),
+            'vega': spot_density * sqrt_time,
+            'theta': -spot_density * vol / (2 * sqrt_time) - sign * rate * exercise,
+            'rho': sign * time * exercise,
+        }
+
+
+# Time steps of the binomial lattice of American options, and the standard deviations of the log price it spans
+# on each side, beyond which option values are their limits (worthless, or exercised)
+LATTICE_STEPS = 500
+LATTICE_WIDTH = 6.0
+# Nodes per block of lattices stepped together, small enough that a block's rows stay in the CPU cache
+LATTICE_BLOCK = 1 << 15
+# Batches needing more distinct lattices than this are priced on a grid of volatilities and times to expiration,
+# with the steps of the grid in log volatility and log time
+LATTICE_MAX_EXACT = 128
+LATTICE_GRID = (0.2, 0.3)
+
+
+# Bisection steps of solve_strikes, enough to pin the strike to double precision on the log-moneyness range
+STRIKE_ITERATIONS = 60
+
+
+def solve_strikes(target_premiums, underlying_prices, times_to_expiration, volatilities, risk_free_rates,
+                  is_call=True, iterations=STRIKE_ITERATIONS, american=False, steps=LATTICE_STEPS):
+    """
+    Find the strike prices at which options are worth a target premium.
+
+    The premium is monotonic in the strike (decreasing for calls, increasing for puts), so the strike is found by
+    bisection on the log-moneyness with a fixed iteration budget, for the whole batch at once. The returned strikes
+    are always on the side where the premium is at least the target.
+
+    Parameters:
+    target_premiums (array_like): Premiums the options should be worth.
+    underlying_prices (array_like): Current market prices of the underlying assets.
+    times_to_expiration (array_like): Time remaining until the options expire, in years.
+    volatilities (array_like): Annualized volatilities of the underlying assets.
+    risk_free_rates (array_like): Risk-free interest rates.
+    is_call (array_like of bool): True for calls, False for puts.
+    iterations (int): Number of bisection steps.
+    american (bool): Solve for American options. The European strikes are refined by a second bisection on the
+        lattices of american_prices, which only need to be built once per batch.
+    steps (int): Time steps of the lattice of American options.
+
+    Returns:
+    tuple: Strike prices and their premiums as NumPy arrays. Calls whose target is not reachable (target >= spot)
+    get the lowest strike of the search range.
+    """
+    target, spot, time, vol, rate, is_call = np.broadcast_arrays(
+        np.asarray(target_premiums, dtype=float), np.asarray(underlying_prices, dtype=float),
+        np.asarray(times_to_expiration, dtype=float), np.asarray(volatilities, dtype=float),
+        np.asarray(risk_free_rates, dtype=float), np.asarray(is_call, dtype=bool))
+
+    # A put is worth at least K * exp(-rT) - S, which bounds the highest strike ever needed
+    upper = np.maximum(1e3, 2 * (target + spot) / spot * np.exp(np.maximum(rate * time, 0)))
+    low = np.full(spot.shape, np.log(1e-6))
+    high = np.log(upper)
+
+    # Everything except the log-moneyness is fixed during the search, so only the strike-dependent terms are
+    # evaluated per iteration
+    live = time > 0
+    sign = np.where(is_call, 1.0, -1.0)
+    vol_sqrt_time = vol * np.sqrt(np.where(live, time, 1.0))
+    drift = (rate + 0.5 * vol ** 2) * time
+    discount = np.exp(-rate * np.where(live, time, 0.0))
+    for _ in range(iterations):
+        middle = 0.5 * (low + high)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d1 = (drift - middle) / vol_sqrt_time
+        d2 = d1 - vol_sqrt_time
+        strikes = spot * np.exp(middle)
+        premiums = np.where(live,
+                            sign * (spot * normal_cdf(sign * d1) - strikes * discount * normal_cdf(sign * d2)),
+                            np.maximum(sign * (spot - strikes), 0.0))
+        # Move towards the target while staying on the side where the premium is still high enough
+        go_up = (premiums >= target) == is_call
+        low = np.where(go_up, middle, low)
+        high = np.where(go_up, high, middle)
+
+    strikes = spot * np.exp(np.where(is_call, low, high))
+    premiums = black_scholes_prices(spot, strikes, time, vol, rate, is_call)
+    # Rows without a volatility estimate keep their European result
+    early = live & np.isfinite(vol) & ~(is_call & (rate >= 0)) if american else np.zeros(spot.shape, dtype=bool)
+    if not early.any():
+        return strikes, premiums
+
+    # Early exercise only adds value, so the American strike is close to the European one on the cheaper side.
+    # Search the log-moneyness log(S/K) within a few standard deviations of it, on one lattice per group.
+    spot_early = spot[early]
+    target_early = target[early]
+    call_early = is_call[early]
+    x = np.log(spot_early / strikes[early])
+    groups, keys = _lattice_groups(time[early], vol[early], rate[early], call_early, x, steps)
+    margin = LATTICE_WIDTH * math.sqrt(steps) * _lattice_spacing(*keys[:3], steps)[groups]
+    x_low = np.full(len(keys[0]), np.inf)
+    x_high = np.full(len(keys[0]), -np.inf)
+    np.minimum.at(x_low, groups, x - margin)
+    np.maximum.at(x_high, groups, x + margin)
+    lattices = _american_lattices(*keys, x_low, x_high, steps)
+    low, high = x - margin, x + margin
+    for _ in range(iterations):
+        middle = 0.5 * (low + high)
+        premiums_early = spot_early * np.exp(-middle) * _lattice_values(lattices, groups, middle)
+        # Puts get cheaper and calls dearer as the moneyness grows
+        go_up = (premiums_early >= target_early) != call_early
+        low = np.where(go_up, middle, low)
+        high = np.where(go_up, high, middle)
+    x = np.where(call_early, high, low)
+    strikes[early] = spot_early * np.exp(-x)
+    premiums[early] = strikes[early] * _lattice_values(lattices, groups, x)
+    return strikes, premiums
+
+
+def american_prices(underlying_prices, strike_prices, times_to_expiration, volatilities, risk_free_rates,
+                    is_call=True, steps=LATTICE_STEPS):
+    """
+    Price a batch of American options on a Cox-Ross-Rubinstein binomial lattice.
+
+    The value of an American option scales with its strike, so options sharing their time to expiration,
+    volatility, rate and type are priced on one lattice over the log-moneyness log(S/K) for a strike of 1, and read
+    off it by interpolation. The lattices of a batch are stepped back from expiration together, each step a few
+    NumPy operations over all lattices and nodes, so the cost grows with the number of distinct lattices and not
+    with the number of options. Batches of options with many different volatilities and times to expiration, such
+    as a whole book of contracts, would need one lattice per option, so beyond LATTICE_MAX_EXACT lattices the
+    early exercise premium over Black-Scholes is interpolated between lattices on a grid of volatilities and times
+    instead, which is about as accurate as the lattice itself. Calls with a non-negative rate are never exercised
+    early (the underlyings pay no dividends), so they are priced by Black-Scholes.
+
+    Parameters:
+    underlying_prices (array_like): Current market prices of the underlying assets.
+    strike_prices (array_like): Strike prices of the options.
+    times_to_expiration (array_like): Time remaining until the options expire, in years.
+    volatilities (array_like): Annualized volatilities of the underlying assets.
+    risk_free_rates (array_like): Risk-free interest rates.
+    is_call (array_like of bool): True for calls, False for puts.
+    steps (int): Time steps of the lattice.
+
+    Returns:
+    numpy.ndarray: Premiums of the options. Expired options (time <= 0) are priced at their intrinsic value.
+    """
+    spot, strike, time, vol, rate, is_call = np.broadcast_arrays(
+        np.asarray(underlying_prices, dtype=float), np.asarray(strike_prices, dtype=float),
+        np.asarray(times_to_expiration, dtype=float), np.asarray(volatilities, dtype=float),
+        np.asarray(risk_free_rates, dtype=float), np.asarray(is_call, dtype=bool))
+    premiums = black_scholes_prices(spot, strike, time, vol, rate, is_call)
+    early = (time > 0) & np.isfinite(vol) & ~(is_call & (rate >= 0))
+    if not early.any():
+        return premiums
+
+    x = np.log(spot[early] / strike[early])
+    args = (time[early], vol[early], rate[early], is_call[early], x, steps)
+    groups, keys = _lattice_groups(*args)
+    if len(keys[0]) <= LATTICE_MAX_EXACT:
+        values = _american_values(groups, keys, x, steps)
+    else:
+        values = _grid_american_values(*args)
+    premiums[early] = strike[early] * values
+    return premiums
+
+
+def option_prices(underlying_prices, strike_prices, times_to_expiration, volatilities, risk_free_rates, is_call=True,
+                  american=False):
+    """
+    Price a batch of European and American options, by Black-Scholes and on the binomial lattice respectively.
+
+    Parameters:
+    underlying_prices (array_like): Current market prices of the underlying assets.
+    strike_prices (array_like): Strike prices of the options.
+    times_to_expiration (array_like): Time remaining until the options expire, in years.
+    volatilities (array_like): Annualized volatilities of the underlying assets.
+    risk_free_rates (array_like): Risk-free interest rates.
+    is_call (array_like of bool): True for calls, False for puts.
+    american (array_like of bool): True for American options.
+
+    Returns:
+    numpy.ndarray: Premiums of the options.
+    """
+    spot, strike, time, vol, rate, is_call, american = np.broadcast_arrays(
+        np.asarray(underlying_prices, dtype=float), np.asarray(strike_prices, dtype=float),
+        np.asarray(times_to_expiration, dtype=float), np.asarray(volatilities, dtype=float),
+        np.asarray(risk_free_rates, dtype=float), np.asarray(is_call, dtype=bool), np.asarray(american, dtype=bool))
+    if american.all():
+        return american_prices(spot, strike, time, vol, rate, is_call)
+    premiums = black_scholes_prices(spot, strike, time, vol, rate, is_call)
+    if american.any():
+        premiums[american] = american_prices(spot[american], strike[american], time[american], vol[american],
+                                             rate[american], is_call[american])
+    return premiums
+
+
+# Bumps of the finite differences of american_greeks: relative for the spot (at least two lattice nodes), absolute
+# for the volatility and rate
+GREEK_BUMPS = {'spot': 0.01, 'vol': 0.01, 'rate': 1e-4}
+
+
+def american_greeks(underlying_prices, strike_prices, times_to_expiration, volatilities, risk_free_rates,
+                    is_call=True, steps=LATTICE_STEPS):
+    """
+    Compute the Greeks of a batch of American options by bumping the inputs and repricing on the lattice.
+
+    All bumped batches are priced in one call of american_prices. The spot bumps read the same lattices as the
+    unbumped options, so delta and gamma only cost an interpolation, while vega, rho and theta need lattices of
+    their own. Options that are never exercised early (expired ones and calls with a non-negative rate) get their
+    Black-Scholes Greeks.
+
+    Parameters:
+    underlying_prices (array_like): Current market prices of the underlying assets.
+    strike_prices (array_like): Strike prices of the options.
+    times_to_expiration (array_like): Time remaining until the options expire, in years.
+    volatilities (array_like): Annualized volatilities of the underlying assets.
+    risk_free_rates (array_like): Risk-free interest rates.
+    is_call (array_like of bool): True for calls, False for puts.
+    steps (int): Time steps of the lattice.
+
+    Returns:
+    dict: Arrays of the GREEKS of every option, in the units of black_scholes_greeks.
+    """
+    spot, strike, time, vol, rate, is_call = np.broadcast_arrays(
+        np.asarray(underlying_prices, dtype=float), np.asarray(strike_prices, dtype=float),
+        np.asarray(times_to_expiration, dtype=float), np.asarray(volatilities, dtype=float),
+        np.asarray(risk_free_rates, dtype=float), np.asarray(is_call, dtype=bool))
+    greeks = {greek: np.array(np.broadcast_to(values, spot.shape))
+              for greek, values in black_scholes_greeks(spot, strike, time, vol, rate, is_call).items()}
+    early = (time > 0) & np.isfinite(vol) & ~(is_call & (rate >= 0))
+    if not early.any():
+        return greeks
+
+    spot, strike, time, vol, rate, is_call = (values[early] for values in (spot, strike, time, vol, rate, is_call))
+    # At least two lattice nodes apart, as the lattice values are interpolated linearly between nodes
+    spot_bump = np.maximum(GREEK_BUMPS['spot'], 2 * _lattice_spacing(time, vol, rate, steps)) * spot
+    vol_up = vol + GREEK_BUMPS['vol']
+    vol_down = np.maximum(vol - GREEK_BUMPS['vol'], 0.5 * vol)
+    rate_bump = GREEK_BUMPS['rate']
+    time_bump = np.minimum(1 / 365.25, 0.5 * time)
+    # Unbumped, spot up, spot down, volatility up and down, rate up and down, one day closer to expiration
+    bumped = [(spot, time, vol, rate), (spot + spot_bump, time, vol, rate), (spot - spot_bump, time, vol, rate),
+              (spot, time, vol_up, rate), (spot, time, vol_down, rate), (spot, time, vol, rate + rate_bump),
+              (spot, time, vol, rate - rate_bump), (spot, time - time_bump, vol, rate)]
+    columns = [np.concatenate(values) for values in zip(*bumped)]
+    prices = american_prices(columns[0], np.tile(strike, len(bumped)), columns[1], columns[2], columns[3],
+                             is_call=np.tile(is_call, len(bumped)), steps=steps).reshape(len(bumped), -1)
+    value, spot_up, spot_down, vol_up_value, vol_down_value, rate_up, rate_down, later = prices
+    greeks['delta'][early] = (spot_up - spot_down) / (2 * spot_bump)
+    greeks['gamma'][early] = (spot_up - 2 * value + spot_down) / spot_bump ** 2
+    greeks['vega'][early] = (vol_up_value - vol_down_value) / (vol_up - vol_down)
+    greeks['theta'][early] = (later - value) / time_bump
+    greeks['rho'][early] = (rate_up - rate_down) / (2 * rate_bump)
+    return greeks
+
+
+def option_greeks(underlying_prices, strike_prices, times_to_expiration, volatilities, risk_free_rates, is_call=True,
+                  american=False):
+    """
+    Compute the Greeks of a batch of European and American options, by Black-Scholes and by bumping the lattice
+    respectively.
+
+    Parameters:
+    underlying_prices (array_like): Current market prices of the underlying assets.
+    strike_prices (array_like): Strike prices of the options.
+    times_to_expiration (array_like): Time remaining until the options expire, in years.
+    volatilities (array_like): Annualized volatilities of the underlying assets.
+    risk_free_rates (array_like): Risk-free interest rates.
+    is_call (array_like of bool): True for calls, False for puts.
+    american (array_like of bool): True for American options.
+
+    Returns:
+    dict: Arrays of the GREEKS of every option, in the units of black_scholes_greeks.
+    """
+    spot, strike, time, vol, rate, is_call, american = np.broadcast_arrays(
+        np.asarray(underlying_prices, dtype=float), np.asarray(strike_prices, dtype=float),
+        np.asarray(times_to_expiration, dtype=float), np.asarray(volatilities, dtype=float),
+        np.asarray(risk_free_rates, dtype=float), np.asarray(is_call, dtype=bool), np.asarray(american, dtype=bool))
+    if not american.any():
+        return black_scholes_greeks(spot, strike, time, vol, rate, is_call)
+    greeks = {greek: np.array(np.broadcast_to(values, spot.shape))
+              for greek, values in black_scholes_greeks(spot, strike, time, vol, rate, is_call).items()}
+    for greek, values in american_greeks(spot[american], strike[american], time[american], vol[american],
+                                         rate[american], is_call[american]).items():
+        greeks[greek][american] = values
+    return greeks
+
+
+def _lattice_groups(time, vol, rate, is_call, x, steps):
+    # Options sharing a lattice, with groups split where their moneyness spans more than `steps` nodes, which bounds
+    # the width of every lattice
+    spacing = _lattice_spacing(time, vol, rate, steps)
+    keys, groups = np.unique(np.stack([time, vol, rate, is_call.astype(float)]), axis=1, return_inverse=True)
+    groups = groups.ravel()
+    x_low = np.full(keys.shape[1], np.inf)
+    np.minimum.at(x_low, groups, x)
+    part = np.floor((x - x_low[groups]) / (steps * spacing)).astype(np.int64)
+    if part.any():
+        parts, groups = np.unique(np.stack([groups, part]), axis=1, return_inverse=True)
+        keys = keys[:, parts[0]]
+        groups = groups.ravel()
+    return groups, (keys[0], keys[1], keys[2], keys[3].astype(bool))
+
+
+def _american_values(groups, keys, x, steps):
+    # Values of American options with a strike of 1 at log-moneyness x, on one lattice per group
+    x_low = np.full(len(keys[0]), np.inf)
+    x_high = np.full(len(keys[0]), -np.inf)
+    np.minimum.at(x_low, groups, x)
+    np.maximum.at(x_high, groups, x)
+    return _lattice_values(_american_lattices(*keys, x_low, x_high, steps), groups, x)
+
+
+def _grid_american_values(time, vol, rate, is_call, x, steps):
+    # Black-Scholes values of options with a strike of 1 plus their early exercise premium, interpolated bilinearly
+    # between the lattices at the four corners of every option's cell of the LATTICE_GRID. Options in neighbouring
+    # cells share their corners, so the number of lattices is bounded by the size of the grid
+    vol_step, time_step = LATTICE_GRID
+    vol_cell = np.log(np.maximum(vol, 1e-3)) / vol_step
+    time_cell = np.log(time) / time_step
+    vol_low = np.floor(vol_cell)
+    time_low = np.floor(time_cell)
+    vol_weight = vol_cell - vol_low
+    time_weight = time_cell - time_low
+    corners = [(dv, dt) for dv in (0, 1) for dt in (0, 1)]
+    corner_vol = np.exp(np.concatenate([vol_low + dv for dv, _ in corners]) * vol_step)
+    corner_time = np.exp(np.concatenate([time_low + dt for _, dt in corners]) * time_step)
+    weights = np.concatenate([(vol_weight if dv else 1 - vol_weight) * (time_weight if dt else 1 - time_weight)
+                              for dv, dt in corners])
+    rate, is_call, x, spot = (np.tile(values, 4) for values in (rate, is_call, x, np.exp(x)))
+    groups, keys = _lattice_groups(corner_time, corner_vol, rate, is_call, x, steps)
+    early_premiums = (_american_values(groups, keys, x, steps)
+                      - black_scholes_prices(spot, 1.0, corner_time, corner_vol, rate, is_call))
+    count = len(time)
+    values = (black_scholes_prices(spot[:count], 1.0, time, vol, rate[:count], is_call[:count])
+              + (weights * early_premiums).reshape(4, count).sum(axis=0))
+    # An American option is never worth less than exercising it
+    return np.maximum(values, np.maximum(np.where(is_call[:count], spot[:count] - 1, 1 - spot[:count]), 0.0))
+
+
+def _lattice_spacing(time, vol, rate, steps):
+    # Log-price step of the lattice. The volatility is kept above the drift per step, which keeps the risk-neutral
+    # probabilities within [0, 1] for almost riskless underlyings
+    dt = time / steps
+    return np.maximum(vol, np.maximum(2 * np.abs(rate) * np.sqrt(dt), 1e-6)) * np.sqrt(dt)
+
+
+def _american_lattices(time, vol, rate, is_call, x_low, x_high, steps):
+    """
+    Values of American options with a strike of 1 at the nodes of a log-moneyness grid, for many lattices at once.
+
+    A lattice with spacing h holds the grid x_low - band, ..., x_high + band in steps of h, where band covers
+    LATTICE_WIDTH standard deviations. Stepping back from expiration, every node takes the discounted expectation of
+    its two neighbours or the exercise value, whichever is higher, so after `steps` steps each node holds the value
+    of an option whose binomial tree is rooted there. The edges stay at the exercise value.
+
+    Returns:
+    tuple: Log-moneyness of the first node and spacing of every lattice, and the values with shape
+    (lattices, nodes). Lattices with x_low == x_high are only valid at x_low.
+    """
+    dt = time / steps
+    spacing = _lattice_spacing(time, vol, rate, steps)
+    up = np.exp(spacing)
+    growth = np.exp(rate * dt)
+    probability = (growth - 1 / up) / (up - 1 / up)
+    up_weight = probability / growth
+    down_weight = (1 - probability) / growth
+    band = math.ceil(LATTICE_WIDTH * math.sqrt(steps)) + 1
+    start = x_low - band * spacing
+    width = int(np.max(np.ceil((x_high - x_low) / spacing))) + 2 * band + 1
+    x = start[:, None] + np.arange(width) * spacing[:, None]
+    sign = np.where(is_call, 1.0, -1.0)[:, None]
+    values = np.maximum(sign * (np.exp(x) - 1), 0.0)
+
+    # Each node only depends on the other parity's nodes of the step before, so a lattice read at a single node
+    # only needs every other node per step, half the work of lattices read between nodes
+    single = x_high == x_low
+    for rows, root in ((np.flatnonzero(~single), None), (np.flatnonzero(single), band)):
+        nodes = width if root is None else 2 * band + 1
+        block_rows = max(1, LATTICE_BLOCK // nodes)
+        for first in range(0, len(rows), block_rows):
+            block = rows[first:first + block_rows]
+            values[block, :nodes] = _step_lattices(values[block, :nodes], up_weight[block, None],
+                                                   down_weight[block, None], steps, root)
+    return start, spacing, values
+
+
+def _step_lattices(exercise, up_weight, down_weight, steps, root=None):
+    # Step lattices back from expiration, with their even and odd nodes kept in separate contiguous arrays. With a
+    # root node, only the parity that reaches the root is stepped each time.
+    even_exercise = exercise[:, 0::2].copy()
+    odd_exercise = exercise[:, 1::2].copy()
+    even = even_exercise.copy()
+    odd = odd_exercise.copy()
+    num_even = even.shape[1]
+    num_odd = odd.shape[1]
+    new_even = np.empty_like(even[:, 1:num_odd])
+    even_down = np.empty_like(new_even)
+    new_odd = odd[:, :num_even - 1]
+    odd_down = np.empty_like(new_odd)
+    for step in range(steps, 0, -1):
+        # Parity of the nodes at this step that lead to the root, both parities without a root
+        parity = None if root is None else (root + step - 1) % 2
+        if parity != 1:
+            np.multiply(odd[:, 1:], up_weight, out=new_even)
+            np.multiply(odd[:, :-1], down_weight, out=even_down)
+            new_even += even_down
+            np.maximum(new_even, even_exercise[:, 1:num_odd], out=new_even)
+        if parity != 0:
+            np.multiply(even[:, 1:], up_weight, out=new_odd)
+            np.multiply(even[:, :-1], down_weight, out=odd_down)
+            new_odd += odd_down
+            np.maximum(new_odd, odd_exercise[:, :num_even - 1], out=new_odd)
+        if parity != 1:
+            even[:, 1:num_odd] = new_even
+    values = np.empty_like(exercise)
+    values[:, 0::2] = even
+    values[:, 1::2] = odd
+    return values
+
+
+def _lattice_values(lattices, groups, x):
+    # Linear interpolation of the lattice values at the log-moneyness of every option
+    start, spacing, values = lattices
+    position = (x - start[groups]) / spacing[groups]
+    position = np.where(np.abs(position - np.rint(position)) < 1e-6, np.rint(position), position)
+    node = np.clip(np.floor(position).astype(np.int64), 0, values.shape[1] - 2)
+    weight = position - node
+    return (1 - weight) * values[groups, node] + weight * values[groups, node + 1]
 
 
 class Derivative:
+    is_call = True
+    american = False  # American options can be exercised on any day until they expire
+
     def __init__(self, underlying_asset, strike_price, expiration_date, underlying_price, time_to_expiration,
-                 volatility, risk_free_rate):
+                 volatility, risk_free_rate, premium=None):
         self.underlying_asset = underlying_asset
         self.strike_price = strike_price
         self.expiration_date = expiration_date
-        self.premium = None
-        self.calculate_premium(underlying_price, strike_price, time_to_expiration, volatility, risk_free_rate)
+        self.premium = premium
+        # Set when the bank books the option in its ContractBook
+        self.contract_id = None
+        self.book = None
+        if premium is None:
+            self.calculate_premium(underlying_price, strike_price, time_to_expiration, volatility, risk_free_rate)
+
+    @classmethod
+    def create_batch(cls, underlying_assets, strike_prices, expiration_dates, underlying_prices, times_to_expiration,
+                     volatilities, risk_free_rate):
+        """
+        Create many options of this type, pricing all of them in a single vectorized pass.
+
+        Parameters:
+        underlying_assets (list): Names of the underlying assets.
+        strike_prices (array_like): Strike prices of the options.
+        expiration_dates (list): Expiration dates of the options.
+        underlying_prices (array_like): Current market prices of the underlying assets.
+        times_to_expiration (array_like): Time remaining until the options expire, in years.
+        volatilities (array_like): Volatilities of the underlying assets' prices.
+        risk_free_rate (array_like): Risk-free interest rate(s).
+
+        Returns:
+        list: Option objects with their premiums already set.
+        """
+        premiums = option_prices(underlying_prices, strike_prices, times_to_expiration, volatilities, risk_free_rate,
+                                 is_call=cls.is_call, american=cls.american)
+        strike_prices = np.broadcast_to(np.asarray(strike_prices, dtype=float), premiums.shape)
+        return [cls(underlying_asset=asset, strike_price=float(strike), expiration_date=expiration,
+                    underlying_price=None, time_to_expiration=None, volatility=None, risk_free_rate=None,
+                    premium=float(premium))
+                for asset, strike, expiration, premium in zip(underlying_assets, strike_prices, expiration_dates,
+                                                              premiums)]
 
     def payoff(self, price):
         pass  # Placeholder method, to be implemented in child classes
 
     def calculate_premium(self, underlying_price, strike_price, time_to_expiration, volatility, risk_free_rate):
         """
-        Calculates the premium of an option using the Black-Scholes model.
+        Calculates the premium of an option using the Black-Scholes model, or the binomial lattice for American
+        options.
 
         Parameters:
         underlying_price (float): Current market price of the underlying asset.
@@ -28,17 +629,8 @@ class Derivative:
         Returns:
         float: Estimated premium of the option.
         """
-        # Calculate d1 and d2
-        d1 = (math.log(underlying_price / strike_price) + (
-                    risk_free_rate + 0.5 * volatility ** 2) * time_to_expiration) / (
-                         volatility * math.sqrt(time_to_expiration))
-        d2 = d1 - volatility * math.sqrt(time_to_expiration)
-
-        # Calculate premium using the Black-Scholes formula
-        premium = underlying_price * norm.cdf(d1) - strike_price * math.exp(
-            -risk_free_rate * time_to_expiration) * norm.cdf(d2)
-
-        self.premium = premium
+        self.premium = float(option_prices(underlying_price, strike_price, time_to_expiration, volatility,
+                                           risk_free_rate, is_call=self.is_call, american=self.american))
 
     def print_info(self):
         print("Option Type:", type(self).__name__, "Underlying Asset:", self.underlying_asset,
@@ -46,6 +638,8 @@ class Derivative:
 
 
 class Call(Derivative):
+    is_call = True
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = 'call'
@@ -55,6 +649,8 @@ class Call(Derivative):
 
 
 class Put(Derivative):
+    is_call = False
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = 'put'
@@ -63,6 +659,24 @@ class Put(Derivative):
         return max(0, self.strike_price - price)
 
 
+class AmericanCall(Call):
+    american = True
+
+
+class AmericanPut(Put):
+    american = True
+
+
+def option_class(is_call, american=False):
+    """
+    Returns:
+    type: Call, Put, AmericanCall or AmericanPut.
+    """
+    if american:
+        return AmericanCall if is_call else AmericanPut
+    return Call if is_call else Put
+
+
 # Example usage:
 if __name__ == "__main__":
     # Parameters for option pricing
@@ -76,3 +690,26 @@ if __name__ == "__main__":
                  underlying_price=underlying_price_, time_to_expiration=time_to_expiration_, volatility=volatility_,
                  risk_free_rate=risk_free_rate_)
     print("Call option premium:", call_.premium)
+
+    # Price a whole batch of calls and puts at once
+    premiums_ = black_scholes_prices(underlying_prices=[100, 100, 50], strike_prices=[90, 110, 55],
+                                     times_to_expiration=[0.5, 1, 0.25], volatilities=0.3, risk_free_rates=0.05,
+                                     is_call=[True, False, False])
+    print("Batch premiums:", premiums_)
+
+    # American puts are worth more than European ones, as they can be exercised early
+    american_put_ = AmericanPut(underlying_asset='Put Asset', strike_price=strike_price_, expiration_date='2024-12-31',
+                                underlying_price=underlying_price_, time_to_expiration=time_to_expiration_,
+                                volatility=volatility_, risk_free_rate=risk_free_rate_)
+    print("American put premium:", american_put_.premium)
+
+    # Lattice pricing of a batch as the bank quotes it: many strikes on few underlyings and one expiration date
+    import time
+
+    rng_ = np.random.default_rng(1)
+    assets_ = rng_.integers(0, 20, 10000)
+    start_ = time.perf_counter()
+    american_prices(underlying_prices=np.linspace(90, 110, 20)[assets_], strike_prices=rng_.uniform(80, 120, 10000),
+                    times_to_expiration=14 / 365.25, volatilities=np.linspace(0.1, 0.5, 20)[assets_],
+                    risk_free_rates=0.025, is_call=rng_.random(10000) < 0.5)
+    print(f"10,000 American options at {LATTICE_STEPS} steps in {time.perf_counter() - start_:.3f}s")
@@ -0,0 +1,318 @@
+import json
+import os
+from datetime import date
+
+import numpy as np
+
+from bank import Bank
+from derivatives import option_class
+from market import Asset, Market
+from player import Player
+
+# Columns of every event kind, next to the sequence number and day that every event carries
+EVENT_COLUMNS = {
+    'price': (),  # The prices of all assets are stored as one row per tick
+    'stock_trade': ('player', 'asset', 'quantity', 'price', 'cash_delta'),
+    'option_sale': ('contract', 'is_call', 'asset', 'strike', 'expiry', 'premium', 'bank_income', 'holder', 'slot',
+                    'quantity', 'american'),
+    'option_trade': ('contract', 'player', 'quantity', 'cash_delta'),
+    'settlement': ('contract', 'holder', 'payoff'),
+    'exercise': ('contract', 'holder', 'quantity', 'payoff'),
+}
+
+
+class EventLog:
+    """
+    Append-only log of everything that happens in a game: price ticks, stock trades, option sales and trades,
+    early exercises and settlements.
+
+    Events are buffered in memory and written in batches as columnar .npz chunks into a directory, next to a
+    meta.json describing the assets, players and bank. EventLogReader streams the events back or rebuilds the game
+    state at any day without simulating it again.
+    """
+    def __init__(self, path, chunk_events=100000):
+        self.path = path
+        self.chunk_events = chunk_events
+        self.day = 0
+        self.sequence = 0
+        self.chunks_written = 0
+        self.holders = []
+        self.holder_ids = {}  # id(holder) -> holder id in the log
+        self.asset_ids = {}
+        self._buffer = {kind: [] for kind in EVENT_COLUMNS}
+        self._buffered = 0
+        self._meta = None
+        os.makedirs(path, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def attach(self, market, bank, players, start_date):
+        """
+        Start logging a game: record its initial state and hook the log into the market, bank and players.
+
+        Parameters:
+        market (Market): Market of the game.
+        bank (Bank): Bank of the game.
+        players (list): Players of the game.
+        start_date (datetime.date): Date of the first simulated day, i.e. of the market's next price tick.
+        """
+        assets = list(market.assets.values())
+        self.asset_ids = {asset.name: i for i, asset in enumerate(assets)}
+        for player in players:
+            self._holder_id(player)
+        self._meta = {
+            'start_date': start_date.isoformat(),
+            'start_day': market.length - 1,
+            'assets': [{'name': asset.name, 'mean_change_range': list(asset.mean_change_range),
+                        'variance_change_range': list(asset.variance_change_range)} for asset in assets],
+            'initial_prices': market.prices.tolist(),
+            'players': [{'name': player.name, 'initial_cash': player.cash} for player in players],
+            'bank': {'name': bank.name, 'risk_free_rate': bank.risk_free_rate, 'total_value': bank.total_value,
+                     'total_payouts': bank.total_payouts},
+        }
+        self._write_meta()
+        self.day = market.length - 1
+        market.event_log = bank.event_log = self
+        for player in players:
+            player.event_log = self
+
+    def record_prices(self, first_day, prices):
+        for offset, row in enumerate(prices):
+            self._append('price', first_day + offset, (np.array(row, dtype=float),))
+        self.day = first_day + len(prices) - 1
+
+    def record_stock_trade(self, player, asset_name, quantity, price, cash_delta):
+        self._append('stock_trade', self.day,
+                     (self._holder_id(player), self.asset_ids[asset_name], quantity, price, cash_delta))
+
+    def record_option_sales(self, book, contract_ids, bank_income):
+        ids = np.asarray(contract_ids)
+        asset_ids = np.array([self.asset_ids[name] for name in book.asset_names], dtype=np.int64)
+        holders = [self._holder_id(book.holders[holder]) if holder >= 0 else -1 for holder in book.holder[ids]]
+        for i, contract_id in enumerate(ids.tolist()):
+            self._append('option_sale', self.day, (
+                contract_id, book.is_call[contract_id], asset_ids[book.asset_index[contract_id]],
+                book.strike[contract_id], book.expiry[contract_id], book.premium[contract_id], bank_income[i],
+                holders[i], book.slot[contract_id], book.quantity[contract_id], book.american[contract_id]))
+
+    def record_option_trade(self, player, contract_id, quantity, cash_delta):
+        self._append('option_trade', self.day, (contract_id, self._holder_id(player), quantity, cash_delta))
+
+    def record_exercise(self, holder, contract_id, quantity, payoff):
+        self._append('exercise', self.day, (contract_id, self._holder_id(holder), quantity, payoff))
+
+    def record_settlements(self, book, contract_ids, payoffs):
+        for contract_id, payoff in zip(np.asarray(contract_ids).tolist(), np.asarray(payoffs).tolist()):
+            holder = book.holder[contract_id]
+            self._append('settlement', self.day,
+                         (contract_id, self._holder_id(book.holders[holder]) if holder >= 0 else -1, payoff))
+
+    def flush(self):
+        """
+        Write the buffered events as one columnar chunk.
+        """
+        if not self._buffered:
+            return
+        arrays = {}
+        for kind, events in self._buffer.items():
+            columns = ('seq', 'day', 'values') if kind == 'price' else ('seq', 'day') + EVENT_COLUMNS[kind]
+            rows = list(zip(*events)) if events else [()] * len(columns)
+            for column, values in zip(columns, rows):
+                arrays[f"{kind}.{column}"] = np.array(values)
+        np.savez(os.path.join(self.path, f"chunk_{self.chunks_written:06d}.npz"), **arrays)
+        self.chunks_written += 1
+        self._buffer = {kind: [] for kind in EVENT_COLUMNS}
+        self._buffered = 0
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+
+    def _append(self, kind, day, values):
+        self._buffer[kind].append((self.sequence, day) + tuple(values))
+        self.sequence += 1
+        self._buffered += 1
+        if self._buffered >= self.chunk_events:
+            self.flush()
+
+    def _holder_id(self, holder):
+        key = id(holder)
+        if key not in self.holder_ids:
+            self.holder_ids[key] = len(self.holders)
+            self.holders.append(getattr(holder, 'name', type(holder).__name__))
+        return self.holder_ids[key]
+
+    def _write_meta(self):
+        if self._meta is None:
+            return
+        self._meta['holders'] = self.holders
+        self._meta['chunks'] = self.chunks_written
+        with open(os.path.join(self.path, 'meta.json'), 'w') as file:
+            json.dump(self._meta, file)
+
+
+class EventLogReader:
+    """
+    Reads an event log written by EventLog.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as file:
+            self.meta = json.load(file)
+        self._columns = None
+
+    def chunks(self):
+        for i in range(self.meta['chunks']):
+            with np.load(os.path.join(self.path, f"chunk_{i:06d}.npz")) as chunk:
+                yield {key: chunk[key] for key in chunk.files}
+
+    def iter_events(self, kinds=None):
+        """
+        Stream the events in the order they happened, one chunk in memory at a time.
+
+        Parameters:
+        kinds (list): Event kinds to stream, defaults to all of them.
+
+        Yields:
+        tuple: Event kind and a dict of its fields.
+        """
+        kinds = kinds or list(EVENT_COLUMNS)
+        for chunk in self.chunks():
+            events = []
+            for kind in kinds:
+                columns = ('day', 'values') if kind == 'price' else ('day',) + EVENT_COLUMNS[kind]
+                for i, seq in enumerate(chunk[f"{kind}.seq"].tolist()):
+                    events.append((seq, kind, {column: chunk[f"{kind}.{column}"][i] for column in columns}))
+            events.sort(key=lambda event: event[0])
+            for _, kind, fields in events:
+                yield kind, fields
+
+    def columns(self, kind):
+        """
+        All events of one kind as columns (dict of NumPy arrays), concatenated over the chunks.
+        """
+        if self._columns is None:
+            collected = {}
+            for chunk in self.chunks():
+                for key, values in chunk.items():
+                    if len(values):
+                        collected.setdefault(key, []).append(values)
+            self._columns = {key: np.concatenate(values) for key, values in collected.items()}
+        names = ('seq', 'day', 'values') if kind == 'price' else ('seq', 'day') + EVENT_COLUMNS[kind]
+        num_assets = len(self.meta['assets'])
+        empty = {'values': np.zeros((0, num_assets))}
+        return {name: self._columns.get(f"{kind}.{name}", empty.get(name, np.zeros(0))) for name in names}
+
+    def replay(self, day=None):
+        """
+        Rebuild the market, bank and players as they were at the end of a day, from the logged events only.
+
+        Bot populations are not rebuilt, but the contracts they hold stay in the bank's book.
+
+        Parameters:
+        day (int): Market day to rebuild, defaults to the last logged day.
+
+        Returns:
+        tuple: Market, bank, list of players and the date of the day.
+        """
+        meta = self.meta
+        prices = self.columns('price')
+        initial_prices = np.array(meta['initial_prices'], dtype=float)
+        history = np.vstack([initial_prices, prices['values'][np.argsort(prices['seq'])]])
+        last_day = meta['start_day'] + len(prices['seq'])
+        day = last_day if day is None else min(day, last_day)
+
+        assets = [Asset(name=spec['name'], initial_price=None, mean_change_range=tuple(spec['mean_change_range']),
+                        variance_change_range=tuple(spec['variance_change_range'])) for spec in meta['assets']]
+        for i, asset in enumerate(assets):
+            asset.price_history = history[:day + 1, i].tolist()
+        market = Market.of(assets)
+
+        bank = Bank(name=meta['bank']['name'], risk_free_rate=meta['bank']['risk_free_rate'])
+        bank.total_payouts = meta['bank']['total_payouts']
+        players = [Player(name=spec['name'], initial_cash=spec['initial_cash'], verbose=False)
+                   for spec in meta['players']]
+        holders = {i: player for i, player in enumerate(players)}  # Players come first in the log's holder ids
+        for i, name in enumerate(meta.get('holders', [])[len(players):], len(players)):
+            if name == bank.name:
+                holders[i] = bank  # Stock trades of the bank's hedging account
+
+        # Stock positions and cash from the stock trades up to the day, of the players and the bank's hedge
+        trades = self._until(self.columns('stock_trade'), day)
+        for player_id, asset_id, quantity, cash_delta in zip(trades['player'].tolist(), trades['asset'].tolist(),
+                                                             trades['quantity'].tolist(),
+                                                             trades['cash_delta'].tolist()):
+            player = holders[player_id]
+            name = assets[asset_id].name
+            player.stocks_portfolio[name] = player.stocks_portfolio.get(name, 0) + quantity
+            player.cash += cash_delta
+
+        # Contracts sold up to the day, with the quantities traded by players and the settlements applied
+        sales = self._until(self.columns('option_sale'), day)
+        quantities = {}
+        options = {}
+        for i, contract_id in enumerate(sales['contract'].tolist()):
+            options[contract_id] = option_class(sales['is_call'][i], sales['american'][i])(
+                underlying_asset=assets[sales['asset'][i]].name, strike_price=float(sales['strike'][i]),
+                expiration_date=date.fromordinal(int(sales['expiry'][i])), underlying_price=None,
+                time_to_expiration=None, volatility=None, risk_free_rate=None, premium=float(sales['premium'][i]))
+            if sales['holder'][i] in holders and sales['quantity'][i]:
+                quantities[contract_id] = (sales['holder'][i], int(sales['quantity'][i]))
+
+        option_trades = self._until(self.columns('option_trade'), day)
+        for contract_id, player_id, quantity, cash_delta in zip(
+                option_trades['contract'].tolist(), option_trades['player'].tolist(),
+                option_trades['quantity'].tolist(), option_trades['cash_delta'].tolist()):
+            holders[player_id].cash += cash_delta
+            held = quantities.get(contract_id, (player_id, 0))[1] + quantity
+            quantities[contract_id] = (player_id, held)
+
+        exercises = self._until(self.columns('exercise'), day)
+        bank.total_payouts += float(exercises['payoff'].sum())
+        for contract_id, holder_id, quantity, payoff in zip(exercises['contract'].tolist(),
+                                                            exercises['holder'].tolist(),
+                                                            exercises['quantity'].tolist(),
+                                                            exercises['payoff'].tolist()):
+            holders[holder_id].cash += payoff
+            held = quantities[contract_id][1] - quantity
+            quantities[contract_id] = (holder_id, held)
+            if not held:
+                # Fully exercised contracts are closed in the book
+                options.pop(contract_id, None)
+                quantities.pop(contract_id)
+
+        settlements = self._until(self.columns('settlement'), day)
+        bank.total_payouts += float(settlements['payoff'].sum())
+        for contract_id, holder_id, payoff in zip(settlements['contract'].tolist(), settlements['holder'].tolist(),
+                                                  settlements['payoff'].tolist()):
+            if holder_id in holders:
+                holders[holder_id].cash += payoff
+            options.pop(contract_id, None)
+            quantities.pop(contract_id, None)
+
+        open_options = list(options.values())
+        if open_options:
+            bank.book.add(open_options)
+        for contract_id, (player_id, quantity) in quantities.items():
+            if contract_id in options and quantity > 0:
+                option = options[contract_id]
+                holders[player_id].derivatives_portfolio.add(option, quantity)
+                bank.book.assign(option.contract_id, holders[player_id], quantity)
+        # Premiums come from the sales to bots and the option trades of the players, including closed contracts
+        bank.total_value = (meta['bank']['total_value'] + float(sales['bank_income'].sum())
+                            - float(option_trades['cash_delta'].sum()))
+
+        start_date = date.fromisoformat(meta['start_date'])
+        current_date = date.fromordinal(start_date.toordinal() + max(day - meta['start_day'] - 1, 0))
+        bank.today = current_date
+        return market, bank, players, current_date
+
+    @staticmethod
+    def _until(columns, day):
+        order = np.argsort(columns['seq'], kind='stable')
+        keep = columns['day'][order] <= day
+        return {name: values[order][keep] for name, values in columns.items()}
@@ -0,0 +1,311 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from bank import Bank
+from eventlog import EventLog
+from history import ChunkedHistory
+from instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from main import initialize_assets, simulate_day
+from market import Market
+from orderbook import Exchange, MarketMaker
+from player import Player
+from risk import BookRiskEngine
+from snapshot import GameSnapshot, GameState
+from strategies import AgentPopulation, MarketSnapshot, RandomOptionBuyer, RandomStockBuyer, step_populations
+from valuation import ValuationEngine
+
+
+class SimulationConfig:
+    def __init__(self, num_assets=5, num_players=2, num_days=30, seed=None, initial_cash=1000,
+                 option_duration_days=14, risk_free_rate=0.025, num_bots=0, event_log_path=None,
+                 history_path=None, render_path=None, render_fps=10,
+                 delta_hedge=False, order_book=False, instrument=False, metrics_path=None, profile_days=None,
+                 profile_path=None, american_options=False, snapshot_every=None, snapshot_path=None, ticks_per_day=1,
+                 ticks_per_bar=None):
+        """
+        Parameters of a headless game.
+
+        Parameters:
+        num_assets (int): Number of assets in the market.
+        num_players (int): Number of automated players. Even-numbered players buy stocks, odd-numbered ones buy
+            options from the bank, like Player 1 and Player 2 of the interactive game.
+        num_days (int): Number of days to simulate.
+        seed (int): Seed of the game, the same seed always gives the same game.
+        initial_cash (float): Starting cash of every player.
+        option_duration_days (int): Days until the options sold on a day expire.
+        risk_free_rate (float): Risk-free rate used by the bank.
+        num_bots (int): Number of array-backed bot agents, split into a population of stock buyers and a population
+            of option buyers.
+        event_log_path (str): Directory to write the game's event log to, no log is written if None.
+        history_path (str): Directory to keep the price history in as memory-mapped chunks, kept in memory if None.
+        render_path (str): Directory for PNG frames, or a .gif or .mp4 file, to render the game into offscreen.
+        render_fps (int): Frames per second of wall-clock time rendered while the game runs.
+        delta_hedge (bool): Let the bank hedge the delta of its book in the underlyings at the end of every day.
+        order_book (bool): Trade stocks through limit order books with a market maker, the last trades of a day
+            feed into the next day's prices.
+        instrument (bool): Time the phases of the day loop and count contracts and trades, returned with the result.
+        metrics_path (str): File to export the instrumentation to at the end, Prometheus text for .prom files and
+            JSON otherwise. Turns instrumentation on.
+        profile_days (tuple): First and last day (inclusive, counted from 0) to run cProfile for. Turns
+            instrumentation on.
+        profile_path (str): File to dump the profile of those days to.
+        american_options (bool): Let the bank sell American options, which the option buyers exercise early when the
+            payoff is worth more than holding on.
+        snapshot_every (int): Take a snapshot of the game state every this many days, starting before the first
+            day. Snapshots are returned with the result.
+        snapshot_path (str): Directory to also save the snapshots to, as day_000010.snapshot files.
+        ticks_per_day (int): Intraday price ticks per day. With more than one, the ticks are folded into OHLC bars and
+            volatilities are realized from them, only the daily closes are kept in the price history.
+        ticks_per_bar (int): Ticks per OHLC bar, one bar per day if None.
+        """
+        self.num_assets = num_assets
+        self.num_players = num_players
+        self.num_days = num_days
+        self.seed = seed
+        self.initial_cash = initial_cash
+        self.option_duration_days = option_duration_days
+        self.risk_free_rate = risk_free_rate
+        self.num_bots = num_bots
+        self.event_log_path = event_log_path
+        self.history_path = history_path
+        self.render_path = render_path
+        self.render_fps = render_fps
+        self.delta_hedge = delta_hedge
+        self.order_book = order_book
+        self.instrument = instrument
+        self.metrics_path = metrics_path
+        self.profile_days = profile_days
+        self.profile_path = profile_path
+        self.american_options = american_options
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = snapshot_path
+        self.ticks_per_day = ticks_per_day
+        self.ticks_per_bar = ticks_per_bar
+
+
+class SimulationResult:
+    """
+    Per-day results of a headless game as NumPy arrays.
+
+    Attributes:
+    dates (list): Date of every simulated day.
+    asset_names (list): Names of the assets, in column order.
+    player_names (list): Names of the players, in column order.
+    prices (numpy.ndarray): Prices with shape (num_days + 1, assets), starting with the initial prices. When the game
+        kept its prices in a ChunkedHistory they are read from it on access, as a view unless they span chunks.
+    history (ChunkedHistory): The game's price history, None if the prices were kept in memory.
+    equity (numpy.ndarray): Equity of every player at the end of each day, shape (num_days, players).
+    bank_pnl (numpy.ndarray): Premiums paid to the bank for the options actually bought, minus its payouts, plus the
+        value of its hedging account, cumulative at the end of each day.
+    contracts_sold (numpy.ndarray): Option contracts bought by players on each day.
+    contracts_settled (numpy.ndarray): Contracts settled on each day.
+    population_names (list): Names of the bot populations, in column order.
+    population_equity (numpy.ndarray): Mean equity of the agents of every population, shape (num_days, populations).
+    instruments (Instrumentation): Timers and counters of the game, None if instrumentation was off.
+    snapshots (dict): Days simulated -> GameSnapshot taken after them, empty unless snapshots were asked for.
+    """
+    def __init__(self, dates, asset_names, player_names, prices, equity, bank_pnl, contracts_sold,
+                 contracts_settled, population_names=(), population_equity=None, instruments=None, snapshots=None):
+        self.dates = dates
+        self.asset_names = asset_names
+        self.player_names = player_names
+        self.history = prices if isinstance(prices, ChunkedHistory) else None
+        self._prices = None if self.history is not None else prices
+        self.equity = equity
+        self.bank_pnl = bank_pnl
+        self.contracts_sold = contracts_sold
+        self.contracts_settled = contracts_settled
+        self.population_names = list(population_names)
+        self.population_equity = population_equity if population_equity is not None else np.zeros((len(dates), 0))
+        self.instruments = instruments
+        self.snapshots = snapshots if snapshots is not None else {}
+
+    @property
+    def prices(self):
+        if self.history is not None:
+            return self.history.window(0, len(self.history))
+        return self._prices
+
+    def to_dataframe(self):
+        """
+        Collect the per-day results in a pandas DataFrame indexed by date (requires pandas).
+
+        Returns:
+        pandas.DataFrame: One column per asset price, player equity and bank figure.
+        """
+        import pandas as pd
+
+        columns = {f"price {name}": self.prices[1:, i] for i, name in enumerate(self.asset_names)}
+        columns.update({f"equity {name}": self.equity[:, i] for i, name in enumerate(self.player_names)})
+        columns.update({f"mean equity {name}": self.population_equity[:, i]
+                        for i, name in enumerate(self.population_names)})
+        columns.update({"bank pnl": self.bank_pnl, "contracts sold": self.contracts_sold,
+                        "contracts settled": self.contracts_settled})
+        return pd.DataFrame(columns, index=pd.Index(self.dates, name="date"))
+
+
+def new_game(config):
+    """
+    Set up the market, bank, players and bots of a headless game, before its first day.
+
+    Parameters:
+    config (SimulationConfig): Parameters of the game.
+
+    Returns:
+    GameState: State of the game at day 0.
+    """
+    rng = random.Random(config.seed)
+    assets = initialize_assets(config.num_assets, rng)
+    history = ChunkedHistory(config.history_path) if config.history_path is not None else None
+    market = Market.of(assets, seed=rng.getrandbits(64), history=history, ticks_per_day=config.ticks_per_day,
+                       ticks_per_bar=config.ticks_per_bar)
+    bank = Bank(name="ABC Bank", risk_free_rate=config.risk_free_rate)
+    players = [Player(name=f"Player {i+1}", initial_cash=config.initial_cash, verbose=False)
+               for i in range(config.num_players)]
+    book_risk = BookRiskEngine(bank, assets, hedge=True) if config.delta_hedge else None
+    exchange = None
+    if config.order_book:
+        # Same flat fee as Player.buy_stock, the market maker holds enough cash and shares to quote all game long
+        exchange = Exchange(assets, fee=5)
+        maker = Player(name="Market Maker", initial_cash=1e12, verbose=False)
+        maker.stocks_portfolio.update({asset.name: 10 ** 9 for asset in assets})
+        exchange.add_market_maker(MarketMaker(maker))
+    populations = []
+    if config.num_bots:
+        populations = [
+            AgentPopulation("Stock bots", config.num_bots - config.num_bots // 2, len(assets), RandomStockBuyer(),
+                            config.initial_cash, seed=rng.getrandbits(64)),
+            AgentPopulation("Option bots", config.num_bots // 2, len(assets), RandomOptionBuyer(),
+                            config.initial_cash, seed=rng.getrandbits(64)),
+        ]
+    return GameState(datetime.now().date(), rng, market, bank, players, populations, exchange, book_risk)
+
+
+def run_headless(config, state=None):
+    """
+    Simulate a whole game without any printing, plotting or input.
+
+    Parameters:
+    config (SimulationConfig): Parameters of the game.
+    state (GameState): State to continue from, e.g. restored from a GameSnapshot, a new game if None. The game
+        runs until day config.num_days.
+
+    Returns:
+    SimulationResult: Per-day prices, equities and bank figures of the days simulated.
+    """
+    if state is None:
+        state = new_game(config)
+    elif state.day and config.event_log_path is not None:
+        raise ValueError("An event log has to start with the game, a game continued from a snapshot cannot log.")
+    rng, market, bank, players = state.rng, state.market, state.bank, state.players
+    assets, populations, exchange, book_risk = state.assets, state.populations, state.exchange, state.book_risk
+    history = market.history
+    stock_buyers, option_buyers = players[0::2], players[1::2]
+    valuation = ValuationEngine(assets, players, risk_free_rate=config.risk_free_rate)
+    instruments = NULL_INSTRUMENTATION
+    if config.instrument or config.metrics_path is not None or config.profile_days is not None:
+        instruments = Instrumentation(config.profile_days, config.profile_path)
+    instruments.attach(bank)
+    snapshots = {}
+    if config.snapshot_path is not None:
+        os.makedirs(config.snapshot_path, exist_ok=True)
+
+    today = state.start_date
+    event_log = None
+    if config.event_log_path is not None:
+        event_log = EventLog(config.event_log_path)
+        event_log.attach(market, bank, players, today)
+    renderer = None
+    if config.render_path is not None:
+        from plotting import BlittedLivePlot
+
+        renderer = BlittedLivePlot([asset.name for asset in assets], [player.name for player in players],
+                                   fps=config.render_fps, offscreen=True, output=config.render_path)
+        renderer.start()
+    first_day = state.day
+    num_days = max(config.num_days - first_day, 0)
+    dates = []
+    equity = np.empty((num_days, len(players)))
+    bank_pnl = np.empty(num_days)
+    contracts_sold = np.empty(num_days, dtype=np.int64)
+    contracts_settled = np.empty(num_days, dtype=np.int64)
+    population_equity = np.empty((num_days, len(populations)))
+
+    if config.snapshot_every and first_day % config.snapshot_every == 0:
+        snapshots[first_day] = _take_snapshot(state, config.snapshot_path)
+    for i, day in enumerate(range(first_day, first_day + num_days)):
+        instruments.begin_day(day)
+        current_date = today + timedelta(days=day)
+        bank.today = current_date
+        contracts_sold[i], contracts_settled[i] = simulate_day(
+            market, bank, stock_buyers, option_buyers, current_date,
+            current_date + timedelta(days=config.option_duration_days), rng, exchange, instruments,
+            config.american_options)
+        if populations:
+            with instruments.phase('populations'):
+                filled, bought = step_populations(market, bank, populations, day, current_date,
+                                                  current_date + timedelta(days=config.option_duration_days))
+                snapshot = MarketSnapshot.from_market(market, day, current_date)
+                population_equity[i] = [population.equity(snapshot, bank).mean() for population in populations]
+            contracts_sold[i] += bought
+            instruments.count('stock_trades', filled)
+            instruments.count('options_bought', bought)
+        if book_risk is not None:
+            with instruments.phase('risk'):
+                book_risk.update(current_date)
+        with instruments.phase('valuation'):
+            equity[i] = valuation.equities(current_date)
+            bank_pnl[i] = bank.total_value - bank.total_payouts + bank.calculate_hedge_value(assets)
+        dates.append(current_date)
+        if renderer is not None:
+            with instruments.phase('plot'):
+                renderer.submit(market.last_prices, equity[i], market.day_bar())
+        state.day = day + 1
+        if config.snapshot_every and state.day % config.snapshot_every == 0:
+            with instruments.phase('snapshot'):
+                snapshots[state.day] = _take_snapshot(state, config.snapshot_path)
+        instruments.end_day(day)
+
+    instruments.close()
+    if config.metrics_path is not None:
+        instruments.export(config.metrics_path)
+    if event_log is not None:
+        event_log.close()
+    if history is not None:
+        history.flush()
+    if renderer is not None:
+        renderer.stop()
+    # A chunked history is handed over as it is, its prices are only read into memory on access
+    prices = market.prices.copy() if history is None else history
+    return SimulationResult(dates, [asset.name for asset in assets], [player.name for player in players],
+                            prices, equity, bank_pnl, contracts_sold, contracts_settled,
+                            [population.name for population in populations], population_equity,
+                            instruments if instruments.enabled else None, snapshots)
+
+
+def _take_snapshot(state, directory=None):
+    snapshot = GameSnapshot.capture(state)
+    if directory is not None:
+        snapshot.save(os.path.join(directory, f"day_{state.day:06d}.snapshot"))
+    return snapshot
+
+
+# Example usage:
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    result = run_headless(SimulationConfig(num_assets=20, num_players=4, num_days=252 * 5, seed=1))
+    print(f"Simulated {len(result.dates)} days in {time.perf_counter() - start:.2f}s")
+    print("Final equity:", dict(zip(result.player_names, result.equity[-1].round(2))))
+    print("Bank P&L:", result.bank_pnl[-1].round(2), "contracts sold:", result.contracts_sold.sum(),
+          "settled:", result.contracts_settled.sum())
+
+    # The same kind of game with 10,000 bots trading alongside the players
+    start = time.perf_counter()
+    result = run_headless(SimulationConfig(num_assets=5, num_players=2, num_days=60, seed=1, num_bots=10000))
+    print(f"Simulated {len(result.dates)} days with 10,000 bots in {time.perf_counter() - start:.2f}s")
+    print("Mean bot equity:", dict(zip(result.population_names, result.population_equity[-1].round(2))))
@@ -0,0 +1,226 @@
+import json
+import os
+
+import numpy as np
+
+
+class ChunkedHistory:
+    """
+    Price history with shape (days, assets) stored in float64 chunks of a fixed number of days.
+
+    With a directory, every chunk is a numpy.memmap file, so the history of very long simulations lives on disk and
+    only the pages that are read stay in memory. Without a directory the chunks are ordinary in-memory arrays. The
+    last row is read in O(1), and windows that fall within one chunk are views into it without any copy.
+    """
+    def __init__(self, directory=None, chunk_days=65536, num_assets=0):
+        self.directory = directory
+        self.chunk_days = chunk_days
+        self.width = num_assets
+        self.length = 0
+        self.chunks = []
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Open a history written to a directory by an earlier run.
+
+        Parameters:
+        directory (str): Directory of the history.
+
+        Returns:
+        ChunkedHistory: The history, with its chunks mapped from the files.
+        """
+        with open(os.path.join(directory, 'history.json')) as file:
+            meta = json.load(file)
+        history = cls(directory, meta['chunk_days'], meta['width'])
+        history.length = meta['length']
+        history.chunks = [np.memmap(history._chunk_path(i), dtype=np.float64, mode='r+',
+                                    shape=(history.chunk_days, history.width))
+                          for i in range(-(-history.length // history.chunk_days))]
+        return history
+
+    def __len__(self):
+        return self.length
+
+    def __getstate__(self):
+        # Snapshots hold the filled rows in memory, so a copied history never writes into the files of this one
+        state = dict(self.__dict__, directory=None)
+        state['chunks'] = [np.array(chunk[:min(self.length - i * self.chunk_days, self.chunk_days)])
+                           for i, chunk in enumerate(self.chunks)]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for i, rows in enumerate(self.chunks):
+            if len(rows) < self.chunk_days:
+                chunk = self._new_chunk(i, self.width)
+                chunk[:len(rows)] = rows
+                self.chunks[i] = chunk
+
+    def last(self):
+        """
+        numpy.ndarray: View of the last row, the latest price of every asset.
+        """
+        chunk, offset = divmod(self.length - 1, self.chunk_days)
+        return self.chunks[chunk][offset]
+
+    def append(self, rows):
+        """
+        Append one or more days of prices.
+
+        Parameters:
+        rows (numpy.ndarray): Prices with shape (days, assets).
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        written = 0
+        while written < len(rows):
+            chunk, offset = divmod(self.length, self.chunk_days)
+            if chunk == len(self.chunks):
+                self.chunks.append(self._new_chunk(chunk, self.width))
+            count = min(len(rows) - written, self.chunk_days - offset)
+            self.chunks[chunk][offset:offset + count, :rows.shape[1]] = rows[written:written + count]
+            written += count
+            self.length += count
+
+    def set_column(self, index, values):
+        """
+        Write the whole history of one asset, widening the chunks when the asset is new.
+
+        Parameters:
+        index (int): Column of the asset.
+        values (array_like): Prices of the asset, one per day. Sets the length of an empty history.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if index >= self.width:
+            self._widen(index + 1)
+        if self.length == 0:
+            self.append(np.full((len(values), self.width), np.nan))
+        elif len(values) != self.length:
+            raise ValueError(f"Expected {self.length} prices, got {len(values)}.")
+        for chunk, start, stop in self._spans(0, self.length):
+            self.chunks[chunk][start:stop, index] = values[chunk * self.chunk_days + start:
+                                                           chunk * self.chunk_days + stop]
+
+    def window(self, start, stop, column=None):
+        """
+        Rows start to stop (exclusive) of the history, of all assets or of one column.
+
+        Parameters:
+        start (int): First day.
+        stop (int): Day after the last one.
+        column (int): Asset column, all columns if None.
+
+        Returns:
+        numpy.ndarray: A view into the chunk when the window falls within one chunk, a copy otherwise.
+        """
+        columns = slice(None) if column is None else column
+        parts = [self.chunks[chunk][chunk_start:chunk_stop, columns]
+                 for chunk, chunk_start, chunk_stop in self._spans(start, stop)]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty((0, self.width) if column is None else 0)
+        return np.concatenate(parts)
+
+    def column(self, index):
+        """
+        HistoryColumn: Read-only, sequence-like view of the history of one asset.
+        """
+        return HistoryColumn(self, index)
+
+    def flush(self):
+        """
+        Write the chunks and the layout of the history to its directory.
+        """
+        if self.directory is None:
+            return
+        for chunk in self.chunks:
+            chunk.flush()
+        with open(os.path.join(self.directory, 'history.json'), 'w') as file:
+            json.dump({'chunk_days': self.chunk_days, 'width': self.width, 'length': self.length}, file)
+
+    def _spans(self, start, stop):
+        # (chunk, start within the chunk, stop within the chunk) of every chunk touched by the rows start:stop
+        start, stop = max(start, 0), min(stop, self.length)
+        while start < stop:
+            chunk, offset = divmod(start, self.chunk_days)
+            count = min(stop - start, self.chunk_days - offset)
+            yield chunk, offset, offset + count
+            start += count
+
+    def _chunk_path(self, chunk):
+        return os.path.join(self.directory, f"prices_{chunk:06d}.f64")
+
+    def _new_chunk(self, chunk, width):
+        if self.directory is None:
+            return np.empty((self.chunk_days, width))
+        return np.memmap(self._chunk_path(chunk), dtype=np.float64, mode='w+', shape=(self.chunk_days, width))
+
+    def _widen(self, width):
+        # Rows are stored contiguously, so adding assets rewrites every chunk. Assets are added before the game starts
+        for i, chunk in enumerate(self.chunks):
+            rows = np.array(chunk)
+            del chunk
+            self.chunks[i] = None
+            self.chunks[i] = self._new_chunk(i, width)
+            self.chunks[i][:, :self.width] = rows
+        self.width = width
+
+
+class HistoryColumn:
+    """
+    Price history of one asset in a ChunkedHistory, indexed like a list or a 1-d array.
+
+    Integer indexing reads one price without copying, slices within one chunk are views into it.
+    """
+    def __init__(self, history, index):
+        self.history = history
+        self.index = index
+
+    def __len__(self):
+        return self.history.length
+
+    def __getitem__(self, key):
+        history = self.history
+        if isinstance(key, slice):
+            start, stop, step = key.indices(history.length)
+            if step != 1:
+                return self.window(0, history.length)[key]
+            return history.window(start, max(start, stop), self.index)
+        if key < 0:
+            key += history.length
+        if not 0 <= key < history.length:
+            raise IndexError("price history index out of range")
+        chunk, offset = divmod(key, history.chunk_days)
+        return history.chunks[chunk][offset, self.index]
+
+    def __iter__(self):
+        for chunk, start, stop in self.history._spans(0, self.history.length):
+            yield from self.history.chunks[chunk][start:stop, self.index]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.window(0, self.history.length), dtype=dtype)
+
+    def window(self, start, stop):
+        return self.history.window(start, stop, self.index)
+
+    def tolist(self):
+        return self.window(0, self.history.length).tolist()
+
+
+# Example usage:
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        history = ChunkedHistory(directory, chunk_days=4)
+        history.set_column(0, [100.0])
+        history.set_column(1, [50.0])
+        history.append(np.cumprod(np.full((9, 2), 1.01), axis=0) * [100.0, 50.0])
+        prices = history.column(0)
+        print("Days:", len(prices), "last price:", prices[-1])
+        print("Last 3 days:", prices[-3:])
+        history.flush()
+        print("Reopened last row:", ChunkedHistory.open(directory).last())
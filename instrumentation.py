@@ -0,0 +1,236 @@
+import cProfile
+import json
+import pstats
+import time
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullInstrumentation:
+    """
+    Instrumentation that records nothing, used when instrumentation is off.
+
+    Every method does nothing and phase returns one shared context manager, so instrumented code costs a method
+    call per phase or counter and no allocations.
+    """
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, amount=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def begin_day(self, day):
+        pass
+
+    def end_day(self, day):
+        pass
+
+    def attach(self, bank):
+        bank.instruments = self
+
+    def close(self):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class _Phase:
+    __slots__ = ('stats', 'start')
+
+    def __init__(self, stats):
+        self.stats = stats  # [calls, total seconds, longest call in seconds]
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stats = self.stats
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        return False
+
+
+class Instrumentation(NullInstrumentation):
+    """
+    Wall-time timers for the phases of the day loop, counters and gauges of a game.
+
+    Phases are timed with `with instruments.phase('settlement'):`. Counters only grow (contracts settled, trades
+    executed, strike-search iterations), gauges hold the latest value of a level (contracts open). Snapshots can be
+    exported as JSON or in the Prometheus text format.
+    """
+    enabled = True
+
+    def __init__(self, profile_days=None, profile_path=None, prefix='game'):
+        """
+        Parameters:
+        profile_days (tuple): First and last day (inclusive) to run cProfile for, no profiling if None.
+        profile_path (str): File to dump the profile to on close, for pstats or snakeviz.
+        prefix (str): Prefix of the Prometheus metric names.
+        """
+        self.phases = {}  # Phase name -> [calls, total seconds, longest call in seconds]
+        self.counters = {}
+        self.gauges = {}
+        self.days = 0
+        self.prefix = prefix
+        self.profile_days = profile_days
+        self.profile_path = profile_path
+        self.profiler = cProfile.Profile() if profile_days is not None else None
+        self._profiling = False
+        self._phase_timers = {}
+        self._started = time.perf_counter()
+
+    def phase(self, name):
+        timer = self._phase_timers.get(name)
+        if timer is None:
+            timer = self._phase_timers[name] = _Phase(self.phases.setdefault(name, [0, 0.0, 0.0]))
+        return timer
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def begin_day(self, day):
+        """
+        Start a day of the game, and the profiler if the day is in the profiled range.
+        """
+        if self.profiler is not None and self.profile_days[0] <= day <= self.profile_days[1] and not self._profiling:
+            self.profiler.enable()
+            self._profiling = True
+
+    def end_day(self, day):
+        self.days += 1
+        if self._profiling and day >= self.profile_days[1]:
+            self.profiler.disable()
+            self._profiling = False
+
+    def close(self):
+        """
+        Stop the profiler and dump its profile if a path was given.
+        """
+        if self._profiling:
+            self.profiler.disable()
+            self._profiling = False
+        if self.profiler is not None and self.profile_path is not None:
+            self.profiler.dump_stats(self.profile_path)
+
+    def profile_stats(self, sort='cumulative'):
+        """
+        Returns:
+        pstats.Stats: Statistics of the profiled days, or None without profiling.
+        """
+        if self.profiler is None:
+            return None
+        return pstats.Stats(self.profiler).sort_stats(sort)
+
+    def snapshot(self):
+        """
+        Current values of all timers, counters and gauges.
+
+        Returns:
+        dict: JSON-serializable snapshot.
+        """
+        return {
+            'days': self.days,
+            'wall_seconds': time.perf_counter() - self._started,
+            'phases': {name: {'calls': calls, 'seconds': total, 'max_seconds': longest}
+                       for name, (calls, total, longest) in self.phases.items()},
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+        }
+
+    def to_json(self, path=None):
+        """
+        Export a snapshot as JSON.
+
+        Parameters:
+        path (str): File to write to, the JSON is only returned if None.
+
+        Returns:
+        str: The snapshot as JSON.
+        """
+        text = json.dumps(self.snapshot(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text + '\n')
+        return text
+
+    def to_prometheus(self, path=None):
+        """
+        Export a snapshot in the Prometheus text exposition format.
+
+        Parameters:
+        path (str): File to write to, e.g. for the textfile collector of the node exporter. Only returned if None.
+
+        Returns:
+        str: The snapshot as Prometheus metrics.
+        """
+        prefix = self.prefix
+        lines = [f"# HELP {prefix}_phase_seconds_total Wall time spent in a phase of the day loop.",
+                 f"# TYPE {prefix}_phase_seconds_total counter"]
+        lines += [f'{prefix}_phase_seconds_total{{phase="{name}"}} {total!r}'
+                  for name, (_, total, _) in sorted(self.phases.items())]
+        lines += [f"# HELP {prefix}_phase_calls_total Times a phase of the day loop ran.",
+                  f"# TYPE {prefix}_phase_calls_total counter"]
+        lines += [f'{prefix}_phase_calls_total{{phase="{name}"}} {calls}'
+                  for name, (calls, _, _) in sorted(self.phases.items())]
+        lines += [f"# TYPE {prefix}_days_total counter", f"{prefix}_days_total {self.days}"]
+        for name, value in sorted(self.counters.items()):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value!r}"]
+        for name, value in sorted(self.gauges.items()):
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value!r}"]
+        text = "\n".join(lines) + "\n"
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def export(self, path):
+        """
+        Write a snapshot to a file, in the Prometheus format for .prom files and as JSON otherwise.
+        """
+        if path.endswith('.prom'):
+            self.to_prometheus(path)
+        else:
+            self.to_json(path)
+
+    def print_info(self):
+        total = sum(total for _, total, _ in self.phases.values())
+        print(f"{self.days} days, {total:.3f}s in timed phases")
+        for name, (calls, seconds, longest) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+            share = seconds / total if total else 0.0
+            print(f"  {name:<16} {seconds:8.3f}s {share:6.1%}  {calls} calls, longest {longest * 1000:.2f} ms")
+        for name, value in sorted(self.counters.items()):
+            print(f"  {name}: {value}")
+        for name, value in sorted(self.gauges.items()):
+            print(f"  {name}: {value}")
+
+
+# Example usage:
+if __name__ == "__main__":
+    from headless import SimulationConfig, run_headless
+
+    result = run_headless(SimulationConfig(num_assets=20, num_players=4, num_days=252, seed=1, instrument=True,
+                                           profile_days=(100, 109)))
+    result.instruments.print_info()
+    print(result.instruments.to_prometheus())
+    result.instruments.profile_stats().print_stats(8)
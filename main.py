@@ -1,46 +1,50 @@
 import time
 from datetime import datetime, timedelta
 import random
-import matplotlib.pyplot as plt
 import numpy as np
 
 from market import Asset, Market
 from bank import Bank
 from player import Player
-from plotting import LivePlot  # Import the LivePlot class
-from derivatives import Call, Put
+from derivatives import american_prices
+from valuation import ValuationEngine
+from instrumentation import NULL_INSTRUMENTATION
 
 
-def initialize_assets(num_assets):
+def initialize_assets(num_assets, rng=random):
     """
     Initialize assets for the market.
 
     Parameters:
     num_assets (int): Number of assets to initialize.
+    rng (random.Random): Source of randomness, defaults to the global random module.
 
     Returns:
     list: List of initialized Asset objects.
     """
     assets = []
     for i in range(num_assets):
-        lower = random.uniform(0.95, 0.99)
-        upper = random.uniform(1.01, 1.07)
-        asset = Asset(name=f"Asset {i+1}", initial_price=random.randint(95, 105),
+        lower = rng.uniform(0.95, 0.99)
+        upper = rng.uniform(1.01, 1.07)
+        asset = Asset(name=f"Asset {i+1}", initial_price=rng.randint(95, 105),
                       mean_change_range=(lower, upper),
                       variance_change_range=(0.005, (upper / lower - 1)))
         assets.append(asset)
     return assets
 
 
-def initialize_players():
+def initialize_players(initial_cash=1000):
     """
     Initialize players for the simulation.
 
+    Parameters:
+    initial_cash (float): Starting cash of each player.
+
     Returns:
     tuple: Two initialized Player objects.
     """
-    player1 = Player(name="Player 1", initial_cash=1000)
-    player2 = Player(name="Player 2", initial_cash=1000)
+    player1 = Player(name="Player 1", initial_cash=initial_cash)
+    player2 = Player(name="Player 2", initial_cash=initial_cash)
     return player1, player2
 
 
@@ -54,20 +58,27 @@ def initialize_bank():
     return Bank(name="ABC Bank")
 
 
-def initialize_simulation():
+def initialize_simulation(num_assets=5, initial_cash=1000):
     """
     Initialize assets, players, and bank for the simulation.
 
+    Parameters:
+    num_assets (int): Number of assets in the market.
+    initial_cash (float): Starting cash of each player.
+
     Returns:
     tuple: Initialized assets, players, and bank.
     """
-    assets = initialize_assets(5)
+    assets = initialize_assets(num_assets)
+    # Put the assets into one market so their prices are advanced together
+    Market.of(assets, seed=random.getrandbits(64))
     bank = initialize_bank()
-    player1, player2 = initialize_players()
+    player1, player2 = initialize_players(initial_cash)
     return assets, bank, player1, player2
 
 
-def simulate_market(assets, bank, player1, player2, num_days, live_plotter=None, player3=None):
+def simulate_market(assets, bank, player1, player2, num_days, live_plotter=None, player3=None,
+                    instruments=NULL_INSTRUMENTATION):
     """
     Simulate the market based on asset value changes.
 
@@ -77,33 +88,24 @@ def simulate_market(assets, bank, player1, player2, num_days, live_plotter=None,
     player1 (Player): Player 1 object.
     player2 (Player): Player 2 object.
     num_days (int): Number of days to simulate.
+    instruments (Instrumentation): Timers and counters of the day loop, off by default.
     """
     today = datetime.now().date()
+    market = Market.of(assets)
+    players = [player for player in (player1, player2, player3) if player is not None]
+    valuation = ValuationEngine(assets, players, risk_free_rate=bank.risk_free_rate)
+    instruments.attach(bank)
 
     for day in range(num_days):
+        instruments.begin_day(day)
         expiration_date = today + timedelta(weeks=2)
-        # Update asset prices in the market
-        for asset in assets:
-            asset.update_price()
-
-        # Player 1 buys stocks
-        for asset in assets:
-            quantity = random.randint(0, 2)  # Random quantity
-            player1.buy_stock(asset, quantity)
-
-        # Player 2 buys derivatives from the bank
-        for asset in assets:
-            option_type = random.choice(['Call', 'Put'])  # Random option type
-            option = bank.sell_option(option_type, asset, expiration_date)
-            quantity = random.randint(0, int(option.premium))  # Random quantity
-            if quantity:
-                player2.buy_option(option, 1)
-
-        # Execute expired derivatives
-        execute_expired_derivatives(bank, today + timedelta(days=day), assets, player2)
+        # Update asset prices, let player 1 buy stocks and player 2 buy derivatives, and execute expired derivatives
+        simulate_day(market, bank, [player1], [player2], today + timedelta(days=day), expiration_date,
+                     instruments=instruments)
 
         if live_plotter is not None:
-            plot(live_plotter, assets, day, player1, player2, player3)
+            with instruments.phase('plot'):
+                plot(live_plotter, assets, day, player1, player2, player3, valuation, today + timedelta(days=day))
 
         # Allow the third player to interactively buy stocks and derivatives
         if player3 is not None:
@@ -111,12 +113,79 @@ def simulate_market(assets, bank, player1, player2, num_days, live_plotter=None,
             interactive_buy(player3, assets, bank, today + timedelta(days=day))
 
         # Print portfolio values of players and bank
-        print(f"Day {day+1}:")
-        print(f"{player1.name}'s portfolio value: {player1.calculate_portfolio_value(assets)}")
-        print(f"{player2.name}'s portfolio value: {player2.calculate_portfolio_value(assets)}")
-        print(f"{player3.name}'s portfolio value: {player3.calculate_portfolio_value(assets)}")
-        print(f"{bank.name}'s derivatives portfolio value: {bank.calculate_portfolio_value()}")
-        print("-----------------------")
+        with instruments.phase('valuation'):
+            print(f"Day {day+1}:")
+            for player in players:
+                print(f"{player.name}'s portfolio value: {valuation.equity(player, today + timedelta(days=day))}")
+            print(f"{bank.name}'s derivatives portfolio value: {bank.calculate_portfolio_value()}")
+            print("-----------------------")
+        instruments.end_day(day)
+
+
+def simulate_day(market, bank, stock_buyers, option_buyers, current_date, expiration_date, rng=random, exchange=None,
+                 instruments=NULL_INSTRUMENTATION, american=False):
+    """
+    Simulate one trading day of the automated players.
+
+    Parameters:
+    market (Market): Market holding the assets.
+    bank (Bank): Bank object.
+    stock_buyers (list): Players that buy random quantities of stocks.
+    option_buyers (list): Players that buy random options from the bank.
+    current_date (datetime.date): Date of the day.
+    expiration_date (datetime.date): Expiration date of the options sold on this day.
+    rng (random.Random): Source of randomness, defaults to the global random module.
+    exchange (Exchange): Order books to trade the stocks in. The prices then start from the last trades of the
+        previous day and the stock buyers buy with market orders, otherwise they buy at the last price.
+    instruments (Instrumentation): Timers of the day's phases and counters, off by default.
+    american (bool): The bank sells American options, which the option buyers exercise early when that is optimal.
+
+    Returns:
+    tuple: Number of option contracts bought by the players and number of contracts settled.
+    """
+    assets = list(market.assets.values())
+
+    # Update asset prices in the market
+    with instruments.phase('update_prices'):
+        if exchange is not None:
+            market.update_prices(start_prices=exchange.closing_prices(list(market.assets)))
+            exchange.open_day(market)
+        else:
+            market.update_prices()
+
+    # Stock buyers buy stocks
+    trades = 0
+    with instruments.phase('stock_trading'):
+        for player in stock_buyers:
+            for asset in assets:
+                quantity = rng.randint(0, 2)  # Random quantity
+                if exchange is None:
+                    trades += bool(player.buy_stock(asset, quantity))
+                elif quantity:
+                    trades += exchange.submit(player, asset.name, 'buy', quantity)[1] > 0
+    instruments.count('stock_trades', trades)
+
+    # Option buyers buy derivatives from the bank, quoted for all assets and players at once
+    bought = 0
+    with instruments.phase('option_sales'):
+        option_types = [rng.choice(['Call', 'Put']) for _ in option_buyers for _ in assets]  # Random option types
+        options = (bank.sell_options(option_types, assets * len(option_buyers), expiration_date, american=american)
+                   if option_types else [])
+        for i, option in enumerate(options):
+            quantity = rng.randint(0, int(option.premium))  # Random quantity
+            if quantity and option_buyers[i // len(assets)].buy_option(option, 1):
+                bought += 1
+    instruments.count('options_bought', bought)
+
+    # Exercise American options early where that is worth more than holding them
+    if american:
+        with instruments.phase('exercise'):
+            exercise_american_options(bank, option_buyers, assets, current_date)
+
+    # Execute expired derivatives
+    with instruments.phase('settlement'):
+        settled, _ = execute_expired_derivatives(bank, current_date, assets)
+    return bought, len(settled)
 
 
 def interactive_buy(player, assets, bank, today):
@@ -167,7 +236,7 @@ def interactive_buy(player, assets, bank, today):
     # Allow the player to buy derivatives from the bank
     while True:
         try:
-            action = input("(B)uy or (S)ell or (L)ist options (or Enter to skip): ").upper()
+            action = input("(B)uy, (S)ell, (E)xercise or (L)ist options (or Enter to skip): ").upper()
             if action == '':
                 break
             elif action == 'B':
@@ -182,7 +251,8 @@ def interactive_buy(player, assets, bank, today):
                 expiration_date = today + timedelta(days=float(duration))
                 if not expiration_date:
                     raise ValueError("Expiration date is required.")
-                option = bank.sell_option(option_type, asset, expiration_date, risk=risk)
+                american = input("American, to exercise on any day (y/N): ").strip().lower() == 'y'
+                option = bank.sell_option(option_type, asset, expiration_date, risk=risk, american=american)
                 player.buy_option(option, quantity)
             elif action == 'S':
                 option_type, asset_number, quantity = input("Enter Call/Put, asset number, quantity (separated by space): ").split()
@@ -190,65 +260,138 @@ def interactive_buy(player, assets, bank, today):
                 quantity = int(quantity)
                 asset = assets[asset_number - 1]
                 player.sell_option(option_type, asset, quantity)
+            elif action == 'E':
+                option_type, asset_number, quantity = input(
+                    "Enter Call/Put, asset number, quantity (separated by space): ").split()
+                asset = assets[int(asset_number) - 1]
+                if not player.exercise_option(option_type, asset, int(quantity), bank):
+                    raise ValueError("No American options of this type on this asset to exercise.")
             elif action == 'L':
                 print("Options:")
-                for option in player.derivatives_portfolio:
-                    print(f"{option.type} on {option.underlying_asset} until {option.expiration_date} "
-                          f"with strike price {option.strike_price}")
+                for option, quantity in player.derivatives_portfolio.items():
+                    style = "American " if option.american else ""
+                    print(f"{quantity} {style}{option.type} on {option.underlying_asset} "
+                          f"until {option.expiration_date} with strike price {option.strike_price}")
         except ValueError as e:
             print(e)
             continue
 
 
-def execute_expired_derivatives(bank, current_date, assets, player):
+def exercise_american_options(bank, players, assets, current_date):
+    """
+    Let players exercise the American options that are worth no more than their exercise value, i.e. where the
+    lattice says that early exercise is optimal.
+
+    Parameters:
+    bank (Bank): Bank that sold the options.
+    players (list): Players holding the options.
+    assets (list): Asset objects, including every underlying of the options.
+    current_date (datetime.date): Date of the day, the options' remaining time is counted from it.
+
+    Returns:
+    int: Number of options exercised.
+    """
+    assets_by_name = {asset.name: asset for asset in assets}
+    lots = [(player, option, quantity) for player in players
+            for option, quantity in player.derivatives_portfolio.items() if option.american]
+    if not lots:
+        return 0
+    underlyings = [assets_by_name[option.underlying_asset] for _, option, _ in lots]
+    spot = np.array([asset.price_history[-1] for asset in underlyings], dtype=float)
+    strike = np.array([option.strike_price for _, option, _ in lots])
+    is_call = np.array([option.is_call for _, option, _ in lots])
+    time_to_expiration = np.array([(option.expiration_date - current_date).days / 365.25
+                                   for _, option, _ in lots])
+    values = american_prices(spot, strike, time_to_expiration, [asset.volatility for asset in underlyings],
+                             bank.risk_free_rate, is_call)
+    exercise_values = np.maximum(np.where(is_call, spot - strike, strike - spot), 0.0)
+    exercised = 0
+    for i in np.flatnonzero((exercise_values > 0) & (exercise_values >= values - 1e-9 * strike)).tolist():
+        player, option, quantity = lots[i]
+        bank.exercise_option(player, option, quantity, underlyings[i])
+        exercised += quantity
+    return exercised
+
+
+def execute_expired_derivatives(bank, current_date, assets, player=None):
     """
     Execute expired derivatives in the bank's portfolio.
 
+    Only the contracts expiring up to the current date are touched, and their payoffs are credited to whoever
+    holds them.
+
     Parameters:
     bank (Bank): Bank object.
     current_date (datetime.date): Current date.
+    assets (list): List of Asset objects.
+    player (Player): Unused, the bank's contract book knows the holder of every contract.
+
+    Returns:
+    tuple: Ids of the settled contracts and their payoffs.
     """
-    expired_derivatives = [derivative for derivative in bank.derivatives_portfolio if derivative.expiration_date <= current_date]
-    for derivative in expired_derivatives:
-        payoff = derivative.payoff([asset.price_history[-1] for asset in assets
-                                    if derivative.underlying_asset == asset.name][0])
-        if derivative in player.derivatives_portfolio:
-            player.cash += payoff
+    return bank.settle_expired(current_date, assets)
+
 
-        bank.derivatives_portfolio.remove(derivative)
+def plot(live_plotter, assets, day, player1, player2, player3, valuation=None, current_date=None):
+    # Plotting is imported only once there is a plot, so games without one never load matplotlib
+    import matplotlib.pyplot as plt
+    from plotting import BlittedLivePlot
 
+    if isinstance(live_plotter, BlittedLivePlot):
+        # Queue the day and let the plot draw if a frame is due, without pausing the simulation
+        players = [player for player in (player1, player2, player3) if player is not None]
+        values = [valuation.equity(player, current_date) if valuation is not None
+                  else player.calculate_portfolio_value(assets) for player in players]
+        market = assets[0].market
+        live_plotter.submit([asset.price_history[-1] for asset in assets], values,
+                            market.day_bar() if market is not None else None)
+        live_plotter.pump()
+        return
 
-def plot(live_plotter, assets, day, player1, player2, player3):
     # Update the plots
     live_plotter.update_stock_plot(assets, day + 1)
     if player3 is not None:
-        live_plotter.update_player_plot([player1, player2, player3], assets, day + 1)
+        live_plotter.update_player_plot([player1, player2, player3], assets, day + 1, valuation, current_date)
     else:
-        live_plotter.update_player_plot([player1, player2], assets, day + 1)
+        live_plotter.update_player_plot([player1, player2], assets, day + 1, valuation, current_date)
 
     # Add a pause to show the plot for each day
     plt.pause(1)
 
 
-def main():
+def main(num_assets=5, num_days=30, initial_cash=1000, seed=None, show_plot=True):
+    """
+    Play the interactive game: two automated players and Player 3, who buys through the console.
+
+    Parameters:
+    num_assets (int): Number of assets in the market.
+    num_days (int): Number of days to play.
+    initial_cash (float): Starting cash of each player.
+    seed (int): Seed of the game's randomness, random if None.
+    show_plot (bool): Show the live plot of the stock and player values.
+    """
+    if seed is not None:
+        random.seed(seed)
     # Initialize assets, players, and bank
-    assets, bank, player1, player2 = initialize_simulation()
-    player3 = Player(name="Player 3", initial_cash=1000)
+    assets, bank, player1, player2 = initialize_simulation(num_assets, initial_cash)
+    player3 = Player(name="Player 3", initial_cash=initial_cash)
 
-    # Initialize live plotting
-    live_plotter = LivePlot()
+    # Initialize live plotting of the stock values and player asset values
+    live_plotter = None
+    if show_plot:
+        from plotting import BlittedLivePlot
 
-    # Initialize the plots for stock values and player asset values
-    live_plotter.initialize_stock_plot(assets)
-    live_plotter.initialize_player_plot([player1, player2, player3])
+        live_plotter = BlittedLivePlot([asset.name for asset in assets], [player1.name, player2.name, player3.name])
 
-    # Simulate market changes for a certain number of days
-    num_days = 30
-    # Simulate market changes for the current day
+    # Simulate market changes for the given number of days
     simulate_market(assets, bank, player1, player2, num_days, live_plotter, player3=player3)
 
     # Keep the plots open after the simulation finishes
-    plt.show()
+    if live_plotter is not None:
+        import matplotlib.pyplot as plt
+
+        live_plotter.pump(force=True)
+        plt.show()
 
 
 if __name__ == "__main__":
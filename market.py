@@ -1,33 +1,460 @@
 import random
 
+import numpy as np
+
+from bars import BarAggregator
+
+TRADING_DAYS_PER_YEAR = 252
+TICK_BLOCK = 1 << 18  # Tick prices generated at once in tick mode, 2 MB of float64
+
+
+class WelfordVolatility:
+    """
+    Running mean and variance of returns, updated in O(1) per observation with Welford's algorithm.
+
+    The state may be an array, in which case every element tracks the returns of a different asset.
+    """
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, returns):
+        self.count += 1
+        delta = returns - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (returns - self.mean)
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return np.full(np.shape(self.m2), np.nan)
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class EWMAVolatility:
+    """
+    Exponentially weighted variance of returns (RiskMetrics style, zero mean), updated in O(1) per observation.
+    """
+    def __init__(self, decay=0.94, shape=()):
+        self.decay = decay
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._variance = np.zeros(shape)
+
+    def update(self, returns):
+        if self.count == 0:
+            self._variance = np.square(returns) + np.zeros_like(self._variance)
+        else:
+            self._variance = self.decay * self._variance + (1 - self.decay) * np.square(returns)
+        self.count += 1
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return np.full(np.shape(self._variance), np.nan)
+        return self._variance
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class RollingVolatility:
+    """
+    Variance of the returns in a fixed window, kept with running sums over a ring buffer.
+    """
+    def __init__(self, window=20, shape=()):
+        self.window = window
+        self.count = 0
+        self._buffer = np.zeros((window,) + np.zeros(shape).shape)
+        self._sum = np.zeros(shape)
+        self._sum_squares = np.zeros(shape)
+
+    def update(self, returns):
+        slot = self.count % self.window
+        if self.count >= self.window:
+            oldest = self._buffer[slot]
+            self._sum = self._sum - oldest
+            self._sum_squares = self._sum_squares - oldest ** 2
+        self._buffer[slot] = returns
+        self._sum = self._sum + returns
+        self._sum_squares = self._sum_squares + np.square(returns)
+        self.count += 1
+
+    @property
+    def mean(self):
+        n = min(self.count, self.window)
+        return self._sum / n if n else np.full(np.shape(self._sum), np.nan)
+
+    @property
+    def variance(self):
+        n = min(self.count, self.window)
+        if n == 0:
+            return np.full(np.shape(self._sum), np.nan)
+        # Clip the tiny negative values the running sums can produce through cancellation
+        return np.maximum(self._sum_squares / n - (self._sum / n) ** 2, 0.0)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class UniformMultiplicativeModel:
+    """
+    The game's original price model, vectorized over assets: every step draws a mean change and a variance change
+    per asset and multiplies the price by a uniform factor around the mean change.
+    """
+    def __init__(self, mean_change_ranges, variance_change_ranges, floor=0.001):
+        self.mean_low, self.mean_high = np.asarray(mean_change_ranges, dtype=float).T
+        self.variance_low, self.variance_high = np.asarray(variance_change_ranges, dtype=float).T
+        self.floor = floor
+
+    @classmethod
+    def from_assets(cls, assets):
+        return cls([asset.mean_change_range for asset in assets], [asset.variance_change_range for asset in assets])
+
+    def simulate(self, rng, last_prices, num_steps, steps_per_day=1):
+        """
+        Simulate a block of price steps for all assets.
+
+        Parameters:
+        rng (numpy.random.Generator): Random number generator to draw from.
+        last_prices (numpy.ndarray): Current prices of the assets, with the assets along the last axis. Leading axes
+            (e.g. scenario paths) are simulated independently.
+        num_steps (int): Number of steps to simulate.
+        steps_per_day (int): Steps in a day, for intraday ticks. Each step takes the middle of the mean change range
+            to the power 1 / steps_per_day, and the deviations of the mean change and of the factor scaled by
+            1 / sqrt(steps_per_day), so a day of steps has about the drift and variance of one daily step.
+
+        Returns:
+        numpy.ndarray: Simulated prices with shape (num_steps,) + last_prices.shape.
+        """
+        shape = (num_steps,) + np.shape(last_prices)
+        mean_change = rng.uniform(self.mean_low, self.mean_high, shape)
+        variance_change = rng.uniform(self.variance_low, self.variance_high, shape)
+        factors = rng.uniform(mean_change - variance_change, mean_change + variance_change)
+        if steps_per_day > 1:
+            middle = 0.5 * (self.mean_low + self.mean_high)
+            scale = 1 / np.sqrt(steps_per_day)
+            factors = np.maximum(middle ** (1 / steps_per_day) * (1 + (mean_change / middle - 1) * scale)
+                                 * (1 + (factors / mean_change - 1) * scale), 0.0)
+            prices = np.asarray(last_prices, dtype=float) * np.cumprod(factors, axis=0)
+            if (prices >= self.floor).all():
+                return prices
+
+        # The price floor makes every step depend on the floored previous price, so only the assets are vectorized
+        prices = np.empty(shape)
+        previous = np.asarray(last_prices, dtype=float)
+        for step in range(num_steps):
+            previous = prices[step] = np.maximum(self.floor, previous * factors[step])
+        return prices
+
+
+class GBMModel:
+    """
+    Geometric Brownian motion with a drift and volatility per asset, simulated exactly in log space.
+    """
+    def __init__(self, drifts, volatilities, dt=1 / TRADING_DAYS_PER_YEAR):
+        self.drifts = np.asarray(drifts, dtype=float)
+        self.volatilities = np.asarray(volatilities, dtype=float)
+        self.dt = dt
+
+    def shocks(self, rng, shape):
+        return rng.standard_normal(shape)
+
+    def simulate(self, rng, last_prices, num_steps, steps_per_day=1):
+        shape = (num_steps,) + np.shape(last_prices)
+        dt = self.dt / steps_per_day
+        log_returns = ((self.drifts - 0.5 * self.volatilities ** 2) * dt
+                       + self.volatilities * np.sqrt(dt) * self.shocks(rng, shape))
+        return np.asarray(last_prices, dtype=float) * np.exp(np.cumsum(log_returns, axis=0))
+
+
+class CorrelatedGBMModel(GBMModel):
+    """
+    Geometric Brownian motion whose shocks are correlated across assets through the Cholesky factor of a
+    correlation matrix.
+    """
+    def __init__(self, drifts, volatilities, correlation, dt=1 / TRADING_DAYS_PER_YEAR):
+        super().__init__(drifts, volatilities, dt)
+        self.correlation = np.asarray(correlation, dtype=float)
+        self.cholesky = np.linalg.cholesky(self.correlation)
+
+    def shocks(self, rng, shape):
+        return rng.standard_normal(shape) @ self.cholesky.T
+
 
 class Asset:
-    def __init__(self, name, initial_price, mean_change_range, variance_change_range):
+    def __init__(self, name, initial_price, mean_change_range, variance_change_range, volatility_estimator=None):
         self.name = name
+        # Set when the asset is added to a Market, whose price buffer then holds the history
+        self.market = None
+        self.market_index = None
         self.price_history = [initial_price]
         self.mean_change_range = mean_change_range
         self.variance_change_range = variance_change_range
+        # Running statistics of the daily returns, Welford mean/variance unless another estimator is given
+        self.volatility_estimator = volatility_estimator if volatility_estimator is not None else WelfordVolatility()
+
+    @property
+    def price_history(self):
+        """
+        Prices of the asset so far, oldest first.
+
+        Returns:
+        list, numpy.ndarray or HistoryColumn: The asset's own list, or a view into the market's price storage once it
+            is in a Market.
+        """
+        if self.market is None:
+            return self._price_history
+        return self.market.price_column(self.market_index)
+
+    @price_history.setter
+    def price_history(self, price_history):
+        if self.market is not None:
+            raise AttributeError(f"The price history of {self.name} is owned by its market.")
+        self._price_history = price_history
+
+    @property
+    def volatility(self):
+        """
+        Annualized volatility of the asset's returns, read from the running estimator.
+
+        Returns:
+        float: Volatility, assuming 252 trading days in a year.
+        """
+        if self.market is not None:
+            return float(self.market.volatilities[self.market_index])
+        return float(self.volatility_estimator.std) * np.sqrt(TRADING_DAYS_PER_YEAR)
 
     def update_price(self):
+        if self.market is not None:
+            raise RuntimeError(f"{self.name} is part of a market, use Market.update_prices() to advance its price.")
+
         # Simulate price evolution with variable mean and variance
         mean_change = random.uniform(*self.mean_change_range)
         variance_change = random.uniform(*self.variance_change_range)
 
         # Ensure non-negative prices
         new_price = max(0.001, self.price_history[-1] * random.uniform(mean_change - variance_change, mean_change + variance_change))
+        self.volatility_estimator.update(new_price / self.price_history[-1] - 1)
         self.price_history.append(new_price)
 
 
 class Market:
-    def __init__(self):
+    """
+    Price engine that keeps the prices of all its assets in one (days x assets) NumPy buffer.
+
+    The buffer is preallocated and grows in chunks of days. Every step advances all assets at once through a
+    vectorized price model, and the assets' price histories are views into the buffer. For very long simulations a
+    ChunkedHistory can hold the prices instead, e.g. in memory-mapped files.
+
+    In tick mode every day is simulated as ticks_per_day intraday ticks, generated in blocks of at most TICK_BLOCK
+    prices, however long a day is, and folded into OHLC bars as they arrive. Only the daily closes enter the price
+    history, and volatilities come from the realized variance of the ticks.
+    """
+    def __init__(self, model=None, seed=None, chunk_size=256, volatility_estimator=WelfordVolatility, history=None,
+                 ticks_per_day=1, ticks_per_bar=None, bar_capacity=256):
         self.assets = {}
+        self.model = model  # None means the original uniform model, built from the assets' ranges
+        self.rng = np.random.default_rng(seed)
+        self.chunk_size = chunk_size
+        self.history = history  # Optional ChunkedHistory used instead of the in-memory buffer
+        self.volatility_estimator = volatility_estimator
+        self.length = 0
+        self._buffer = np.empty((0, 0))
+        self._estimator = volatility_estimator(shape=0)
+        self._default_model = None
+        self.event_log = None  # Set by EventLog.attach
+        self.ticks_per_day = ticks_per_day
+        self.ticks_per_bar = ticks_per_bar if ticks_per_bar is not None else ticks_per_day
+        if ticks_per_day % self.ticks_per_bar:
+            raise ValueError("A day has to hold a whole number of bars.")
+        self.bar_capacity = bar_capacity
+        self.bars = None  # BarAggregator of the ticks, created with the first ticks
+
+    def __getstate__(self):
+        # Snapshots keep only the filled days of the buffer, and leave the event log behind
+        state = dict(self.__dict__, event_log=None)
+        state['_buffer'] = self._buffer[:self.length].copy()
+        return state
+
+    @classmethod
+    def of(cls, assets, **kwargs):
+        """
+        Return the market the assets belong to, creating one for them if they are not in a market yet.
+
+        Parameters:
+        assets (list): Asset objects.
+
+        Returns:
+        Market: Market holding exactly these assets.
+        """
+        markets = {id(asset.market) for asset in assets}
+        if len(markets) == 1 and assets[0].market is not None and len(assets[0].market.assets) == len(assets):
+            return assets[0].market
+        market = cls(**kwargs)
+        for asset in assets:
+            market.add_asset(asset)
+        return market
+
+    @property
+    def prices(self):
+        """
+        numpy.ndarray: View of the price buffer with shape (days, assets). With a ChunkedHistory this is a copy
+            once the prices span more than one chunk, use window() for recent prices.
+        """
+        if self.history is not None:
+            return self.history.window(0, self.length)
+        return self._buffer[:self.length, :len(self.assets)]
+
+    @property
+    def last_prices(self):
+        if self.history is not None:
+            return self.history.last()
+        return self._buffer[self.length - 1, :len(self.assets)]
+
+    def window(self, num_days):
+        """
+        Prices of the last days, shape (days, assets).
+
+        Parameters:
+        num_days (int): Number of days.
+
+        Returns:
+        numpy.ndarray: View of the prices, unless a ChunkedHistory has to join two chunks.
+        """
+        start = max(self.length - num_days, 0)
+        if self.history is not None:
+            return self.history.window(start, self.length)
+        return self._buffer[start:self.length, :len(self.assets)]
+
+    def price_column(self, index):
+        """
+        Price history of the asset in a column, as a view into the price storage.
+        """
+        if self.history is not None:
+            return self.history.column(index)
+        return self._buffer[:self.length, index]
+
+    @property
+    def volatilities(self):
+        """
+        numpy.ndarray: Annualized volatility of every asset, assuming 252 trading days in a year. Realized volatility
+            of the ticks in tick mode.
+        """
+        if self.bars is not None and self.bars.ticks:
+            return self.bars.realized_volatility(self.ticks_per_day * TRADING_DAYS_PER_YEAR)
+        return np.asarray(self._estimator.std) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    def day_bar(self):
+        """
+        OHLC bar of the last simulated day in tick mode, merged from its bars.
+
+        Returns:
+        dict: Arrays of open, high, low, close and realized variance per asset, or None without ticks.
+        """
+        if self.bars is None or not self.bars.count:
+            return None
+        return self.bars.merged(self.ticks_per_day // self.ticks_per_bar)
 
     def add_asset(self, asset):
+        if asset.market is not None:
+            raise ValueError(f"{asset.name} is already part of a market.")
+        asset_prices = np.asarray(asset.price_history, dtype=float)
+        if self.assets and len(asset_prices) != self.length:
+            raise ValueError(f"{asset.name} has {len(asset_prices)} prices, but the market is at day {self.length}.")
+
+        n = len(self.assets)
+        if self.history is not None:
+            self.history.set_column(n, asset_prices)
+        else:
+            self._reserve(len(asset_prices), n + 1)
+            self._buffer[:len(asset_prices), n] = asset_prices
+        self.length = len(asset_prices)
+        asset.market = self
+        asset.market_index = n
         self.assets[asset.name] = asset
+        self._default_model = None
+        self.bars = None
 
-    def update_prices(self):
-        for asset in self.assets.values():
-            asset.update_price()
+        # Restart the running statistics so the new column is covered as well
+        prices = self.prices
+        self._estimator = self.volatility_estimator(shape=n + 1)
+        for returns in prices[1:] / prices[:-1] - 1:
+            self._estimator.update(returns)
+
+    def update_prices(self, num_steps=1, start_prices=None):
+        """
+        Advance the prices of all assets by one or more steps at once.
+
+        Parameters:
+        num_steps (int): Number of steps to simulate.
+        start_prices (array_like): Prices to step from instead of the last prices, e.g. the last trade prices of an
+            Exchange, in the market's asset order. NaN keeps the last price of an asset.
+        """
+        if not self.assets:
+            return
+        model = self.model
+        if model is None:
+            if self._default_model is None:
+                self._default_model = UniformMultiplicativeModel.from_assets(self.assets.values())
+            model = self._default_model
+
+        previous = self.last_prices.copy()
+        start = previous
+        if start_prices is not None:
+            start_prices = np.asarray(start_prices, dtype=float)
+            start = np.where(np.isnan(start_prices), previous, start_prices)
+        if self.ticks_per_day > 1:
+            block = self._simulate_ticks(model, start, num_steps)
+        else:
+            block = model.simulate(self.rng, start, num_steps)
+        if self.history is not None:
+            self.history.append(block)
+        else:
+            self._reserve(self.length + num_steps, len(self.assets))
+            self._buffer[self.length:self.length + num_steps, :len(self.assets)] = block
+        self.length += num_steps
+        if self.event_log is not None:
+            self.event_log.record_prices(self.length - num_steps, block)
+
+        for returns in block / np.vstack([previous, block[:-1]]) - 1:
+            self._estimator.update(returns)
+
+    def _simulate_ticks(self, model, start, num_days):
+        # Ticks are generated in blocks of at most TICK_BLOCK prices, which may start and end anywhere within a day,
+        # and folded into the bars. Only the closes of the days are kept
+        ticks_per_day = self.ticks_per_day
+        if self.bars is None:
+            self.bars = BarAggregator(self.last_prices, self.ticks_per_bar, self.bar_capacity)
+        ticks_per_block = max(TICK_BLOCK // len(self.assets), 1)
+        num_ticks = num_days * ticks_per_day
+        closes = np.empty((num_days, len(self.assets)))
+        for first in range(0, num_ticks, ticks_per_block):
+            count = min(ticks_per_block, num_ticks - first)
+            ticks = model.simulate(self.rng, start, count, ticks_per_day)
+            self.bars.update(ticks)
+            # Last ticks of the days that end within the block
+            offset = (ticks_per_day - 1 - first) % ticks_per_day
+            closes[(first + offset) // ticks_per_day:(first + count) // ticks_per_day] = ticks[offset::ticks_per_day]
+            start = ticks[-1]
+        return closes
+
+    def _reserve(self, num_days, num_assets):
+        capacity, width = self._buffer.shape
+        if num_days <= capacity and num_assets <= width:
+            return
+        # Grow in whole chunks of days so appending a day is amortized O(assets)
+        capacity = max(capacity, -(-num_days // self.chunk_size) * self.chunk_size)
+        buffer = np.empty((capacity, max(width, num_assets)))
+        buffer[:self.length, :width] = self._buffer[:self.length]
+        self._buffer = buffer
 
 
 # Example usage:
@@ -48,3 +475,14 @@ if __name__ == "__main__":
     # Print price history of each asset
     for asset_name, asset in market.assets.items():
         print(f"{asset_name} price history:", asset.price_history)
+
+    # Advance a larger market with correlated GBM in blocks of steps
+    gbm_assets = [Asset(name=f"Asset {i+1}", initial_price=100, mean_change_range=(0.97, 1.03),
+                        variance_change_range=(0.005, 0.05)) for i in range(100)]
+    correlation = np.full((100, 100), 0.3) + 0.7 * np.eye(100)
+    gbm_market = Market(model=CorrelatedGBMModel(drifts=np.full(100, 0.05), volatilities=np.full(100, 0.2),
+                                                 correlation=correlation), seed=42)
+    for asset in gbm_assets:
+        gbm_market.add_asset(asset)
+    gbm_market.update_prices(num_steps=252)
+    print("Correlated GBM market after one year:", gbm_market.prices.shape, gbm_market.volatilities.mean())
@@ -0,0 +1,407 @@
+import heapq
+import math
+
+import numpy as np
+
+TICK = 0.01  # Price grid of the market maker's quotes
+BUY = 1
+SELL = -1
+SIDES = {'buy': BUY, 'sell': SELL}
+
+
+class Order:
+    __slots__ = ('id', 'owner', 'side', 'price', 'quantity', 'fee_due')
+
+    def __init__(self, order_id, owner, side, price, quantity, fee_due):
+        self.id = order_id
+        self.owner = owner
+        self.side = side  # BUY or SELL
+        self.price = price
+        self.quantity = quantity  # Quantity still open, 0 once the order is filled or cancelled
+        self.fee_due = fee_due  # The order's fee is charged with its first fill
+
+
+class OrderBook:
+    """
+    Limit order book of one asset with price-time priority.
+
+    Resting orders sit in two heaps, keyed by price and arrival, so inserting an order and taking the best one are
+    O(log n). Cancelled orders stay in their heap with no quantity left and are dropped once they reach the top,
+    and the heaps are rebuilt when they hold more cancelled orders than live ones.
+    """
+    def __init__(self, asset_name):
+        self.asset_name = asset_name
+        self.bids = []  # (-price, sequence, order), the highest bid first
+        self.asks = []  # (price, sequence, order), the lowest ask first
+        self.orders = {}  # Order id -> resting order
+        self.last_price = None
+        self.volume = 0
+        self._sequence = 0  # Arrival counter, orders at the same price fill oldest first
+        self._cancelled = 0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def best_bid(self):
+        self._drop_cancelled(self.bids)
+        return -self.bids[0][0] if self.bids else None
+
+    def best_ask(self):
+        self._drop_cancelled(self.asks)
+        return self.asks[0][0] if self.asks else None
+
+    def add(self, order):
+        """
+        Rest a limit order in the book.
+        """
+        self.orders[order.id] = order
+        self._sequence = sequence = self._sequence + 1
+        if order.side == BUY:
+            heapq.heappush(self.bids, (-order.price, sequence, order))
+        else:
+            heapq.heappush(self.asks, (order.price, sequence, order))
+
+    def cancel(self, order_id):
+        """
+        Cancel a resting order.
+
+        Returns:
+        tuple: The order and its quantity that was still open, or (None, 0) if it is not resting in the book.
+        """
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None, 0
+        remaining = order.quantity
+        order.quantity = 0
+        self._cancelled += 1
+        if self._cancelled > 64 and self._cancelled > len(self.orders):
+            # Mostly cancelled orders left, rebuild the heaps without them
+            self.bids = [entry for entry in self.bids if entry[2].quantity]
+            self.asks = [entry for entry in self.asks if entry[2].quantity]
+            heapq.heapify(self.bids)
+            heapq.heapify(self.asks)
+            self._cancelled = 0
+        return order, remaining
+
+    def match(self, side, quantity, limit, budget=math.inf, fee=0, owner=None):
+        """
+        Match an incoming order against the resting orders of the other side, best price first and oldest first at
+        the same price. Every fill is at the price of the resting order.
+
+        Parameters:
+        side (int): BUY or SELL.
+        quantity (int): Quantity of the incoming order.
+        limit (float): Worst price the incoming order accepts, infinite for market orders.
+        budget (float): Cash a buy order may spend, including its fee.
+        fee (float): Fee of the incoming order, paid with its first fill.
+        owner (object): Trader of the incoming order. Its own resting orders that would match are cancelled instead
+            of trading with it.
+
+        Returns:
+        tuple: List of fills as (resting order, quantity, price), the quantity left unfilled, and the list of own
+            resting orders cancelled as (order, quantity that was open).
+        """
+        fills = []
+        cancelled = []
+        volume = 0
+        heappop = heapq.heappop
+        if side == BUY:
+            heap, sign = self.asks, 1
+        else:
+            # Bids are keyed by their negated price, so both sides compare keys against the limit as asks do
+            heap, sign, limit = self.bids, -1, -limit
+        while quantity and heap:
+            key, _, order = heap[0]
+            open_quantity = order.quantity
+            if not open_quantity:
+                heappop(heap)
+                self._cancelled -= 1
+                continue
+            if key > limit:
+                break
+            if order.owner is owner:
+                # Self-trade prevention: the resting order is cancelled, the incoming one goes on matching
+                heappop(heap)
+                del self.orders[order.id]
+                cancelled.append((order, open_quantity))
+                order.quantity = 0
+                continue
+            price = key * sign
+            filled = quantity if quantity < open_quantity else open_quantity
+            if sign == 1 and budget != math.inf:
+                charge = 0 if fills else fee
+                affordable = int((budget - charge) // price)
+                if affordable < filled:
+                    filled = affordable
+                    if filled <= 0:
+                        break
+                budget -= filled * price + charge
+            fills.append((order, filled, price))
+            volume += filled
+            quantity -= filled
+            if filled == open_quantity:
+                order.quantity = 0
+                heappop(heap)
+                del self.orders[order.id]
+            else:
+                order.quantity = open_quantity - filled
+        if fills:
+            self.last_price = fills[-1][2]
+            self.volume += volume
+        return fills, quantity, cancelled
+
+    def _drop_cancelled(self, heap):
+        while heap and not heap[0][2].quantity:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+
+
+class Exchange:
+    """
+    Stock exchange with one limit order book per asset, settling fills into the accounts of the traders.
+
+    Traders are objects with cash and a stocks_portfolio that book fills through apply_fill, like Player. Cash of
+    resting buy orders and shares of resting sell orders are reserved, so a trader can never spend them twice. Buy
+    orders larger than the trader's free cash and sell orders larger than its free shares are reduced to what it can
+    afford.
+    """
+    def __init__(self, assets, fee=0):
+        self.books = {asset.name: OrderBook(asset.name) for asset in assets}
+        self.fee = fee  # Charged once per order that gets filled
+        self.market_makers = []
+        self.reserved_cash = {}  # Trader -> cash held by its resting buy orders
+        self.reserved_shares = {}  # (trader, asset name) -> shares held by its resting sell orders
+        self._order_books = {}  # Resting order id -> its book
+        self._last_id = 0
+        self._closing_prices = {}  # Asset name -> last trade price since the last call of closing_prices
+
+    def submit(self, trader, asset_name, side, quantity, price=None):
+        """
+        Submit a limit order, or a market order if no price is given.
+
+        The order is matched right away, a limit order's remaining quantity rests in the book and a market order's
+        remaining quantity is cancelled.
+
+        Parameters:
+        trader (Player): Trader placing the order.
+        asset_name (str): Name of the asset.
+        side (str): 'buy' or 'sell'.
+        quantity (int): Number of shares.
+        price (float): Limit price, None for a market order.
+
+        Returns:
+        tuple: Id of the resting order (None if nothing rests) and the quantity filled right away.
+        """
+        book = self.books[asset_name]
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("The quantity has to be a positive integer.")
+        sign = SIDES.get(side)
+        if sign is None:
+            raise ValueError("Invalid side. Please choose 'buy' or 'sell'.")
+        if price is not None and price <= 0:
+            raise ValueError("The limit price has to be positive.")
+        fee = self.fee
+
+        if sign == BUY:
+            budget = trader.cash - self.reserved_cash.get(trader, 0)
+            if price is None:
+                limit = math.inf
+            else:
+                limit = price
+                quantity = min(quantity, int((budget - fee) // price))
+        else:
+            budget = math.inf
+            limit = -math.inf if price is None else price
+            free = trader.stocks_portfolio.get(asset_name, 0) - self.reserved_shares.get((trader, asset_name), 0)
+            quantity = min(quantity, free)
+        if quantity <= 0:
+            return None, 0
+
+        fills, remaining, cancelled = book.match(sign, quantity, limit, budget, fee, trader)
+        for order, open_quantity in cancelled:
+            del self._order_books[order.id]
+            self._release(order, asset_name, open_quantity)
+        if fills:
+            charge = fee
+            for maker, filled, fill_price in fills:
+                self._fill_maker(asset_name, maker, filled, fill_price)
+                trader.apply_fill(asset_name, sign * filled, fill_price, charge)
+                charge = 0
+            self._closing_prices[asset_name] = book.last_price
+
+        if not remaining or price is None:
+            return None, quantity - remaining
+        self._last_id += 1
+        order = Order(self._last_id, trader, sign, price, remaining, not fills)
+        if sign == BUY:
+            self.reserved_cash[trader] = self.reserved_cash.get(trader, 0) + price * remaining + fee * order.fee_due
+        else:
+            key = (trader, asset_name)
+            self.reserved_shares[key] = self.reserved_shares.get(key, 0) + remaining
+        book.add(order)
+        self._order_books[order.id] = book
+        return order.id, quantity - remaining
+
+    def cancel(self, order_id):
+        """
+        Cancel a resting order and release what it reserved.
+
+        Returns:
+        int: Quantity that was still open, 0 if the order was already filled or cancelled.
+        """
+        book = self._order_books.pop(order_id, None)
+        if book is None:
+            return 0
+        order, remaining = book.cancel(order_id)
+        self._release(order, book.asset_name, remaining)
+        return remaining
+
+    def add_market_maker(self, market_maker):
+        self.market_makers.append(market_maker)
+
+    def open_day(self, market):
+        """
+        Let the market makers quote around the market's new prices.
+        """
+        for market_maker in self.market_makers:
+            market_maker.quote(self, market)
+
+    def closing_prices(self, asset_names):
+        """
+        Last trade price of every asset since the previous call, e.g. to feed into Market.update_prices.
+
+        Parameters:
+        asset_names (list): Names of the assets, in the order of the result.
+
+        Returns:
+        numpy.ndarray: Prices, NaN for assets that did not trade.
+        """
+        prices = np.array([self._closing_prices.get(name, np.nan) for name in asset_names], dtype=float)
+        self._closing_prices = {}
+        return prices
+
+    def _release(self, order, asset_name, remaining):
+        # Free what a resting order reserved for its open quantity
+        if order.side == BUY:
+            self.reserved_cash[order.owner] -= order.price * remaining + self.fee * order.fee_due
+        else:
+            self.reserved_shares[(order.owner, asset_name)] -= remaining
+
+    def _fill_maker(self, asset_name, maker, filled, price):
+        owner = maker.owner
+        fee = self.fee if maker.fee_due else 0
+        maker.fee_due = False
+        if maker.side == BUY:
+            # The reservation was made at the order's own price, which is the fill price
+            self.reserved_cash[owner] -= price * filled + fee
+        else:
+            self.reserved_shares[(owner, asset_name)] -= filled
+        if not maker.quantity:
+            del self._order_books[maker.id]
+        owner.apply_fill(asset_name, maker.side * filled, price, fee)
+
+
+class MarketMaker:
+    """
+    Provides liquidity by quoting bids and asks at a few price levels around every asset's price each day.
+
+    Its quotes of the previous day are cancelled before it quotes again. The trader should hold enough cash and
+    shares to back its quotes, e.g. a Player with a large inventory.
+    """
+    def __init__(self, trader, spread=0.01, levels=3, size=50):
+        self.trader = trader
+        self.spread = spread  # Relative distance between the best bid and the best ask
+        self.levels = levels  # Price levels quoted on each side
+        self.size = size  # Shares quoted per level
+        self.order_ids = []
+
+    def quote(self, exchange, market):
+        for order_id in self.order_ids:
+            exchange.cancel(order_id)
+        self.order_ids = []
+        for name, price in zip(market.assets, market.last_prices.tolist()):
+            for level in range(self.levels):
+                bid, ask = self.level_prices(price, level)
+                for side, level_price in (('buy', bid), ('sell', ask)):
+                    order_id, _ = exchange.submit(self.trader, name, side, self.size, level_price)
+                    if order_id is not None:
+                        self.order_ids.append(order_id)
+
+    def level_prices(self, price, level):
+        """
+        Bid and ask of one quoted level, on the tick grid.
+
+        The bid is rounded down and at least one tick, the ask is rounded up, and both sit at least `level` + 1
+        ticks away from the price, so cheap assets still get valid quotes that never cross.
+
+        Parameters:
+        price (float): Current price of the asset.
+        level (int): Level, 0 for the best bid and ask.
+
+        Returns:
+        tuple: Bid and ask prices.
+        """
+        offset = self.spread * (0.5 + level)
+        ticks = round(price / TICK, 6)
+        bid = min(math.floor(round(price * (1 - offset) / TICK, 6)), math.ceil(ticks) - 1 - level)
+        bid = max(bid, 1)
+        ask = max(math.ceil(round(price * (1 + offset) / TICK, 6)), math.floor(ticks) + 1 + level, bid + 1)
+        return round(bid * TICK, 2), round(ask * TICK, 2)
+
+
+# Example usage:
+if __name__ == "__main__":
+    import random
+    import time
+
+    from market import Asset
+    from player import Player
+
+    stock_A = Asset(name="Stock A", initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+    exchange = Exchange([stock_A], fee=1)
+    alice = Player(name="Alice", initial_cash=10000)
+    bob = Player(name="Bob", initial_cash=10000)
+    bob.stocks_portfolio["Stock A"] = 100
+
+    # Bob offers shares at two prices, Alice buys through both levels with a market order
+    exchange.submit(bob, "Stock A", 'sell', 10, 101.0)
+    exchange.submit(bob, "Stock A", 'sell', 10, 102.0)
+    print("Filled:", exchange.submit(alice, "Stock A", 'buy', 15)[1])
+    print("Best ask:", exchange.books["Stock A"].best_ask(), "last price:", exchange.books["Stock A"].last_price)
+
+    # Throughput with many traders placing limit and market orders and cancelling some of them
+    alice.verbose = bob.verbose = False
+    traders = [Player(name=f"Bot {i}", initial_cash=1e9, verbose=False) for i in range(1000)]
+    for trader in traders:
+        trader.stocks_portfolio["Stock A"] = 10 ** 6
+    # The orders are drawn up front so that only the exchange is timed
+    rng = random.Random(1)
+    num_orders = 200000
+    orders = []
+    for i in range(num_orders):
+        trader = traders[rng.randrange(len(traders))]
+        side = 'buy' if rng.random() < 0.5 else 'sell'
+        if rng.random() < 0.1:
+            orders.append((trader, side, rng.randint(1, 20), None))
+        elif rng.random() < 0.3:
+            orders.append((None, None, rng.random(), None))
+        else:
+            price = round(100 + rng.gauss(0, 1) + (-0.5 if side == 'buy' else 0.5), 2)
+            orders.append((trader, side, rng.randint(1, 20), price))
+    resting = []
+    start = time.perf_counter()
+    for trader, side, quantity, price in orders:
+        if trader is None:
+            # Cancel a random resting order
+            if resting:
+                i = int(quantity * len(resting))
+                resting[i], resting[-1] = resting[-1], resting[i]
+                exchange.cancel(resting.pop())
+        else:
+            order_id, _ = exchange.submit(trader, "Stock A", side, quantity, price)
+            if order_id is not None:
+                resting.append(order_id)
+    elapsed = time.perf_counter() - start
+    print(f"{num_orders / elapsed:,.0f} orders per second, {len(exchange.books['Stock A'])} resting, "
+          f"volume {exchange.books['Stock A'].volume}")
@@ -1,55 +1,227 @@
+class PositionLedger:
+    """
+    Aggregated option positions: one lot per contract holding its quantity, instead of one list entry per copy.
+
+    Lots are indexed by contract and by (option type, underlying asset), so buying, selling and looking up a position
+    does not scan the whole portfolio. Iterating over the ledger yields every contract once.
+    """
+    def __init__(self):
+        self.lots = {}  # Option -> quantity held
+        self.groups = {}  # (option type, underlying asset) -> options in the order they were bought
+        self.version = 0  # Incremented on every change, so valuations can tell when to refresh
+
+    def __len__(self):
+        return len(self.lots)
+
+    def __iter__(self):
+        return iter(self.lots)
+
+    def __contains__(self, option):
+        return option in self.lots
+
+    def items(self):
+        return self.lots.items()
+
+    def quantity(self, option):
+        return self.lots.get(option, 0)
+
+    @property
+    def total_quantity(self):
+        return sum(self.lots.values())
+
+    def group_quantity(self, option_type, asset_name):
+        group = self.groups.get((option_type.lower(), asset_name), {})
+        return sum(self.lots[option] for option in group)
+
+    def add(self, option, quantity):
+        self.version += 1
+        if option not in self.lots:
+            self.lots[option] = 0
+            self.groups.setdefault((option.type, option.underlying_asset), {})[option] = None
+        self.lots[option] += quantity
+
+    def remove(self, option, quantity):
+        """
+        Close a quantity of one contract, or all of it if less is held.
+
+        Returns:
+        int: Quantity actually closed.
+        """
+        held = self.lots.get(option, 0)
+        closed = min(held, quantity)
+        self.version += 1
+        if closed == held and held:
+            del self.lots[option]
+            key = (option.type, option.underlying_asset)
+            del self.groups[key][option]
+            if not self.groups[key]:
+                del self.groups[key]
+        elif closed:
+            self.lots[option] = held - closed
+        return closed
+
+    def close(self, option):
+        return self.remove(option, self.lots.get(option, 0))
+
+    def take(self, option_type, asset_name, quantity):
+        """
+        Close a quantity of options of one type on one asset, oldest contracts first, partially closing the last lot
+        if needed.
+
+        Returns:
+        list: (option, quantity) pairs that were closed.
+        """
+        taken = []
+        group = self.groups.get((option_type.lower(), asset_name), {})
+        for option in list(group):
+            if quantity == 0:
+                break
+            closed = self.remove(option, quantity)
+            taken.append((option, closed))
+            quantity -= closed
+        return taken
+
+
 class Player:
-    def __init__(self, name, initial_cash):
+    def __init__(self, name, initial_cash, verbose=True):
         self.name = name
         self.cash = initial_cash
+        self.verbose = verbose  # Print a message for every trade
         self.stocks_portfolio = {}
-        self.derivatives_portfolio = []
+        self.derivatives_portfolio = PositionLedger()
+        self.stocks_version = 0  # Incremented on every stock trade
+        self.event_log = None  # Set by EventLog.attach
+
+    def __getstate__(self):
+        return dict(self.__dict__, event_log=None)
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
 
     def buy_stock(self, asset, quantity):
         cost = quantity * asset.price_history[-1] + 5
         if cost > self.cash:
-            print(f"{self.name} does not have enough cash to buy {quantity} stocks of {asset.name}.")
-            return
+            self._log(f"{self.name} does not have enough cash to buy {quantity} stocks of {asset.name}.")
+            return False
         if asset.name in self.stocks_portfolio:
             self.stocks_portfolio[asset.name] += quantity
         else:
             self.stocks_portfolio[asset.name] = quantity
+        self.stocks_version += 1
         self.cash -= cost
-        print(f"{self.name} bought {quantity} stocks of {asset.name}.")
+        if self.event_log is not None:
+            self.event_log.record_stock_trade(self, asset.name, quantity, asset.price_history[-1], -cost)
+        self._log(f"{self.name} bought {quantity} stocks of {asset.name}.")
+        return True
 
     def sell_stock(self, asset, quantity):
         if asset.name not in self.stocks_portfolio:
-            print(f"{self.name} does not own any stocks of {asset.name}.")
-            return
+            self._log(f"{self.name} does not own any stocks of {asset.name}.")
+            return False
         if self.stocks_portfolio[asset.name] < quantity:
-            print(f"{self.name} does not have enough stocks of {asset.name} to sell.")
-            return
+            self._log(f"{self.name} does not have enough stocks of {asset.name} to sell.")
+            return False
         self.stocks_portfolio[asset.name] -= quantity
+        self.stocks_version += 1
         sale_proceeds = quantity * asset.price_history[-1] - 5
         self.cash += sale_proceeds
-        print(f"{self.name} sold {quantity} stocks of {asset.name} for ${sale_proceeds}.")
+        if self.event_log is not None:
+            self.event_log.record_stock_trade(self, asset.name, -quantity, asset.price_history[-1], sale_proceeds)
+        self._log(f"{self.name} sold {quantity} stocks of {asset.name} for ${sale_proceeds}.")
+        return True
+
+    def apply_fill(self, asset_name, quantity, price, fee=0):
+        """
+        Book a fill of an order on an Exchange: shares bought (positive quantity) or sold (negative quantity).
+
+        Parameters:
+        asset_name (str): Name of the asset traded.
+        quantity (int): Signed number of shares.
+        price (float): Trade price per share.
+        fee (float): Fee charged for the order with this fill.
+        """
+        self.stocks_portfolio[asset_name] = self.stocks_portfolio.get(asset_name, 0) + quantity
+        self.stocks_version += 1
+        cash_delta = -quantity * price - fee
+        self.cash += cash_delta
+        if self.event_log is not None:
+            self.event_log.record_stock_trade(self, asset_name, quantity, price, cash_delta)
+        if self.verbose:
+            self._log(f"{self.name} {'bought' if quantity > 0 else 'sold'} {abs(quantity)} stocks of {asset_name} "
+                      f"at ${price:.2f}.")
 
     def buy_option(self, option, quantity):
         cost = quantity * option.premium
         if cost > self.cash:
-            print(f"{self.name} does not have enough cash to buy {quantity} {option.type} options.")
-            return
-        self.derivatives_portfolio.extend([option] * quantity)
+            self._log(f"{self.name} does not have enough cash to buy {quantity} {option.type} options.")
+            return False
+        if option.book is not None:
+            # Book the contract first, it refuses a contract that another player already holds
+            try:
+                option.book.assign(option.contract_id, self, quantity)
+            except ValueError as error:
+                self._log(f"{self.name} cannot buy the {option.type} option: {error}")
+                return False
+        self.derivatives_portfolio.add(option, quantity)
         self.cash -= cost
-        print(f"{self.name} bought {quantity} {option.type} options for {option.underlying_asset}.")
+        if self.event_log is not None:
+            self.event_log.record_option_trade(self, option.contract_id, quantity, -cost)
+        self._log(f"{self.name} bought {quantity} {option.type} options for {option.underlying_asset}.")
+        return True
 
     def sell_option(self, option_type, asset, quantity):
-        sold = 0
-        for _ in range(quantity):
-            for option in self.derivatives_portfolio:
-                if option.type == option_type.lower() and option.underlying_asset == asset.name and sold < quantity:
-                    self.cash += option.premium
-                    self.derivatives_portfolio.remove(option)
-                    sold += 1
+        """
+        Sell options of a type on an asset back at their premium, oldest first.
+
+        Returns:
+        int: Number of options sold, at most the quantity held.
+        """
+        total = 0
+        for option, sold in self.derivatives_portfolio.take(option_type, asset.name, quantity):
+            total += sold
+            self.cash += sold * option.premium
+            if option.book is not None:
+                option.book.release(option.contract_id, sold)
+            if self.event_log is not None:
+                self.event_log.record_option_trade(self, option.contract_id, -sold, sold * option.premium)
+        return total
+
+    def exercise_option(self, option_type, asset, quantity, bank):
+        """
+        Exercise American options of a type on an asset before they expire, oldest first.
+
+        Parameters:
+        option_type (str): 'Call' or 'Put'.
+        asset (Asset): Underlying asset of the options.
+        quantity (int): Number of options to exercise.
+        bank (Bank): Bank that sold the options.
+
+        Returns:
+        int: Number of options exercised, at most the quantity of American options held.
+        """
+        total = 0
+        payoff = 0.0
+        group = self.derivatives_portfolio.groups.get((option_type.lower(), asset.name), {})
+        for option in [option for option in group if option.american]:
+            if total == quantity:
+                break
+            exercised = min(quantity - total, self.derivatives_portfolio.quantity(option))
+            payoff += bank.exercise_option(self, option, exercised, asset)
+            total += exercised
+        if total:
+            self._log(f"{self.name} exercised {total} {option_type.lower()} options on {asset.name} for ${payoff:.2f}.")
+        return total
+
+    @property
+    def holdings_version(self):
+        return self.stocks_version, self.derivatives_portfolio.version
 
     def calculate_portfolio_value(self, assets):
         """
-        Calculate the total value of the player's portfolio.
+        Calculate the total value of the player's cash and stocks.
+
+        Option holdings are not included, use a ValuationEngine to mark them to model as well.
 
         Returns:
         float: Total value of the portfolio.
@@ -57,6 +229,8 @@ class Player:
         total_value = 0
         total_value += self.cash
         if len(self.stocks_portfolio.items()) > 0:
+            # Assuming the latest price for valuation
+            prices = {asset.name: asset.price_history[-1] for asset in assets}
             for asset_name, quantity in self.stocks_portfolio.items():
-                total_value += quantity * [asset.price_history[-1] for asset in assets if asset.name == asset_name][0]  # Assuming the latest price for valuation
+                total_value += quantity * prices[asset_name]
         return total_value
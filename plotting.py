@@ -1,8 +1,15 @@
-import matplotlib.pyplot as plt
+import os
+import queue
+import threading
+import time
+
+import numpy as np
 
 
 class LivePlot:
     def __init__(self):
+        import matplotlib.pyplot as plt
+
         self.fig, self.ax = plt.subplots(2, 1, figsize=(10, 10))
         self.lines_stock = []
         self.lines_player = []
@@ -37,12 +44,273 @@ class LivePlot:
         self.ax[0].autoscale_view()
         self.fig.canvas.draw_idle()
 
-    def update_player_plot(self, players, assets, num_days):
+    def update_player_plot(self, players, assets, num_days, valuation=None, today=None):
         for i, player in enumerate(players):
-            asset_values = player.calculate_portfolio_value(assets)
+            if valuation is not None:
+                asset_values = valuation.equity(player, today)
+            else:
+                asset_values = player.calculate_portfolio_value(assets)
             self.player_asset_values[i].append(asset_values)  # Extend the stored asset values
             self.lines_player[i].set_data(range(1, len(self.player_asset_values[i]) + 1), self.player_asset_values[i])
         self.ax[1].relim()
         self.ax[1].autoscale_view()
         self.fig.canvas.draw_idle()
 
+
+class MinMaxDecimator:
+    """
+    Keeps a bounded min/max summary of series that grow by one point per tick.
+
+    Points are folded into at most max_buckets buckets. When all buckets are full, neighbouring buckets are merged
+    and the bucket size doubles, so appending is O(series) and drawing the summary costs the same however long the
+    series get, while the extremes of every bucket stay visible. Points may come with a low and high, e.g. the range of
+    an OHLC bar, which then spans the bucket instead of the point itself.
+    """
+    def __init__(self, num_series, max_buckets=1024):
+        self.max_buckets = max_buckets - max_buckets % 2
+        self.bucket_size = 1
+        self.count = 0
+        self.mins = np.empty((self.max_buckets, num_series))
+        self.maxs = np.empty((self.max_buckets, num_series))
+        self.low = np.inf
+        self.high = -np.inf
+        self.ranges = False  # Set once a point came with a range, every bucket is drawn as a segment then
+
+    def append(self, values, lows=None, highs=None):
+        values = np.asarray(values, dtype=float)
+        lows = values if lows is None else np.asarray(lows, dtype=float)
+        highs = values if highs is None else np.asarray(highs, dtype=float)
+        self.ranges |= lows is not values
+        bucket, offset = divmod(self.count, self.bucket_size)
+        if bucket == self.max_buckets:
+            half = self.max_buckets // 2
+            self.mins[:half] = np.minimum(self.mins[0::2], self.mins[1::2])
+            self.maxs[:half] = np.maximum(self.maxs[0::2], self.maxs[1::2])
+            self.bucket_size *= 2
+            bucket, offset = divmod(self.count, self.bucket_size)
+        if offset == 0:
+            self.mins[bucket] = lows
+            self.maxs[bucket] = highs
+        else:
+            np.minimum(self.mins[bucket], lows, out=self.mins[bucket])
+            np.maximum(self.maxs[bucket], highs, out=self.maxs[bucket])
+        self.count += 1
+        if len(values):
+            self.low = min(self.low, float(lows.min()))
+            self.high = max(self.high, float(highs.max()))
+
+    def xy(self):
+        """
+        Points to draw, starting at x = 1 like the day numbers.
+
+        Returns:
+        tuple: x with shape (points,) and y with shape (points, series).
+        """
+        size = self.bucket_size
+        num_buckets = -(-self.count // size)
+        if size == 1 and not self.ranges:
+            return np.arange(1, self.count + 1), self.mins[:num_buckets]
+        # Every bucket becomes a vertical segment from its minimum to its maximum at its centre
+        starts = np.arange(num_buckets) * size
+        centres = starts + (np.minimum(self.count - starts, size) - 1) / 2 + 1
+        y = np.empty((2 * num_buckets, self.mins.shape[1]))
+        y[0::2] = self.mins[:num_buckets]
+        y[1::2] = self.maxs[:num_buckets]
+        return np.repeat(centres, 2), y
+
+
+class BlittedLivePlot:
+    """
+    Live plot of the stock prices and player values whose drawing cost per frame does not grow with the game.
+
+    The simulation submits one row of prices and values per tick into a queue and never waits for the plot. Frames
+    are drawn at most fps times per second, from min/max decimated series, by blitting the lines onto a cached
+    background. The axes are only redrawn fully when the data leaves them, and then grow by a margin.
+
+    On screen, pump() is called from the GUI thread, e.g. once per simulated day. Offscreen, the plot renders with
+    Agg and start() runs it on its own thread, writing every frame as a PNG into a directory or into a video file
+    (.gif with Pillow, .mp4 with ffmpeg).
+    """
+    def __init__(self, asset_names, player_names, fps=10, max_points=1024, offscreen=False, output=None):
+        self.fps = fps
+        self.offscreen = offscreen
+        self.output = output
+        self.frames_written = 0
+        self.stocks = MinMaxDecimator(len(asset_names), max_points // 2)
+        self.players = MinMaxDecimator(len(player_names), max_points // 2)
+        self._queue = queue.SimpleQueue()
+        self._dirty = False
+        self._last_frame = -np.inf
+        self._background = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._writer = None
+
+        if offscreen:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+
+            self.fig = Figure(figsize=(10, 10))
+            FigureCanvasAgg(self.fig)
+            self.ax = self.fig.subplots(2, 1)
+        else:
+            import matplotlib.pyplot as plt
+
+            self.fig, self.ax = plt.subplots(2, 1, figsize=(10, 10))
+        # Offscreen every frame is a full Agg render, so the lines are ordinary artists
+        animated = not offscreen
+        self.lines_stock = [self.ax[0].plot([], [], label=name, animated=animated)[0] for name in asset_names]
+        self.lines_player = [self.ax[1].plot([], [], label=name, animated=animated)[0] for name in player_names]
+        for ax, title, ylabel in ((self.ax[0], "Stock Values Over Time", "Stock Value"),
+                                  (self.ax[1], "Player Asset Values Over Time", "Asset Value")):
+            ax.set_title(title)
+            ax.set_xlabel("Day")
+            ax.set_ylabel(ylabel)
+            ax.legend(loc="upper left")
+            ax.grid(True)
+            ax.set_xlim(1, 2)
+        if not offscreen:
+            self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+            plt.show(block=False)
+        if output is not None:
+            self._open_output(output)
+
+    def submit(self, prices, values, bar=None):
+        """
+        Queue the state of one tick, without drawing. Safe to call from any thread.
+
+        Parameters:
+        prices (array_like): Price of every asset.
+        values (array_like): Value of every player.
+        bar (dict): OHLC bar of the day from Market.day_bar, whose low and high are drawn instead of the price.
+        """
+        lows = highs = None
+        if bar is not None:
+            lows, highs = np.array(bar['low'], dtype=float), np.array(bar['high'], dtype=float)
+        self._queue.put((np.array(prices, dtype=float), np.array(values, dtype=float), lows, highs))
+
+    def pump(self, force=False):
+        """
+        Take the queued ticks and draw a frame if one is due.
+
+        Parameters:
+        force (bool): Draw even if the last frame was less than 1 / fps seconds ago.
+
+        Returns:
+        bool: Whether a frame was drawn.
+        """
+        # Only the ticks queued so far, so a fast simulation cannot keep the renderer from drawing
+        for _ in range(self._queue.qsize()):
+            prices, values, lows, highs = self._queue.get_nowait()
+            self.stocks.append(prices, lows, highs)
+            self.players.append(values)
+            self._dirty = True
+
+        now = time.perf_counter()
+        if not self._dirty or (not force and now - self._last_frame < 1 / self.fps):
+            if not self.offscreen:
+                self.fig.canvas.flush_events()
+            return False
+        self._last_frame = now
+        self._dirty = False
+        self._draw_frame()
+        return True
+
+    def start(self):
+        """
+        Render on a background thread until stop() is called. Only for offscreen plots, GUI toolkits have to be
+        driven from their own thread with pump().
+        """
+        if not self.offscreen:
+            raise RuntimeError("Only offscreen plots can render on a background thread, call pump() instead.")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="BlittedLivePlot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread, draw the last ticks and close the output.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.pump(force=True)
+        if self._writer is not None:
+            self._writer.finish()
+            self._writer = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.pump()
+            self._stop.wait(max(self._last_frame + 1 / self.fps - time.perf_counter(), 0.001))
+
+    def _draw_frame(self):
+        full_redraw = False
+        for ax, lines, decimator in ((self.ax[0], self.lines_stock, self.stocks),
+                                     (self.ax[1], self.lines_player, self.players)):
+            x, y = decimator.xy()
+            for i, line in enumerate(lines):
+                line.set_data(x, y[:, i])
+            full_redraw |= self._fit_limits(ax, decimator)
+
+        canvas = self.fig.canvas
+        if self.offscreen or full_redraw or self._background is None:
+            canvas.draw()  # Captures the new background through the draw event on screen
+        else:
+            canvas.restore_region(self._background)
+            self._draw_lines()
+            canvas.blit(self.fig.bbox)
+        if not self.offscreen:
+            canvas.flush_events()
+        self._write_frame()
+
+    @staticmethod
+    def _fit_limits(ax, decimator):
+        # Grow the limits geometrically, so full redraws only happen O(log) times over a game
+        changed = False
+        left, right = ax.get_xlim()
+        if decimator.count > right:
+            ax.set_xlim(1, max(2 * decimator.count, 2))
+            changed = True
+        bottom, top = ax.get_ylim()
+        if decimator.count and (ax.get_autoscaley_on() or decimator.low < bottom or decimator.high > top):
+            margin = 0.25 * max(decimator.high - decimator.low, 0.1 * abs(decimator.high), 1e-9)
+            ax.set_ylim(decimator.low - margin, decimator.high + margin)
+            changed = True
+        return changed
+
+    def _on_draw(self, event):
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for ax, lines in ((self.ax[0], self.lines_stock), (self.ax[1], self.lines_player)):
+            for line in lines:
+                ax.draw_artist(line)
+
+    def _open_output(self, output):
+        from matplotlib import animation
+
+        if output.endswith('.gif'):
+            self._writer = animation.PillowWriter(fps=self.fps)
+        elif output.endswith('.mp4'):
+            if not animation.writers.is_available('ffmpeg'):
+                raise RuntimeError("Writing .mp4 videos needs ffmpeg, write a .gif or a directory of frames instead.")
+            self._writer = animation.FFMpegWriter(fps=self.fps)
+        else:
+            os.makedirs(output, exist_ok=True)
+            return
+        self._writer.setup(self.fig, output, dpi=self.fig.dpi)
+
+    def _write_frame(self):
+        if self.output is None:
+            return
+        if self._writer is not None:
+            self._writer.grab_frame()
+        else:
+            from matplotlib.image import imsave
+
+            imsave(os.path.join(self.output, f"frame_{self.frames_written:06d}.png"),
+                   np.asarray(self.fig.canvas.buffer_rgba()))
+        self.frames_written += 1
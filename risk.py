@@ -0,0 +1,278 @@
+from datetime import datetime
+
+import numpy as np
+
+from bank import Bank
+from derivatives import GREEKS, option_greeks, option_prices
+from market import Asset, UniformMultiplicativeModel
+
+
+class ScenarioReport:
+    def __init__(self, name, pnl, confidence, bins=50):
+        self.name = name
+        self.pnl = pnl
+        self.confidence = confidence
+        # Losses are reported as positive numbers
+        self.value_at_risk = float(-np.quantile(pnl, 1 - confidence))
+        tail = pnl[pnl <= -self.value_at_risk]
+        self.expected_shortfall = float(-tail.mean()) if len(tail) else self.value_at_risk
+        self.histogram, self.bin_edges = np.histogram(pnl, bins=bins)
+
+    def print_info(self):
+        print(f"{self.name}: mean P&L {self.pnl.mean():.2f}, "
+              f"{self.confidence:.0%} VaR {self.value_at_risk:.2f}, "
+              f"{self.confidence:.0%} ES {self.expected_shortfall:.2f} over {len(self.pnl)} paths")
+
+
+class ScenarioEngine:
+    """
+    Monte Carlo engine for the profit and loss distribution of players and the bank over the next days.
+
+    Starting from the assets' last prices, it simulates (paths x days x assets) price cubes in chunks that fit into
+    a memory cap, and values the stock and option holdings on all paths of a chunk at once.
+    """
+    def __init__(self, assets, model=None, risk_free_rate=0.025, seed=None, max_bytes=64 * 2 ** 20):
+        self.assets = list(assets)
+        self.asset_index = {asset.name: i for i, asset in enumerate(self.assets)}
+        self.model = model if model is not None else UniformMultiplicativeModel.from_assets(self.assets)
+        self.risk_free_rate = risk_free_rate
+        self.rng = np.random.default_rng(seed)
+        self.max_bytes = max_bytes
+
+    def simulate_paths(self, num_paths, num_days):
+        """
+        Generate price scenarios chunk by chunk.
+
+        Parameters:
+        num_paths (int): Total number of paths.
+        num_days (int): Number of days on each path.
+
+        Yields:
+        numpy.ndarray: Prices with shape (paths in the chunk, num_days, number of assets).
+        """
+        last_prices = np.array([asset.price_history[-1] for asset in self.assets], dtype=float)
+        # The models need a few temporaries of the size of the cube, so leave room for them
+        bytes_per_path = 4 * num_days * len(self.assets) * 8
+        chunk_size = max(1, self.max_bytes // bytes_per_path)
+        for start in range(0, num_paths, chunk_size):
+            paths = min(chunk_size, num_paths - start)
+            cube = self.model.simulate(self.rng, np.broadcast_to(last_prices, (paths, len(self.assets))), num_days)
+            yield cube.transpose(1, 0, 2)
+
+    def simulate_pnl(self, holder, num_paths, num_days, today=None):
+        """
+        Simulate the profit and loss of a player's or the bank's holdings over the next days.
+
+        Options expiring within the horizon pay off on the simulated price of their expiration day, the others are
+        marked at the horizon with the assets' current volatilities, European options by Black-Scholes and American
+        ones on the binomial lattice. American options are not exercised early on the paths, so only their value at
+        the horizon reflects the early exercise right.
+
+        Parameters:
+        holder (Player or Bank): Player (long its stocks and options) or bank (short the options its customers hold).
+        num_paths (int): Number of scenario paths.
+        num_days (int): Horizon in days.
+        today (datetime.date): Current date of the game, defaults to today.
+
+        Returns:
+        numpy.ndarray: P&L on every path.
+        """
+        today = today if today is not None else datetime.now().date()
+        stock_quantities, options = self._holdings(holder, today)
+        asset_index, strikes, days_left, is_call, american, weights = options
+        last_prices = np.array([asset.price_history[-1] for asset in self.assets], dtype=float)
+        volatilities = np.array([asset.volatility for asset in self.assets], dtype=float)
+
+        current_value = stock_quantities @ last_prices + weights @ option_prices(
+            last_prices[asset_index], strikes, days_left / 365.25, volatilities[asset_index], self.risk_free_rate,
+            is_call, american)
+
+        # Options expiring within the horizon settle on their expiration day, already expired ones on the first day
+        settles = days_left <= num_days
+        settle_day = np.clip(days_left, 1, num_days) - 1
+        remaining_time = np.maximum(days_left - num_days, 0) / 365.25
+        sign = np.where(is_call, 1.0, -1.0)
+
+        pnl = []
+        for cube in self.simulate_paths(num_paths, num_days):
+            horizon_prices = cube[:, -1, :]
+            settle_prices = cube[:, settle_day, asset_index]
+            option_values = np.where(
+                settles,
+                np.maximum(sign * (settle_prices - strikes), 0.0),
+                option_prices(horizon_prices[:, asset_index], strikes, remaining_time, volatilities[asset_index],
+                              self.risk_free_rate, is_call, american))
+            pnl.append(horizon_prices @ stock_quantities + option_values @ weights - current_value)
+        return np.concatenate(pnl)
+
+    def report(self, holder, num_paths=10000, num_days=10, today=None, confidence=0.99, bins=50):
+        """
+        Report the value at risk, expected shortfall and P&L histogram of a player or the bank.
+
+        Returns:
+        ScenarioReport: Risk figures of the simulated P&L distribution.
+        """
+        return ScenarioReport(holder.name, self.simulate_pnl(holder, num_paths, num_days, today), confidence, bins)
+
+    def _holdings(self, holder, today):
+        stock_quantities = np.zeros(len(self.assets))
+        for asset_name, quantity in getattr(holder, 'stocks_portfolio', {}).items():
+            stock_quantities[self.asset_index[asset_name]] += quantity
+
+        if isinstance(holder, Bank):
+            # The bank is short the quantity its customers hold of every open contract in its book
+            book = holder.book
+            ids = np.flatnonzero(book.open[:book.size])
+            book_to_engine = np.array([self.asset_index[name] for name in book.asset_names], dtype=int)
+            asset_index = book_to_engine[book.asset_index[ids]] if len(ids) else np.zeros(0, dtype=int)
+            days_left = book.expiry[ids] - today.toordinal()
+            return stock_quantities, (asset_index, book.strike[ids], days_left, book.is_call[ids], book.american[ids],
+                                      -book.quantity[ids].astype(float))
+
+        # A player is long every option it holds
+        options = list(holder.derivatives_portfolio)
+        asset_index = np.array([self.asset_index[option.underlying_asset] for option in options], dtype=int)
+        strikes = np.array([option.strike_price for option in options], dtype=float)
+        days_left = np.array([(option.expiration_date - today).days for option in options], dtype=int)
+        is_call = np.array([option.is_call for option in options], dtype=bool)
+        american = np.array([option.american for option in options], dtype=bool)
+        weights = np.array([holder.derivatives_portfolio.quantity(option) for option in options], dtype=float)
+        return stock_quantities, (asset_index, strikes, days_left, is_call, american, weights)
+
+
+class GreeksReport:
+    """
+    Greeks of the bank's position in its book, per underlying and in total.
+
+    The bank is short every contract its customers hold, so a long call held by a player shows up as negative delta
+    for the bank. Hedge positions are not included.
+
+    Attributes:
+    asset_names (list): Names of the underlyings, in the order of the per-asset arrays.
+    per_asset (dict): Greek name -> numpy.ndarray with the Greek per underlying.
+    total (dict): Greek name -> Greek over the whole book.
+    num_contracts (int): Number of open contracts in the book.
+    """
+    def __init__(self, name, asset_names, per_asset, num_contracts):
+        self.name = name
+        self.asset_names = asset_names
+        self.per_asset = per_asset
+        self.total = {greek: float(values.sum()) for greek, values in per_asset.items()}
+        self.num_contracts = num_contracts
+
+    def print_info(self):
+        print(f"{self.name}: {self.num_contracts} open contracts, " +
+              ", ".join(f"{greek} {value:.2f}" for greek, value in self.total.items()))
+        for i, asset_name in enumerate(self.asset_names):
+            print(f"  {asset_name}: " + ", ".join(f"{greek} {values[i]:.2f}"
+                                                 for greek, values in self.per_asset.items()))
+
+
+class BookRiskEngine:
+    """
+    Greeks of the bank's book, recomputed for all open contracts in one vectorized pass on every tick.
+
+    European contracts get their Black-Scholes Greeks, American ones finite differences on the binomial lattice.
+
+    The engine keeps its own array of the open contract ids: contracts sold since the last update are appended and
+    settled ones dropped, so an update never scans the closed history of the book. With hedge=True, every update
+    also trades the underlyings so the bank's delta, including its hedge positions, is flat per asset.
+    """
+    def __init__(self, bank, assets, risk_free_rate=None, hedge=False):
+        self.bank = bank
+        self.assets = list(assets)
+        self.asset_index = {asset.name: i for i, asset in enumerate(self.assets)}
+        self.risk_free_rate = risk_free_rate if risk_free_rate is not None else bank.risk_free_rate
+        self.hedge = hedge
+        self.report = None
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._seen = 0
+        self._book_to_engine = np.zeros(0, dtype=np.int64)
+
+    def open_ids(self):
+        """
+        numpy.ndarray: Ids of the open contracts in the bank's book.
+        """
+        book = self.bank.book
+        new = np.arange(self._seen, book.size)
+        self._seen = book.size
+        self._ids = np.concatenate([self._ids[book.open[self._ids]], new[book.open[new]]])
+        return self._ids
+
+    def update(self, today):
+        """
+        Compute the Greeks of the book at the assets' last prices and hedge them if the engine hedges.
+
+        Parameters:
+        today (datetime.date): Current date of the game.
+
+        Returns:
+        GreeksReport: Greeks per underlying and in total.
+        """
+        book = self.bank.book
+        ids = self.open_ids()
+        if len(self._book_to_engine) != len(book.asset_names):
+            self._book_to_engine = np.array([self.asset_index[name] for name in book.asset_names], dtype=np.int64)
+
+        prices = np.array([asset.price_history[-1] for asset in self.assets], dtype=float)
+        market = self.assets[0].market if self.assets else None
+        if market is not None and len(market.assets) == len(self.assets):
+            volatilities = np.asarray(market.volatilities)[[asset.market_index for asset in self.assets]]
+        else:
+            volatilities = np.array([asset.volatility for asset in self.assets], dtype=float)
+
+        asset_index = self._book_to_engine[book.asset_index[ids]]
+        greeks = option_greeks(prices[asset_index], book.strike[ids], (book.expiry[ids] - today.toordinal()) / 365.25,
+                               volatilities[asset_index], self.risk_free_rate, book.is_call[ids], book.american[ids])
+        weights = -book.quantity[ids].astype(float)
+        per_asset = {greek: np.bincount(asset_index, weights=greeks[greek] * weights, minlength=len(self.assets))
+                     for greek in GREEKS}
+        self.report = GreeksReport(self.bank.name, [asset.name for asset in self.assets], per_asset, len(ids))
+        if self.hedge:
+            self.rebalance(per_asset['delta'])
+        return self.report
+
+    def rebalance(self, option_deltas):
+        """
+        Trade whole shares of every underlying so the hedge offsets the delta of the options.
+
+        Parameters:
+        option_deltas (numpy.ndarray): Delta of the bank's options per asset.
+
+        Returns:
+        numpy.ndarray: Shares traded per asset.
+        """
+        held = np.array([self.bank.stocks_portfolio.get(asset.name, 0) for asset in self.assets])
+        trades = np.round(-option_deltas).astype(np.int64) - held
+        for i in np.flatnonzero(trades).tolist():
+            self.bank.trade_stock(self.assets[i], int(trades[i]))
+        return trades
+
+
+# Example usage:
+if __name__ == "__main__":
+    from datetime import timedelta
+    from player import Player
+
+    # Create assets and let them trade for a while so they have a volatility
+    stock_A = Asset(name="Stock A", initial_price=100, mean_change_range=(0.97, 1.03), variance_change_range=(0.005, 0.05))
+    stock_B = Asset(name="Stock B", initial_price=50, mean_change_range=(0.96, 1.04), variance_change_range=(0.005, 0.06))
+    for _ in range(30):
+        stock_A.update_price()
+        stock_B.update_price()
+
+    # A player holding stocks and an option sold by the bank
+    bank = Bank(name="ABC Bank")
+    player = Player(name="Player 2", initial_cash=1000)
+    player.buy_stock(stock_A, 3)
+    option = bank.sell_option("Put", stock_B, bank.today + timedelta(days=5), risk=2)
+    player.buy_option(option, 1)
+
+    engine = ScenarioEngine([stock_A, stock_B], seed=7)
+    engine.report(player, num_paths=20000, num_days=10, today=bank.today).print_info()
+    engine.report(bank, num_paths=20000, num_days=10, today=bank.today).print_info()
+
+    # Greeks of the bank's book, with the bank hedging its delta in the underlyings
+    risk = BookRiskEngine(bank, [stock_A, stock_B], hedge=True)
+    risk.update(bank.today).print_info()
+    print("Hedge positions:", bank.stocks_portfolio)
@@ -0,0 +1,477 @@
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from main import simulate_day
+from market import Market
+from player import Player
+from valuation import ValuationEngine
+
+TOPICS = ('prices', 'quotes', 'fills')
+
+
+class ClientConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.player = None  # Set when the client joins the game
+        self.topics = set(TOPICS)
+        self.ready = False
+
+
+class GameServer:
+    """
+    Game server that lets many clients trade in the same market over local TCP or Unix sockets.
+
+    Clients send one JSON object per line and get one JSON object per line back. A client joins as a player, trades
+    stocks and options with orders that are filled immediately at the day's prices, and says when it is ready. A day
+    ends when every joined player is ready or its deadline passes. Then the market moves, the automated players trade,
+    expired options settle and the new prices and option quotes are broadcast. Every connection is a coroutine on one
+    event loop, so game state changes one message at a time without locks or threads.
+
+    Client messages (an optional "id" is echoed in the reply):
+    {"type": "join", "name": "Alice"}
+    {"type": "subscribe", "topics": ["prices", "quotes", "fills"]}
+    {"type": "order", "kind": "buy_stock" or "sell_stock", "asset": "Asset 1", "quantity": 2}
+    {"type": "order", "kind": "buy_option", "option_type": "Call", "asset": "Asset 1", "quantity": 1, "risk": 1,
+     "days": 14, "american": false}
+    {"type": "order", "kind": "sell_option", "option_type": "Put", "asset": "Asset 1", "quantity": 1}
+    {"type": "order", "kind": "exercise_option", "option_type": "Put", "asset": "Asset 1", "quantity": 1}
+    {"type": "quote", "option_type": "Call", "asset": "Asset 1", "risk": 1, "days": 14, "american": false}
+    {"type": "portfolio"}
+    {"type": "ready"}
+
+    Server messages: welcome, prices, quotes, fill, reject, quote, portfolio, error and game_over.
+    """
+    def __init__(self, assets, bank, stock_buyers=(), option_buyers=(), num_days=None, day_seconds=10.0,
+                 min_players=0, option_duration_days=14, initial_cash=1000, quote_risk=1, start_date=None,
+                 seed=None, max_buffer=2 ** 20):
+        self.market = Market.of(list(assets))
+        self.assets = list(self.market.assets.values())  # In the market's column order
+        self.asset_by_name = {asset.name: asset for asset in self.assets}
+        self.bank = bank
+        self.stock_buyers = list(stock_buyers)
+        self.option_buyers = list(option_buyers)
+        self.num_days = num_days  # None plays until the server is closed
+        self.day_seconds = day_seconds
+        self.min_players = min_players  # Players that have to join before the first day
+        self.option_duration_days = option_duration_days
+        self.initial_cash = initial_cash
+        self.quote_risk = quote_risk
+        self.start_date = start_date if start_date is not None else datetime.now().date()
+        self.rng = random.Random(seed)
+        self.max_buffer = max_buffer  # Clients with more unsent bytes than this are too slow and get disconnected
+        self.players = {}  # Name -> Player, kept when a client disconnects so it can join again
+        self.clients = set()
+        self.valuation = ValuationEngine(self.assets, self.stock_buyers + self.option_buyers,
+                                         risk_free_rate=bank.risk_free_rate)
+        self.day = -1
+        self.current_date = self.start_date
+        self.server = None
+        self._handlers = set()
+        self._everyone_ready = asyncio.Event()
+        self._players_joined = asyncio.Event()
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Start listening on a TCP port, or on a Unix socket if a path is given.
+
+        Returns:
+        object: Address the server listens on, with the actual port if port 0 was requested.
+        """
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()
+
+    async def run(self):
+        """
+        Play the days until num_days have passed, then tell every client that the game is over.
+        """
+        if self.min_players:
+            await self._players_joined.wait()
+        day = 0
+        while self.num_days is None or day < self.num_days:
+            self.advance_day(day)
+            try:
+                await asyncio.wait_for(self._everyone_ready.wait(), self.day_seconds)
+            except asyncio.TimeoutError:
+                pass
+            day += 1
+        self.broadcast(None, {'type': 'game_over', 'day': self.day, 'equity': self.equities()})
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        await self.start(host, port, path)
+        try:
+            await self.run()
+        finally:
+            await self.close()
+
+    async def close(self):
+        for client in list(self.clients):
+            client.writer.close()
+        self.clients.clear()
+        # Closed connections end their handlers at the next read
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def advance_day(self, day):
+        """
+        Move the market to the next day, let the automated players trade and broadcast the new prices and quotes.
+        """
+        self.day = day
+        self.current_date = self.start_date + timedelta(days=day)
+        self.bank.today = self.current_date
+        simulate_day(self.market, self.bank, self.stock_buyers, self.option_buyers, self.current_date,
+                     self.current_date + timedelta(days=self.option_duration_days), self.rng)
+        self._everyone_ready.clear()
+        for client in self.clients:
+            client.ready = False
+        self.broadcast('prices', self.prices_message())
+        self.broadcast('quotes', self.quotes_message())
+
+    def prices_message(self):
+        return {'type': 'prices', 'day': self.day, 'date': self.current_date.isoformat(),
+                'assets': list(self.asset_by_name), 'prices': self.market.last_prices.tolist(),
+                'volatilities': np.asarray(self.market.volatilities).tolist()}
+
+    def quotes_message(self):
+        """
+        Strikes and premiums of a call and a put on every asset at the quote risk and the default duration.
+        """
+        num_assets = len(self.assets)
+        expiration_date = self.current_date + timedelta(days=self.option_duration_days)
+        is_call = np.repeat([True, False], num_assets)
+        strikes, premiums = self.bank.quote_option_arrays(
+            is_call, np.tile(self.market.last_prices, 2), np.tile(self.market.volatilities, 2), expiration_date,
+            self.quote_risk)
+        return {'type': 'quotes', 'day': self.day, 'expiration_date': expiration_date.isoformat(), 'quotes': [
+            {'asset': self.assets[i % num_assets].name, 'option_type': 'Call' if is_call[i] else 'Put',
+             'strike': float(strikes[i]), 'premium': float(premiums[i])} for i in range(2 * num_assets)]}
+
+    def equities(self):
+        players = list(self.players.values()) + self.stock_buyers + self.option_buyers
+        for player in players:
+            if player not in self.valuation.players:
+                self.valuation.add_player(player)
+        return {player.name: float(self.valuation.equity(player, self.current_date)) for player in players}
+
+    def broadcast(self, topic, message, exclude=None):
+        """
+        Send a message to every client subscribed to a topic (to every client if the topic is None).
+
+        The message is encoded once and written without waiting for the clients to read it.
+        """
+        data = (json.dumps(message) + '\n').encode()
+        for client in list(self.clients):
+            if client is not exclude and (topic is None or topic in client.topics):
+                self._write(client, data)
+
+    def handle_message(self, client, message):
+        """
+        Apply one client message to the game.
+
+        Returns:
+        dict: Reply to the client, or None.
+        """
+        kind = message.get('type')
+        if kind == 'join':
+            return self._join(client, str(message['name']))
+        if kind == 'subscribe':
+            client.topics = set(message.get('topics', TOPICS)) & set(TOPICS)
+            return {'type': 'subscribed', 'topics': sorted(client.topics)}
+        if kind == 'order':
+            return self._order(client, message)
+        if kind == 'quote':
+            asset = self._asset(message['asset'])
+            strikes, premiums = self.bank.quote_option_arrays(
+                np.array([self._is_call(message['option_type'])]), np.array([asset.price_history[-1]]),
+                np.array([asset.volatility]), self._expiration_date(message), float(message.get('risk', 1)),
+                american=bool(message.get('american', False)))
+            return {'type': 'quote', 'asset': asset.name, 'option_type': message['option_type'],
+                    'strike': float(strikes[0]), 'premium': float(premiums[0])}
+        if kind == 'portfolio':
+            player = self._player(client)
+            return {'type': 'portfolio', 'cash': player.cash, 'stocks': player.stocks_portfolio,
+                    'options': [{'option_type': option.type, 'asset': option.underlying_asset,
+                                 'strike': option.strike_price, 'expiration_date': option.expiration_date.isoformat(),
+                                 'american': option.american, 'quantity': quantity}
+                                for option, quantity in player.derivatives_portfolio.items()],
+                    'equity': self.equities()[player.name]}
+        if kind == 'ready':
+            self._player(client)
+            client.ready = True
+            self._check_ready()
+            return None
+        raise ValueError(f"Unknown message type {kind!r}.")
+
+    def _join(self, client, name):
+        if client.player is not None:
+            raise ValueError(f"Already joined as {client.player.name}.")
+        if any(other.player is not None and other.player.name == name for other in self.clients):
+            raise ValueError(f"{name} is already playing.")
+        if name not in self.players:
+            self.players[name] = Player(name=name, initial_cash=self.initial_cash, verbose=False)
+        client.player = self.players[name]
+        if len(self.players) >= self.min_players:
+            self._players_joined.set()
+        welcome = {'type': 'welcome', 'name': name, 'cash': client.player.cash}
+        if self.day >= 0:
+            welcome.update({key: value for key, value in self.prices_message().items() if key != 'type'})
+        return welcome
+
+    def _order(self, client, message):
+        player = self._player(client)
+        kind = message['kind']
+        asset = self._asset(message['asset'])
+        quantity = int(message['quantity'])
+        if quantity <= 0:
+            raise ValueError("The quantity has to be a positive integer.")
+
+        fill = {'type': 'fill', 'player': player.name, 'kind': kind, 'asset': asset.name, 'quantity': quantity}
+        if kind in ('buy_stock', 'sell_stock'):
+            price = float(asset.price_history[-1])
+            if kind == 'buy_stock':
+                filled, reason = player.buy_stock(asset, quantity), "not enough cash"
+            else:
+                filled, reason = player.sell_stock(asset, quantity), "not enough shares"
+        elif kind == 'buy_option':
+            is_call = self._is_call(message['option_type'])
+            expiration_date = self._expiration_date(message)
+            risk = float(message.get('risk', 1))
+            american = bool(message.get('american', False))
+            # Quote first so the bank does not book an option the player cannot pay for
+            _, premiums = self.bank.quote_option_arrays(np.array([is_call]), np.array([asset.price_history[-1]]),
+                                                        np.array([asset.volatility]), expiration_date, risk,
+                                                        american=american)
+            filled, reason = premiums[0] * quantity <= player.cash, "not enough cash"
+            if filled:
+                option = self.bank.sell_option(message['option_type'], asset, expiration_date, risk=risk,
+                                               american=american)
+                filled = player.buy_option(option, quantity)
+                price = option.premium
+                fill.update({'option_type': option.type, 'strike': option.strike_price,
+                             'expiration_date': expiration_date.isoformat(), 'american': american})
+        elif kind == 'sell_option':
+            self._is_call(message['option_type'])
+            cash = player.cash
+            sold = player.sell_option(message['option_type'], asset, quantity)
+            filled, reason = sold > 0, "no such options held"
+            fill.update({'option_type': message['option_type'].lower(), 'quantity': sold})
+            price = (player.cash - cash) / sold if sold else None  # Average premium of the options sold
+        elif kind == 'exercise_option':
+            self._is_call(message['option_type'])
+            cash = player.cash
+            exercised = player.exercise_option(message['option_type'], asset, quantity, self.bank)
+            filled, reason = exercised > 0, "no such American options held"
+            fill.update({'option_type': message['option_type'].lower(), 'quantity': exercised})
+            price = (player.cash - cash) / exercised if exercised else None  # Average payoff per option
+        else:
+            raise ValueError(f"Unknown order kind {kind!r}.")
+
+        if not filled:
+            return {'type': 'reject', 'kind': kind, 'asset': asset.name, 'reason': reason}
+        fill.update({'price': price, 'cash': player.cash})
+        self.broadcast('fills', fill, exclude=client)
+        return fill
+
+    def _player(self, client):
+        if client.player is None:
+            raise ValueError("Join the game first.")
+        return client.player
+
+    def _asset(self, name):
+        if name not in self.asset_by_name:
+            raise ValueError(f"Unknown asset {name!r}.")
+        return self.asset_by_name[name]
+
+    @staticmethod
+    def _is_call(option_type):
+        if str(option_type).lower() not in ('call', 'put'):
+            raise ValueError("Invalid option type. Please choose 'Call' or 'Put'.")
+        return str(option_type).lower() == 'call'
+
+    def _expiration_date(self, message):
+        days = int(message.get('days', self.option_duration_days))
+        if days <= 0:
+            raise ValueError("The duration has to be at least one day.")
+        return self.current_date + timedelta(days=days)
+
+    def _check_ready(self):
+        playing = [client for client in self.clients if client.player is not None]
+        if playing and all(client.ready for client in playing):
+            self._everyone_ready.set()
+
+    def _write(self, client, data):
+        if client.writer.is_closing():
+            return
+        if client.writer.transport.get_write_buffer_size() > self.max_buffer:
+            # A client that does not keep up is dropped instead of buffering for it without bound
+            client.writer.close()
+            self.clients.discard(client)
+            self._check_ready()
+            return
+        client.writer.write(data)
+
+    async def _handle(self, reader, writer):
+        client = ClientConnection(reader, writer)
+        self.clients.add(client)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # The line overran the stream's limit, so the rest of the stream cannot be split into messages
+                    self._write(client, (json.dumps({'type': 'error', 'message': "Message too long."}) + '\n').encode())
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                message_id = None
+                try:
+                    message = json.loads(line)
+                    message_id = message.get('id')
+                    reply = self.handle_message(client, message)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    reply = {'type': 'error', 'message': str(e)}
+                if reply is not None:
+                    if message_id is not None:
+                        reply['id'] = message_id
+                    self._write(client, (json.dumps(reply) + '\n').encode())
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.clients.discard(client)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+            self._check_ready()
+
+
+class GameClient:
+    """
+    Client of a GameServer, for bots, tools and tests.
+
+    Every message received is appended to messages, so broadcasts that arrive while waiting for a reply are kept.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.messages = []
+        self._next_id = 0
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def send(self, message):
+        self.writer.write((json.dumps(message) + '\n').encode())
+        await self.writer.drain()
+
+    async def receive(self):
+        """
+        dict: Next message from the server, or None once the connection is closed.
+        """
+        line = await self.reader.readline()
+        if not line:
+            return None
+        message = json.loads(line)
+        self.messages.append(message)
+        return message
+
+    async def receive_type(self, *types):
+        """
+        Wait for the next message of one of the types.
+
+        Returns:
+        dict: The message, or None if the connection closed first.
+        """
+        while True:
+            message = await self.receive()
+            if message is None or message['type'] in types:
+                return message
+
+    async def request(self, message):
+        """
+        Send a message and wait for the reply to it.
+
+        Returns:
+        dict: Reply with the same id as the request.
+        """
+        self._next_id += 1
+        message = dict(message, id=self._next_id)
+        await self.send(message)
+        while True:
+            reply = await self.receive()
+            if reply is None or reply.get('id') == self._next_id:
+                return reply
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def run_random_client(name, host='127.0.0.1', port=8765, path=None, seed=None, max_quantity=2):
+    """
+    Stand-in for a human player: joins, buys a random number of shares of every asset each day like Player 1, says
+    it is ready and stays until the game is over.
+
+    Returns:
+    dict: Equity of every player at the end of the game.
+    """
+    rng = random.Random(seed)
+    client = await GameClient.connect(host, port, path)
+    try:
+        await client.request({'type': 'join', 'name': name})
+        await client.send({'type': 'subscribe', 'topics': ['prices']})
+        while True:
+            message = await client.receive_type('prices', 'game_over')
+            if message is None or message['type'] == 'game_over':
+                return message['equity'] if message is not None else {}
+            for asset in message['assets']:
+                await client.request({'type': 'order', 'kind': 'buy_stock', 'asset': asset,
+                                      'quantity': rng.randint(1, max_quantity)})
+            await client.send({'type': 'ready'})
+    finally:
+        await client.close()
+
+
+# Example usage:
+if __name__ == "__main__":
+    import time
+
+    from bank import Bank
+    from main import initialize_assets, initialize_players
+
+    async def demo(num_clients=200, num_days=5):
+        random.seed(1)
+        assets = initialize_assets(5)
+        Market.of(assets, seed=1)
+        player1, player2 = initialize_players()
+        player1.verbose = player2.verbose = False
+        server = GameServer(assets, Bank(name="ABC Bank"), [player1], [player2], num_days=num_days,
+                            day_seconds=5.0, min_players=num_clients, seed=1)
+        _, port = await server.start(port=0)
+        start = time.perf_counter()
+        clients = [asyncio.create_task(run_random_client(f"Client {i+1}", port=port, seed=i))
+                   for i in range(num_clients)]
+        await server.run()
+        results = await asyncio.gather(*clients)
+        await server.close()
+        print(f"{num_clients} clients played {num_days} days in {time.perf_counter() - start:.2f}s")
+        print("Client 1:", round(results[0]["Client 1"], 2), "Player 1:", round(results[0]["Player 1"], 2))
+
+    asyncio.run(demo())
@@ -0,0 +1,221 @@
+import numpy as np
+
+from derivatives import option_prices
+
+
+class MarketSnapshot:
+    """
+    State of the market at one tick, as arrays aligned with the market's asset order.
+    """
+    def __init__(self, day, date, asset_names, prices, volatilities):
+        self.day = day
+        self.date = date
+        self.asset_names = asset_names
+        self.prices = prices
+        self.volatilities = volatilities
+
+    @classmethod
+    def from_market(cls, market, day, date):
+        return cls(day, date, list(market.assets), market.last_prices.copy(), market.volatilities)
+
+
+class Orders:
+    """
+    Orders of a whole population for one tick.
+
+    Attributes:
+    stock_quantities (numpy.ndarray): Shares to trade per agent and asset, positive to buy and negative to sell.
+    option_agents (numpy.ndarray): Agent of every option order.
+    option_assets (numpy.ndarray): Asset index of every option order.
+    option_is_call (numpy.ndarray): True for calls, False for puts.
+    option_quantities (numpy.ndarray): Quantity of every option order.
+    option_risks (numpy.ndarray): Target premium per contract of every option order.
+    """
+    def __init__(self, stock_quantities, option_agents=None, option_assets=None, option_is_call=None,
+                 option_quantities=None, option_risks=None):
+        self.stock_quantities = stock_quantities
+        no_options = np.zeros(0, dtype=np.int64)
+        self.option_agents = option_agents if option_agents is not None else no_options
+        self.option_assets = option_assets if option_assets is not None else no_options
+        self.option_is_call = option_is_call if option_is_call is not None else np.zeros(0, dtype=bool)
+        self.option_quantities = option_quantities if option_quantities is not None else no_options
+        self.option_risks = option_risks if option_risks is not None else np.zeros(0)
+
+
+class Strategy:
+    """
+    Decides the orders of all agents of a population at once from a market snapshot.
+    """
+    def decide(self, snapshot, population, rng):
+        """
+        Parameters:
+        snapshot (MarketSnapshot): Current market state.
+        population (AgentPopulation): The agents to decide for, with their cash and positions.
+        rng (numpy.random.Generator): Random number generator of the population.
+
+        Returns:
+        Orders: Orders of every agent.
+        """
+        raise NotImplementedError
+
+
+class RandomStockBuyer(Strategy):
+    """
+    Every agent buys a random number of shares of every asset, like Player 1.
+    """
+    def __init__(self, max_quantity=2):
+        self.max_quantity = max_quantity
+
+    def decide(self, snapshot, population, rng):
+        return Orders(rng.integers(0, self.max_quantity + 1, (population.size, len(snapshot.prices))))
+
+
+class RandomOptionBuyer(Strategy):
+    """
+    Every agent buys a random call or put on each asset with some probability, like Player 2.
+    """
+    def __init__(self, probability=0.5, risk=1):
+        self.probability = probability
+        self.risk = risk
+
+    def decide(self, snapshot, population, rng):
+        wants = rng.random((population.size, len(snapshot.prices))) < self.probability
+        agents, assets = np.nonzero(wants)
+        return Orders(np.zeros((population.size, len(snapshot.prices)), dtype=np.int64),
+                      option_agents=agents, option_assets=assets, option_is_call=rng.random(len(agents)) < 0.5,
+                      option_quantities=np.ones(len(agents), dtype=np.int64),
+                      option_risks=np.full(len(agents), float(self.risk)))
+
+
+class AgentPopulation:
+    """
+    Many automated agents following one strategy, with their cash and stock positions held in arrays.
+
+    Option contracts bought by the agents live in the bank's contract book with the population as holder and the
+    agent as the contract's account, and are settled back into the agents' cash.
+    """
+    def __init__(self, name, size, num_assets, strategy, initial_cash=1000, fee=5, seed=None):
+        self.name = name
+        self.size = size
+        self.strategy = strategy
+        self.fee = fee
+        self.cash = np.full(size, float(initial_cash))
+        self.positions = np.zeros((size, num_assets), dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+        self.trades = 0
+
+    def step(self, snapshot, bank, expiration_date):
+        """
+        Let the strategy decide and execute its orders.
+
+        Returns:
+        tuple: Number of stock orders filled and option contracts bought.
+        """
+        orders = self.strategy.decide(snapshot, self, self.rng)
+        filled = self.execute_stock_orders(orders.stock_quantities, snapshot.prices)
+        bought = self.execute_option_orders(orders, snapshot, bank, expiration_date)
+        return filled, bought
+
+    def execute_stock_orders(self, quantities, prices):
+        """
+        Fill the stock orders of all agents at the last prices, with a fee per filled order.
+
+        Sells are filled first and only up to the shares held. Buys are then filled in asset order as long as the
+        agent's cash covers them.
+
+        Returns:
+        int: Number of orders filled.
+        """
+        sells = np.minimum(np.maximum(-quantities, 0), self.positions)
+        selling = sells > 0
+        self.positions -= sells
+        self.cash += (sells * prices).sum(axis=1) - self.fee * selling.sum(axis=1)
+
+        buys = np.maximum(quantities, 0)
+        buying = buys > 0
+        costs = buys * prices + self.fee * buying
+        affordable = buying & (np.cumsum(costs, axis=1) <= self.cash[:, None])
+        self.positions += np.where(affordable, buys, 0)
+        self.cash -= np.where(affordable, costs, 0).sum(axis=1)
+
+        filled = int(selling.sum() + affordable.sum())
+        self.trades += filled
+        return filled
+
+    def execute_option_orders(self, orders, snapshot, bank, expiration_date):
+        """
+        Quote all option orders in one solver call and sell the affordable ones to the agents.
+
+        Returns:
+        int: Number of option contracts bought.
+        """
+        if len(orders.option_agents) == 0:
+            return 0
+        agents, assets = orders.option_agents, orders.option_assets
+        strikes, premiums = bank.quote_option_arrays(orders.option_is_call, snapshot.prices[assets],
+                                                     snapshot.volatilities[assets], expiration_date,
+                                                     orders.option_risks)
+        # Fill each agent's orders in order while its cash covers them
+        costs = premiums * orders.option_quantities
+        order = np.argsort(agents, kind='stable')
+        sorted_agents, sorted_costs = agents[order], costs[order]
+        cumulative = np.cumsum(sorted_costs)
+        starts = np.searchsorted(sorted_agents, sorted_agents)
+        spent = cumulative - np.concatenate([[0.0], cumulative])[starts]
+        accepted = np.zeros(len(agents), dtype=bool)
+        accepted[order] = spent <= self.cash[sorted_agents]
+
+        np.subtract.at(self.cash, agents[accepted], costs[accepted])
+        bank.sell_option_arrays(orders.option_is_call[accepted], snapshot.asset_names, assets[accepted],
+                                strikes[accepted], premiums[accepted], expiration_date, self, agents[accepted],
+                                orders.option_quantities[accepted])
+        return int(orders.option_quantities[accepted].sum())
+
+    def settle_contracts(self, contract_ids, slots, payoffs):
+        """
+        Credit the payoffs of settled contracts to the agents holding them.
+        """
+        np.add.at(self.cash, slots, payoffs)
+
+    def equity(self, snapshot, bank):
+        """
+        Value of every agent: cash, stocks at the last prices and open options marked to model.
+
+        Returns:
+        numpy.ndarray: Equity per agent.
+        """
+        values = self.cash + self.positions @ snapshot.prices
+        book = bank.book
+        holder_id = book.holder_ids.get(id(self))
+        if holder_id is None:
+            return values
+        ids = np.flatnonzero(book.open[:book.size] & (book.holder[:book.size] == holder_id))
+        if len(ids):
+            # The book has its own asset order, map it onto the snapshot's
+            prices = dict(zip(snapshot.asset_names, snapshot.prices))
+            volatilities = dict(zip(snapshot.asset_names, snapshot.volatilities))
+            book_prices = np.array([prices[name] for name in book.asset_names])
+            book_volatilities = np.array([volatilities[name] for name in book.asset_names])
+            assets = book.asset_index[ids]
+            marks = option_prices(book_prices[assets], book.strike[ids],
+                                  (book.expiry[ids] - snapshot.date.toordinal()) / 365.25,
+                                  book_volatilities[assets], bank.risk_free_rate, book.is_call[ids],
+                                  book.american[ids])
+            values += np.bincount(book.slot[ids], weights=marks * book.quantity[ids], minlength=self.size)
+        return values
+
+
+def step_populations(market, bank, populations, day, current_date, expiration_date):
+    """
+    Let every population trade on the current market state.
+
+    Returns:
+    tuple: Number of stock orders filled and option contracts bought by all populations.
+    """
+    snapshot = MarketSnapshot.from_market(market, day, current_date)
+    filled = bought = 0
+    for population in populations:
+        population_filled, population_bought = population.step(snapshot, bank, expiration_date)
+        filled += population_filled
+        bought += population_bought
+    return filled, bought
@@ -0,0 +1,151 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import derivatives
+from bank import Bank
+from derivatives import (GREEKS, AmericanPut, american_greeks, american_prices, black_scholes_greeks,
+                         black_scholes_prices, option_greeks, option_prices, solve_strikes)
+from main import exercise_american_options
+from market import Asset, Market, UniformMultiplicativeModel
+from player import Player
+from risk import BookRiskEngine, ScenarioEngine
+
+TODAY = date(2024, 1, 2)
+
+
+@pytest.fixture
+def game():
+    asset = Asset(name="A", initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+    Market.of([asset], seed=1).update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = TODAY
+    return asset, bank, Player(name="Player", initial_cash=10000, verbose=False)
+
+
+def test_american_put_golden_values():
+    # Longstaff and Schwartz (2001), table 1: K = 40, sigma = 0.2, r = 0.06, T = 1
+    prices = american_prices([36, 40, 44], 40, 1, 0.2, 0.06, False)
+    np.testing.assert_allclose(prices, [4.478, 2.314, 1.110], atol=0.01)
+    premium = AmericanPut(underlying_asset='A', strike_price=100, expiration_date=None, underlying_price=100,
+                          time_to_expiration=1, volatility=0.5, risk_free_rate=0.05).premium
+    assert premium > black_scholes_prices(100, 100, 1, 0.5, 0.05, False)
+
+
+def test_american_calls_without_dividends_are_european():
+    prices = american_prices([90, 100, 110], 100, 0.5, 0.3, 0.02, True)
+    np.testing.assert_allclose(prices, black_scholes_prices([90, 100, 110], 100, 0.5, 0.3, 0.02, True))
+
+
+def test_option_prices_route_by_style():
+    american = np.array([True, False])
+    prices = option_prices(36, 40, 1, 0.2, 0.06, False, american)
+    assert prices[0] == pytest.approx(american_prices(36, 40, 1, 0.2, 0.06, False))
+    assert prices[1] == pytest.approx(black_scholes_prices(36, 40, 1, 0.2, 0.06, False))
+
+
+def test_american_grid_pricing_matches_exact_lattices(monkeypatch):
+    # Many distinct volatilities and expiries go through the interpolation grid
+    rng = np.random.default_rng(5)
+    count = 400
+    spot = rng.uniform(20, 200, count)
+    strike = spot * rng.uniform(0.8, 1.2, count)
+    time = rng.integers(1, 366, count) / 365.25
+    vol = rng.uniform(0.1, 0.8, count)
+    grid = american_prices(spot, strike, time, vol, 0.025, False)
+    monkeypatch.setattr(derivatives, 'LATTICE_MAX_EXACT', count)
+    exact = american_prices(spot, strike, time, vol, 0.025, False)
+    assert np.max(np.abs(grid - exact) / strike) < 5e-4
+    assert np.all(grid >= np.maximum(strike - spot, 0.0) - 1e-12 * strike)
+
+
+def test_solved_american_strikes_reach_the_target_premium():
+    target = np.array([1.0, 2.0, 5.0, 1.0])
+    is_call = np.array([True, False, True, False])
+    strikes, premiums = solve_strikes(target, 100, 14 / 365.25, 0.3, 0.025, is_call, american=True)
+    # The lattice is read between its nodes, which pins the strikes a little less tightly than Black-Scholes
+    np.testing.assert_allclose(premiums, target, rtol=1e-5)
+    np.testing.assert_allclose(american_prices(100, strikes, 14 / 365.25, 0.3, 0.025, is_call), target, rtol=1e-5)
+
+
+def test_american_greeks_match_finite_differences_of_a_fine_lattice():
+    spot = np.array([36.0, 40.0, 44.0])
+    greeks = american_greeks(spot, 40, 1, 0.2, 0.06, False)
+    h = 0.4
+    up, mid, down = (american_prices(spot + shift, 40, 1, 0.2, 0.06, False, steps=4000) for shift in (h, 0, -h))
+    np.testing.assert_allclose(greeks['delta'], (up - down) / (2 * h), atol=5e-3)
+    np.testing.assert_allclose(greeks['gamma'], (up - 2 * mid + down) / h ** 2, atol=5e-3)
+    vega = (american_prices(spot, 40, 1, 0.21, 0.06, False, steps=4000) -
+            american_prices(spot, 40, 1, 0.19, 0.06, False, steps=4000)) / 0.02
+    np.testing.assert_allclose(greeks['vega'], vega, rtol=0.02)
+    # Deep in the money, the put is exercised at once and moves one for one with the spot
+    assert american_greeks(20, 40, 1, 0.2, 0.06, False)['delta'] == pytest.approx(-1.0)
+
+
+def test_option_greeks_route_by_style():
+    american = np.array([True, False, True])
+    greeks = option_greeks(36, 40, 1, 0.2, 0.06, [False, False, True], american)
+    lattice = american_greeks(36, 40, 1, 0.2, 0.06, False)
+    european = black_scholes_greeks(36, 40, 1, 0.2, 0.06, [False, True])
+    for greek in GREEKS:
+        assert greeks[greek][0] == pytest.approx(lattice[greek])
+        assert greeks[greek][1] == pytest.approx(european[greek][0])
+        # American calls on underlyings without dividends are European
+        assert greeks[greek][2] == pytest.approx(european[greek][1])
+
+
+def test_risk_engines_value_american_contracts_on_the_lattice(game):
+    asset, bank, player = game
+    put = bank.sell_option('Put', asset, TODAY + timedelta(days=30), risk=5, american=True)
+    assert player.buy_option(put, 3)
+    spot, vol, rate = asset.price_history[-1], asset.volatility, bank.risk_free_rate
+
+    report = BookRiskEngine(bank, [asset]).update(TODAY)
+    greeks = american_greeks(spot, put.strike_price, 30 / 365.25, asset.market.volatilities[0], rate, False)
+    for greek in GREEKS:
+        assert report.total[greek] == pytest.approx(-3 * greeks[greek])
+
+    # With prices standing still, the player's P&L over a day is the lattice value lost by the put
+    engine = ScenarioEngine([asset], model=UniformMultiplicativeModel([(1, 1)], [(0, 0)]), risk_free_rate=rate,
+                            seed=0)
+    pnl = engine.simulate_pnl(player, num_paths=4, num_days=1, today=TODAY)
+    values = american_prices(spot, put.strike_price, np.array([29, 30]) / 365.25, vol, rate, False)
+    np.testing.assert_allclose(pnl, 3 * (values[0] - values[1]))
+    assert 3 * (values[0] - values[1]) != pytest.approx(3 * np.diff(black_scholes_prices(
+        spot, put.strike_price, np.array([30, 29]) / 365.25, vol, rate, False))[0])
+
+
+def test_exercise_closes_the_contract_once_fully_exercised(game):
+    asset, bank, player = game
+    put = bank.sell_option('Put', asset, TODAY + timedelta(days=14), risk=2, american=True)
+    assert player.buy_option(put, 4)
+    intrinsic = max(put.strike_price - asset.price_history[-1], 0.0)
+
+    assert player.exercise_option('Put', asset, 3, bank) == 3
+    assert bank.book.quantity[put.contract_id] == 1 and bank.book.open[put.contract_id]
+    assert player.exercise_option('Put', asset, 5, bank) == 1
+    assert not bank.book.open[put.contract_id] and len(bank.book) == 0
+    assert bank.total_payouts == pytest.approx(4 * intrinsic)
+
+    # An exercised contract is skipped by settlement
+    settled, _ = bank.settle_expired(TODAY + timedelta(days=14), [asset])
+    assert len(settled) == 0
+
+
+def test_european_options_cannot_be_exercised_early(game):
+    asset, bank, player = game
+    call = bank.sell_option('Call', asset, TODAY + timedelta(days=14), risk=2)
+    player.buy_option(call, 1)
+    with pytest.raises(ValueError):
+        bank.exercise_option(player, call, 1, asset)
+
+
+def test_deep_in_the_money_puts_are_exercised_on_the_given_date(game):
+    asset, bank, player = game
+    put = bank.sell_option('Put', asset, TODAY + timedelta(days=14), risk=40, american=True)
+    player.buy_option(put, 1)
+    # The bank's date is stale, the exercise decision has to use the date of the day being simulated
+    bank.today = TODAY - timedelta(days=365)
+    assert exercise_american_options(bank, [player], [asset], TODAY + timedelta(days=1)) == 1
+    assert put not in player.derivatives_portfolio
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import market as market_module
+from bars import BarAggregator
+from market import Asset, Market
+
+
+def random_ticks(num_ticks, num_assets=3, seed=1):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(0.001 * rng.standard_normal((num_ticks, num_assets)), axis=0))
+
+
+@pytest.mark.parametrize('block_sizes', [[1000], [7] * 142 + [6], [1, 2, 3, 500, 494], [250, 250, 250, 250]])
+def test_bars_match_brute_force_whatever_the_blocks(block_sizes):
+    ticks = random_ticks(1000)
+    first = np.full(3, 100.0)
+    aggregator = BarAggregator(first, ticks_per_bar=50, capacity=8)
+    start = 0
+    for size in block_sizes:
+        aggregator.update(ticks[start:start + size])
+        start += size
+
+    bars = ticks.reshape(20, 50, 3)
+    returns = np.diff(np.log(np.vstack([first, ticks])), axis=0).reshape(20, 50, 3)
+    stored = aggregator.bars()
+    assert aggregator.count == 20 and aggregator.ticks == 1000
+    np.testing.assert_allclose(stored['open'], bars[-8:, 0])
+    np.testing.assert_allclose(stored['high'], bars[-8:].max(axis=1))
+    np.testing.assert_allclose(stored['low'], bars[-8:].min(axis=1))
+    np.testing.assert_allclose(stored['close'], bars[-8:, -1])
+    np.testing.assert_allclose(stored['variance'], (returns[-8:] ** 2).sum(axis=1))
+    np.testing.assert_allclose(aggregator.realized_volatility(1000), np.sqrt((returns ** 2).sum(axis=(0, 1))))
+
+
+def test_merged_bars_and_bar_in_progress():
+    ticks = random_ticks(130)
+    aggregator = BarAggregator(np.full(3, 100.0), ticks_per_bar=20)
+    aggregator.update(ticks)
+    assert aggregator.count == 6 and aggregator.filled == 10
+    merged = aggregator.merged(3)
+    np.testing.assert_allclose(merged['open'], ticks[60])
+    np.testing.assert_allclose(merged['high'], ticks[60:120].max(axis=0))
+    np.testing.assert_allclose(merged['low'], ticks[60:120].min(axis=0))
+    np.testing.assert_allclose(merged['close'], ticks[119])
+
+
+def test_no_ticks_means_no_volatility():
+    assert np.isnan(BarAggregator([1.0, 2.0], ticks_per_bar=5).realized_volatility(252)).all()
+
+
+class StepModel:
+    # Every tick multiplies the prices by the same factor, so the close of every day is known
+    def simulate(self, rng, last_prices, num_steps, steps_per_day=1):
+        return np.asarray(last_prices) * np.cumprod(np.full((num_steps,) + np.shape(last_prices), 1.001), axis=0)
+
+
+@pytest.mark.parametrize('tick_block', [7, 20, 1 << 18])
+def test_tick_mode_keeps_the_daily_closes_with_sub_day_blocks(monkeypatch, tick_block):
+    monkeypatch.setattr(market_module, 'TICK_BLOCK', tick_block)
+    assets = [Asset(name=name, initial_price=price, mean_change_range=(1, 1), variance_change_range=(0, 0.01))
+              for name, price in (("A", 100.0), ("B", 50.0))]
+    market = Market.of(assets, model=StepModel(), seed=1, ticks_per_day=10, ticks_per_bar=5)
+    market.update_prices(num_steps=4)
+    expected = np.array([100.0, 50.0]) * 1.001 ** (10 * np.arange(5))[:, None]
+    np.testing.assert_allclose(market.prices, expected)
+    assert market.bars.ticks == 40 and market.bars.count == 8
@@ -0,0 +1,12 @@
+import benchmarks
+
+
+def test_compare_applies_the_tolerance(tmp_path):
+    path = tmp_path / "baseline.json"
+    benchmarks.save_baseline({'a': 1.0, 'b': 1.0, 'c': 1.0, 'gone': 1.0}, path)
+    results = {'a': 1.2, 'b': 1.5, 'c': 0.5, 'new': 1.0}
+    rows = {key: verdict for key, _, _, _, verdict in benchmarks.compare(results, path, tolerance=0.25)}
+    assert rows == {'a': '', 'b': 'regression', 'c': 'faster'}
+    rows = {key: verdict for key, _, _, _, verdict in benchmarks.compare(results, path, tolerance=0.1)}
+    assert rows == {'a': 'regression', 'b': 'regression', 'c': 'faster'}
+    assert benchmarks.print_report({}, path) == []
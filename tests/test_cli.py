@@ -0,0 +1,61 @@
+import json
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import cli
+import derivatives
+from derivatives import normal_cdf
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_flags_win_over_the_environment_and_the_config_file(tmp_path, monkeypatch):
+    path = tmp_path / "game.json"
+    path.write_text(json.dumps({'num_days': 5, 'num_assets': 4, 'num_players': 3, 'seed': 1}))
+    monkeypatch.setenv('DERIVATIVES_GAME_NUM_ASSETS', '6')
+    monkeypatch.setenv('DERIVATIVES_GAME_NUM_PLAYERS', '5')
+    monkeypatch.setenv('DERIVATIVES_GAME_HISTORY_PATH', str(tmp_path / "history"))
+    args = cli.build_parser().parse_args(['--config', str(path), 'headless', '--num-players', '2'])
+    settings = dict(cli.load_config(args.config), **cli.load_environment())
+
+    config = cli.game_config(args, settings)
+    assert config.num_days == 5  # Config file
+    assert config.num_assets == 6 and config.history_path == str(tmp_path / "history")  # Environment
+    assert config.num_players == 2  # Flag
+    assert config.seed == 1 and config.initial_cash == 1000  # Config file and default
+
+
+def test_environment_values_keep_their_types():
+    settings = cli.load_environment({'DERIVATIVES_GAME_RISK_FREE_RATE': '0.03', 'DERIVATIVES_GAME_ORDER_BOOK': 'true',
+                                     'DERIVATIVES_GAME_EVENT_LOG_PATH': 'logs/game', 'HOME': '/root'})
+    assert settings == {'risk_free_rate': 0.03, 'order_book': True, 'event_log_path': 'logs/game'}
+
+
+def test_toml_config(tmp_path):
+    path = tmp_path / "game.toml"
+    path.write_text('num_days = 7\nrisk_free_rate = 0.01\n')
+    assert cli.load_config(str(path)) == {'num_days': 7, 'risk_free_rate': 0.01}
+    assert cli.load_config(None) == {}
+
+
+def test_importing_the_cli_skips_heavy_modules():
+    code = ("import sys, cli, headless, tournament; "
+            f"print(','.join(m for m in {cli.HEAVY_MODULES!r} if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=REPO)
+    assert loaded.stdout.strip() == ""
+
+
+@pytest.mark.parametrize('size', [1, 7, derivatives.SCIPY_MIN_SIZE - 1, derivatives.SCIPY_MIN_SIZE, 5000])
+def test_normal_cdf_agrees_with_erfc_for_small_and_large_arrays(size, monkeypatch):
+    x = np.linspace(-9, 9, size).reshape(-1, 1) if size > 1 else np.array(0.3)
+    expected = np.vectorize(lambda value: 0.5 * math.erfc(-value / math.sqrt(2)))(x)
+    np.testing.assert_allclose(normal_cdf(x), expected, rtol=1e-12, atol=1e-300)
+    assert normal_cdf(x).shape == x.shape
+    # Without SciPy, large arrays use the Chebyshev approximation
+    monkeypatch.setattr(derivatives, '_scipy_ndtr', lambda: None)
+    np.testing.assert_allclose(normal_cdf(x), expected, rtol=1e-12, atol=1e-300)
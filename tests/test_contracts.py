@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from bank import Bank
+from contracts import ContractBook
+from market import Asset, Market
+from player import Player
+
+TODAY = date(2024, 1, 2)
+
+
+@pytest.fixture
+def game():
+    assets = [Asset(name=name, initial_price=price, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+              for name, price in (("Stock A", 100), ("Stock B", 50))]
+    market = Market.of(assets, seed=1)
+    market.update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = TODAY
+    player = Player(name="Player", initial_cash=10000, verbose=False)
+    return market, assets, bank, player
+
+
+def test_add_columns_indexes_assets_and_expiries():
+    book = ContractBook(capacity=2)
+    holder = Player(name="Holder", initial_cash=0, verbose=False)
+    expiry = np.array([TODAY.toordinal(), TODAY.toordinal() + 1, TODAY.toordinal()])
+    ids = book.add_columns(np.array([True, False, True]), ["B", "A"], np.array([0, 1, 1]),
+                           np.array([10.0, 20.0, 30.0]), expiry, np.array([1.0, 2.0, 3.0]), holder=holder, quantity=2)
+    assert ids.tolist() == [0, 1, 2] and len(book) == 3
+    assert book.asset_names == ["B", "A"] and book.asset_index[:3].tolist() == [0, 1, 1]
+    assert sorted(book._expiry_buckets) == [TODAY.toordinal(), TODAY.toordinal() + 1]
+    # Contracts added from arrays get their option objects on first access
+    options = book.open_contracts()
+    assert [option.strike_price for option in options] == [10.0, 20.0, 30.0]
+    assert [option.type for option in options] == ['call', 'put', 'call']
+
+
+def test_settle_pays_intrinsic_value_on_expiry_only(game):
+    market, assets, bank, player = game
+    expiry = TODAY + timedelta(days=14)
+    call = bank.sell_option('Call', assets[0], expiry, risk=2)
+    put = bank.sell_option('Put', assets[1], expiry + timedelta(days=7), risk=2)
+    assert player.buy_option(call, 3) and player.buy_option(put, 1)
+    cash = player.cash
+
+    settled, _ = bank.settle_expired(expiry - timedelta(days=1), assets)
+    assert len(settled) == 0 and len(bank.book) == 2
+
+    settled, payoffs = bank.settle_expired(expiry, assets)
+    expected = max(assets[0].price_history[-1] - call.strike_price, 0.0) * 3
+    assert settled.tolist() == [call.contract_id]
+    assert payoffs.tolist() == pytest.approx([expected])
+    assert player.cash == pytest.approx(cash + expected)
+    assert call not in player.derivatives_portfolio and put in player.derivatives_portfolio
+    assert bank.total_payouts == pytest.approx(expected)
+
+    # Settled contracts are never paid twice
+    settled, _ = bank.settle_expired(expiry + timedelta(days=30), assets)
+    assert settled.tolist() == [put.contract_id]
+    assert len(bank.book) == 0
+
+
+def test_contracts_grow_past_their_capacity():
+    book = ContractBook(capacity=1)
+    for i in range(10):
+        book.add_columns(np.array([True]), ["A"], np.array([0]), np.array([float(i)]), TODAY.toordinal() + i,
+                         np.array([1.0]))
+    assert len(book) == 10 and book.strike[:10].tolist() == [float(i) for i in range(10)]
+    ids, payoffs = book.settle(TODAY + timedelta(days=4), np.array([3.0]))
+    assert ids.tolist() == [0, 1, 2, 3, 4] and len(book) == 5
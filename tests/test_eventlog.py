@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from eventlog import EventLogReader
+from headless import SimulationConfig, new_game, run_headless
+
+
+@pytest.fixture(scope='module')
+def game(tmp_path_factory):
+    config = SimulationConfig(num_assets=4, num_players=4, num_days=40, seed=5,
+                              event_log_path=str(tmp_path_factory.mktemp("log")))
+    state = new_game(config)
+    result = run_headless(config, state)
+    return config, state, result
+
+
+def test_replay_rebuilds_the_final_state(game):
+    config, state, _ = game
+    market, bank, players, current_date = EventLogReader(config.event_log_path).replay()
+    assert current_date == state.start_date + timedelta(days=config.num_days - 1)
+    np.testing.assert_allclose(market.prices, state.market.prices)
+    assert bank.total_value == pytest.approx(state.bank.total_value)
+    assert bank.total_payouts == pytest.approx(state.bank.total_payouts)
+    assert len(bank.book) == len(state.bank.book)
+    for replayed, played in zip(players, state.players):
+        assert replayed.name == played.name
+        assert replayed.cash == pytest.approx(played.cash)
+        assert replayed.stocks_portfolio == played.stocks_portfolio
+        assert replayed.derivatives_portfolio.total_quantity == played.derivatives_portfolio.total_quantity
+
+
+def test_replay_of_an_earlier_day(game):
+    config, state, result = game
+    market, _, players, current_date = EventLogReader(config.event_log_path).replay(day=10)
+    assert current_date == state.start_date + timedelta(days=9)
+    np.testing.assert_allclose(market.prices, result.prices[:11])
+
+
+def test_events_are_in_sequence_order(game):
+    config, _, _ = game
+    reader = EventLogReader(config.event_log_path)
+    prices = reader.columns('price')
+    assert len(prices['seq']) == config.num_days and prices['values'].shape == (config.num_days, 4)
+    events = list(reader.iter_events())
+    assert len(events) > config.num_days
+    days = [int(fields['day']) for _, fields in events]
+    assert days == sorted(days)
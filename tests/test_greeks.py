@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from bank import Bank
+from derivatives import black_scholes_greeks, black_scholes_prices
+from market import Asset, Market
+from player import Player
+from risk import BookRiskEngine
+
+TODAY = date(2024, 1, 2)
+
+
+@pytest.fixture
+def book():
+    assets = [Asset(name=name, initial_price=price, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.03))
+              for name, price in (("Stock A", 100), ("Stock B", 50))]
+    Market.of(assets, seed=2).update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = TODAY
+    player = Player(name="Player", initial_cash=100000, verbose=False)
+    for option_type, asset, days, quantity in (("Call", 0, 10, 30), ("Put", 0, 20, 12), ("Call", 1, 15, 25),
+                                               ("Put", 1, 30, 40), ("Call", 1, 5, 10)):
+        option = bank.sell_option(option_type, assets[asset], TODAY + timedelta(days=days), risk=2)
+        assert player.buy_option(option, quantity)
+    return assets, bank
+
+
+def book_value(bank, assets, bump=None):
+    # Value of the bank's short options with the price of one asset shifted
+    book = bank.book
+    ids = np.flatnonzero(book.open[:book.size])
+    prices = np.array([asset.price_history[-1] for asset in assets])
+    if bump is not None:
+        prices[bump[0]] += bump[1]
+    volatilities = np.array([asset.volatility for asset in assets])
+    asset_index = book.asset_index[ids]
+    time = (book.expiry[ids] - TODAY.toordinal()) / 365.25
+    values = black_scholes_prices(prices[asset_index], book.strike[ids], time, volatilities[asset_index],
+                                  bank.risk_free_rate, book.is_call[ids])
+    return -book.quantity[ids] @ values
+
+
+def test_black_scholes_greeks_golden_values():
+    # Hull, Options, Futures and Other Derivatives: S = K = 100, T = 1, sigma = 0.2, r = 0.05
+    greeks = black_scholes_greeks(100, 100, 1, 0.2, 0.05, [True, False])
+    np.testing.assert_allclose(greeks['delta'], [0.636831, -0.363169], atol=1e-6)
+    np.testing.assert_allclose(greeks['gamma'], [0.018762, 0.018762], atol=1e-6)
+    np.testing.assert_allclose(greeks['vega'], [37.524035, 37.524035], atol=1e-5)
+    np.testing.assert_allclose(greeks['theta'], [-6.414028, -1.657880], atol=1e-5)
+    np.testing.assert_allclose(greeks['rho'], [53.232482, -41.890461], atol=1e-5)
+
+
+def test_book_delta_and_gamma_match_finite_differences(book):
+    assets, bank = book
+    report = BookRiskEngine(bank, assets).update(TODAY)
+    assert report.num_contracts == 5
+    for i, asset in enumerate(assets):
+        h = 1e-4 * asset.price_history[-1]
+        up, mid, down = (book_value(bank, assets, (i, shift)) for shift in (h, 0.0, -h))
+        assert report.per_asset['delta'][i] == pytest.approx((up - down) / (2 * h), rel=1e-5)
+        assert report.per_asset['gamma'][i] == pytest.approx((up - 2 * mid + down) / h ** 2, rel=1e-3)
+    assert report.total['delta'] == pytest.approx(report.per_asset['delta'].sum())
+
+
+def test_rebalance_flattens_the_net_delta(book):
+    assets, bank = book
+    engine = BookRiskEngine(bank, assets, hedge=True)
+    report = engine.update(TODAY)
+    hedge = np.array([bank.stocks_portfolio.get(asset.name, 0) for asset in assets])
+    assert (hedge != 0).any()
+    np.testing.assert_array_less(np.abs(report.per_asset['delta'] + hedge), 0.5 + 1e-12)
+
+    # A second update at the same prices has nothing left to trade
+    assert not engine.rebalance(engine.update(TODAY).per_asset['delta']).any()
@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from bank import Bank
+from headless import SimulationConfig, new_game, run_headless
+from market import Asset, Market
+from player import Player
+
+
+def test_results_have_one_row_per_day():
+    config = SimulationConfig(num_assets=3, num_players=4, num_days=25, seed=2)
+    result = run_headless(config)
+    assert len(result.dates) == 25 and result.dates[1] - result.dates[0] == timedelta(days=1)
+    assert result.prices.shape == (26, 3) and result.equity.shape == (25, 4)
+    assert result.bank_pnl.shape == result.contracts_sold.shape == result.contracts_settled.shape == (25,)
+    assert result.player_names == ["Player 1", "Player 2", "Player 3", "Player 4"]
+
+
+def test_same_seed_same_results():
+    config = SimulationConfig(num_assets=3, num_players=4, num_days=25, seed=2)
+    first, second = run_headless(config), run_headless(config)
+    np.testing.assert_array_equal(first.prices, second.prices)
+    np.testing.assert_array_equal(first.equity, second.equity)
+    np.testing.assert_array_equal(first.bank_pnl, second.bank_pnl)
+    assert not np.array_equal(first.prices, run_headless(SimulationConfig(num_assets=3, num_days=25, seed=3)).prices)
+
+
+def test_bank_pnl_counts_premiums_of_options_bought():
+    config = SimulationConfig(num_assets=3, num_players=4, num_days=30, seed=4)
+    state = new_game(config)
+    result = run_headless(config, state)
+    bank = state.bank
+    premiums = float(np.sum(bank.book.premium[:bank.book.size] * bank.book.quantity[:bank.book.size]))
+    assert bank.total_value == pytest.approx(premiums)
+    assert result.bank_pnl[-1] == pytest.approx(premiums - bank.total_payouts)
+
+
+def test_quotes_nobody_buys_bring_in_nothing():
+    assets = [Asset(name=name, initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+              for name in ("A", "B")]
+    Market.of(assets, seed=1).update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = date(2024, 1, 2)
+    options = bank.sell_options(['Call', 'Put', 'Call'], assets + assets[:1], bank.today + timedelta(days=14))
+    assert bank.total_value == 0
+    player = Player(name="Player", initial_cash=1000, verbose=False)
+    player.buy_option(options[0], 2)
+    assert bank.total_value == pytest.approx(2 * options[0].premium)
+    player.sell_option('Call', assets[0], 1)
+    assert bank.total_value == pytest.approx(options[0].premium)
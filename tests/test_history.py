@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from history import ChunkedHistory
+from market import Asset, Market
+
+
+@pytest.fixture
+def prices():
+    return np.arange(46.0).reshape(23, 2)
+
+
+@pytest.mark.parametrize('on_disk', [False, True])
+def test_appends_cross_chunk_boundaries(tmp_path, prices, on_disk):
+    history = ChunkedHistory(str(tmp_path) if on_disk else None, chunk_days=5, num_assets=2)
+    history.append(prices[:3])
+    history.append(prices[3:17])
+    history.append(prices[17:])
+    assert len(history) == 23 and len(history.chunks) == 5
+    np.testing.assert_array_equal(history.window(0, 23), prices)
+    np.testing.assert_array_equal(history.last(), prices[-1])
+
+
+def test_windows_and_columns_slice_across_chunks(prices):
+    history = ChunkedHistory(chunk_days=5, num_assets=2)
+    history.append(prices)
+    # Within one chunk the window is a view, across chunks it is a copy
+    assert np.shares_memory(history.window(5, 9), history.chunks[1])
+    np.testing.assert_array_equal(history.window(3, 18), prices[3:18])
+    np.testing.assert_array_equal(history.window(8, 30, column=1), prices[8:, 1])
+    assert history.window(30, 40).shape == (0, 2)
+
+    column = history.column(0)
+    assert len(column) == 23 and column[7] == prices[7, 0] and column[-1] == prices[-1, 0]
+    np.testing.assert_array_equal(column[4:13], prices[4:13, 0])
+    np.testing.assert_array_equal(column[::4], prices[::4, 0])
+    assert list(column) == column.tolist() == prices[:, 0].tolist()
+    np.testing.assert_array_equal(np.asarray(column), prices[:, 0])
+    with pytest.raises(IndexError):
+        column[23]
+
+
+def test_reopening_a_directory_continues_the_history(tmp_path, prices):
+    history = ChunkedHistory(str(tmp_path), chunk_days=5, num_assets=2)
+    history.append(prices[:12])
+    history.flush()
+    del history
+
+    reopened = ChunkedHistory.open(str(tmp_path))
+    assert len(reopened) == 12 and reopened.chunk_days == 5 and reopened.width == 2
+    np.testing.assert_array_equal(reopened.window(0, 12), prices[:12])
+    reopened.append(prices[12:])
+    reopened.flush()
+    np.testing.assert_array_equal(ChunkedHistory.open(str(tmp_path)).window(0, 23), prices)
+
+
+def test_market_keeps_its_prices_in_the_history(tmp_path):
+    assets = [Asset(name=name, initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+              for name in "AB"]
+    history = ChunkedHistory(str(tmp_path), chunk_days=8)
+    market = Market.of(assets, seed=1, history=history)
+    market.update_prices(20)
+    reference = Market.of([Asset(name=name, initial_price=100, mean_change_range=(0.99, 1.01),
+                                 variance_change_range=(0.01, 0.02)) for name in "AB"], seed=1)
+    reference.update_prices(20)
+    np.testing.assert_array_equal(market.prices, reference.prices)
+    np.testing.assert_array_equal(assets[1].price_history[15:21], reference.prices[15:, 1])
+    assert len(history) == 21 and len(history.chunks) == 3
@@ -0,0 +1,68 @@
+import json
+import pstats
+
+from headless import SimulationConfig, run_headless
+from instrumentation import NULL_INSTRUMENTATION, Instrumentation
+
+
+def profiled_marker():
+    return sum(range(10))
+
+
+def marker_calls(stats):
+    return sum(nc for (_, _, name), (_, nc, _, _, _) in stats.stats.items() if name == 'profiled_marker')
+
+
+def test_timers_and_counters_export_to_json_and_prometheus(tmp_path):
+    instruments = Instrumentation(prefix='test')
+    for day in range(3):
+        instruments.begin_day(day)
+        with instruments.phase('pricing'):
+            profiled_marker()
+        instruments.count('trades', 2)
+        instruments.gauge('contracts_open', 10 + day)
+        instruments.end_day(day)
+
+    snapshot = instruments.snapshot()
+    assert snapshot['days'] == 3 and snapshot['phases']['pricing']['calls'] == 3
+    assert 0 <= snapshot['phases']['pricing']['max_seconds'] <= snapshot['phases']['pricing']['seconds']
+    assert snapshot['counters'] == {'trades': 6} and snapshot['gauges'] == {'contracts_open': 12}
+
+    instruments.export(str(tmp_path / "metrics.json"))
+    exported = json.loads((tmp_path / "metrics.json").read_text())
+    assert exported['counters'] == {'trades': 6} and exported['phases']['pricing']['calls'] == 3
+
+    instruments.export(str(tmp_path / "metrics.prom"))
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert 'test_phase_calls_total{phase="pricing"} 3' in lines
+    assert 'test_trades_total 6' in lines and 'test_contracts_open 12' in lines and 'test_days_total 3' in lines
+    assert '# TYPE test_contracts_open gauge' in lines
+
+
+def test_profiler_only_runs_for_the_day_range(tmp_path):
+    path = tmp_path / "days.prof"
+    instruments = Instrumentation(profile_days=(2, 3), profile_path=str(path))
+    for day in range(6):
+        instruments.begin_day(day)
+        profiled_marker()
+        instruments.end_day(day)
+    instruments.close()
+    assert marker_calls(instruments.profile_stats()) == 2
+    assert marker_calls(pstats.Stats(str(path))) == 2
+    assert Instrumentation().profile_stats() is None
+
+
+def test_headless_game_reports_its_phases_and_counters():
+    result = run_headless(SimulationConfig(num_assets=3, num_players=2, num_days=6, seed=1, instrument=True,
+                                           profile_days=(1, 2)))
+    instruments = result.instruments
+    assert instruments.days == 6 and instruments.phases
+    assert all(calls >= 1 for calls, _, _ in instruments.phases.values())
+    assert instruments.counters['options_sold'] > 0
+    assert instruments.profile_stats() is not None
+
+    # Without instrumentation the game shares the null object, which records nothing
+    assert run_headless(SimulationConfig(num_assets=3, num_players=2, num_days=2, seed=1)).instruments is None
+    with NULL_INSTRUMENTATION.phase('anything'):
+        NULL_INSTRUMENTATION.count('anything')
+    assert not NULL_INSTRUMENTATION.enabled
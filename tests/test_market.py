@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from market import Asset, CorrelatedGBMModel, GBMModel, Market, UniformMultiplicativeModel
+
+CORRELATION = [[1.0, 0.8, -0.3], [0.8, 1.0, 0.0], [-0.3, 0.0, 1.0]]
+MODELS = {
+    'uniform': UniformMultiplicativeModel([(0.99, 1.01)] * 3, [(0.01, 0.03)] * 3),
+    'gbm': GBMModel([0.05, 0.0, -0.02], [0.2, 0.3, 0.4]),
+    'correlated': CorrelatedGBMModel([0.05, 0.0, -0.02], [0.2, 0.3, 0.4], CORRELATION),
+}
+
+
+def make_assets(count=3):
+    return [Asset(name=f"Asset {i}", initial_price=100 + 10 * i, mean_change_range=(0.99, 1.01),
+                  variance_change_range=(0.01, 0.03)) for i in range(count)]
+
+
+@pytest.mark.parametrize('name', MODELS)
+def test_models_simulate_steps_along_the_first_axis(name):
+    last_prices = np.array([100.0, 50.0, 10.0])
+    prices = MODELS[name].simulate(np.random.default_rng(1), np.broadcast_to(last_prices, (7, 3)), 4)
+    assert prices.shape == (4, 7, 3) and (prices > 0).all()
+    assert MODELS[name].simulate(np.random.default_rng(1), last_prices, 4).shape == (4, 3)
+
+
+@pytest.mark.parametrize('name', MODELS)
+def test_models_are_deterministic_for_a_seed(name):
+    first, second, other = (MODELS[name].simulate(np.random.default_rng(seed), np.ones(3), 20) for seed in (3, 3, 4))
+    np.testing.assert_array_equal(first, second)
+    assert not np.array_equal(first, other)
+
+
+def test_gbm_log_returns_have_the_model_moments():
+    model = MODELS['gbm']
+    prices = model.simulate(np.random.default_rng(2), np.ones((20000, 3)), 1)[0]
+    log_returns = np.log(prices)
+    np.testing.assert_allclose(log_returns.std(axis=0), model.volatilities * np.sqrt(model.dt), rtol=0.02)
+    np.testing.assert_allclose(log_returns.mean(axis=0), (model.drifts - 0.5 * model.volatilities ** 2) * model.dt,
+                               atol=4 * model.volatilities.max() * np.sqrt(model.dt / 20000))
+
+
+def test_correlated_gbm_reproduces_the_correlation():
+    prices = MODELS['correlated'].simulate(np.random.default_rng(5), np.ones(3), 50000)
+    log_returns = np.diff(np.log(prices), axis=0)
+    np.testing.assert_allclose(np.corrcoef(log_returns.T), CORRELATION, atol=0.02)
+
+
+def test_market_grows_its_buffer_and_reproduces_a_seed():
+    first, second = (Market.of(make_assets(), seed=9, chunk_size=8) for _ in range(2))
+    first.update_prices(30)
+    for _ in range(6):
+        second.update_prices(5)
+    assert first.prices.shape == second.prices.shape == (31, 3)
+    np.testing.assert_array_equal(first.prices[0], [100, 110, 120])
+    np.testing.assert_array_equal(first.last_prices, first.prices[-1])
+    # The assets' histories are views into the buffer
+    assets = list(first.assets.values())
+    np.testing.assert_array_equal(assets[1].price_history, first.prices[:, 1])
+    assert first.window(5).shape == (5, 3)
+
+    third = Market.of(make_assets(), seed=9, chunk_size=64)
+    third.update_prices(30)
+    np.testing.assert_array_equal(third.prices, first.prices)
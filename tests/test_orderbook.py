@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from market import Asset
+from orderbook import BUY, SELL, Exchange, MarketMaker, Order, OrderBook
+from player import Player
+
+
+def make_trader(name, cash=10000, shares=100):
+    trader = Player(name=name, initial_cash=cash, verbose=False)
+    trader.stocks_portfolio["A"] = shares
+    return trader
+
+
+@pytest.fixture
+def exchange():
+    return Exchange([Asset(name="A", initial_price=100, mean_change_range=(1, 1), variance_change_range=(0, 0.01))])
+
+
+def test_price_time_priority():
+    book = OrderBook("A")
+    makers = [object() for _ in range(4)]
+    book.add(Order(1, makers[0], SELL, 101.0, 5, False))
+    book.add(Order(2, makers[1], SELL, 100.0, 5, False))
+    book.add(Order(3, makers[2], SELL, 100.0, 5, False))
+    book.add(Order(4, makers[3], SELL, 102.0, 5, False))
+    fills, remaining, cancelled = book.match(BUY, 12, 101.0)
+    assert [(order.id, quantity, price) for order, quantity, price in fills] == [(2, 5, 100.0), (3, 5, 100.0),
+                                                                                 (1, 2, 101.0)]
+    assert remaining == 0 and cancelled == []
+    assert book.best_ask() == 101.0 and book.last_price == 101.0 and book.volume == 12
+    assert len(book) == 2
+
+
+def test_limit_stops_matching():
+    book = OrderBook("A")
+    book.add(Order(1, object(), BUY, 99.0, 5, False))
+    book.add(Order(2, object(), BUY, 98.0, 5, False))
+    fills, remaining, _ = book.match(SELL, 8, 98.5)
+    assert [(order.id, quantity) for order, quantity, _ in fills] == [(1, 5)]
+    assert remaining == 3 and book.best_bid() == 98.0
+
+
+def test_cancel_skips_the_order_and_compacts_the_heaps():
+    book = OrderBook("A")
+    for order_id in range(1, 201):
+        book.add(Order(order_id, object(), SELL, 100.0 + order_id, 1, False))
+    order, remaining = book.cancel(1)
+    assert order.id == 1 and remaining == 1
+    assert book.cancel(1) == (None, 0)
+    assert book.best_ask() == 102.0
+    for order_id in range(2, 150):
+        book.cancel(order_id)
+    assert len(book) == 51 and len(book.asks) < 100
+    fills, _, _ = book.match(BUY, 1, float('inf'))
+    assert fills[0][0].id == 150
+
+
+def test_exchange_settles_and_reserves(exchange):
+    seller, buyer = make_trader("Seller"), make_trader("Buyer", shares=0)
+    exchange.fee = 1
+    order_id, filled = exchange.submit(seller, "A", 'sell', 10, 101.0)
+    assert filled == 0 and exchange.reserved_shares[(seller, "A")] == 10
+    # Reserved shares cannot be sold twice
+    assert exchange.submit(seller, "A", 'sell', 95, 105.0)[0] is not None
+    assert exchange.reserved_shares[(seller, "A")] == 100
+
+    assert exchange.submit(buyer, "A", 'buy', 4)[1] == 4
+    assert buyer.stocks_portfolio["A"] == 4 and buyer.cash == pytest.approx(10000 - 4 * 101.0 - 1)
+    assert seller.stocks_portfolio["A"] == 96 and seller.cash == pytest.approx(10000 + 4 * 101.0 - 1)
+    assert exchange.cancel(order_id) == 6
+    assert exchange.reserved_shares[(seller, "A")] == 90
+    assert exchange.cancel(order_id) == 0
+    assert exchange.closing_prices(["A"]).tolist() == [101.0]
+    assert np.isnan(exchange.closing_prices(["A"])[0])
+
+
+def test_buy_orders_are_limited_by_free_cash(exchange):
+    seller, buyer = make_trader("Seller"), make_trader("Buyer", cash=500, shares=0)
+    exchange.submit(seller, "A", 'sell', 100, 100.0)
+    assert exchange.submit(buyer, "A", 'buy', 10)[1] == 5
+    assert buyer.cash == pytest.approx(0.0)
+
+
+def test_self_trades_cancel_the_resting_order(exchange):
+    trader, other = make_trader("Trader"), make_trader("Other")
+    own_id, _ = exchange.submit(trader, "A", 'sell', 5, 100.0)
+    exchange.submit(other, "A", 'sell', 5, 100.5)
+    assert exchange.submit(trader, "A", 'buy', 5, 101.0) == (None, 5)
+    assert trader.stocks_portfolio["A"] == 105 and other.stocks_portfolio["A"] == 95
+    assert exchange.reserved_shares[(trader, "A")] == 0
+    assert exchange.cancel(own_id) == 0
+    assert len(exchange.books["A"]) == 0
+
+
+@pytest.mark.parametrize('price', [0.004, 0.03, 0.5, 100.0])
+def test_market_maker_quotes_stay_on_the_tick_grid(exchange, price):
+    maker = MarketMaker(make_trader("Maker", cash=1e9, shares=10 ** 6))
+    market = SimpleNamespace(assets={"A": None}, last_prices=np.array([price]))
+    maker.quote(exchange, market)
+    maker.quote(exchange, market)
+    book = exchange.books["A"]
+    assert len(book) == 2 * maker.levels and book.volume == 0
+    assert 0.01 <= book.best_bid() < book.best_ask()
+    for level in range(maker.levels):
+        bid, ask = maker.level_prices(price, level)
+        assert bid == round(bid, 2) and ask == round(ask, 2)
+        assert bid <= max(price, 0.01) <= ask
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+import pytest
+
+from bank import Bank
+from market import Asset, Market
+from player import Player
+
+TODAY = date(2024, 1, 2)
+
+
+@pytest.fixture
+def game():
+    asset = Asset(name="A", initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+    Market.of([asset], seed=1).update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = TODAY
+    return asset, bank
+
+
+def test_ledger_aggregates_lots_and_takes_oldest_first(game):
+    asset, bank = game
+    player = Player(name="Player", initial_cash=10000, verbose=False)
+    first, second = (bank.sell_option('Call', asset, TODAY + timedelta(days=days), risk=2) for days in (7, 14))
+    assert player.buy_option(first, 2) and player.buy_option(first, 1) and player.buy_option(second, 4)
+    ledger = player.derivatives_portfolio
+    assert len(ledger) == 2 and ledger.quantity(first) == 3 and ledger.total_quantity == 7
+    assert ledger.group_quantity('Call', asset.name) == 7
+
+    assert player.sell_option('Call', asset, 5) == 5
+    assert first not in ledger and ledger.quantity(second) == 2
+    assert bank.book.quantity[second.contract_id] == 2
+
+
+def test_buying_a_contract_held_by_another_player_changes_nothing(game):
+    asset, bank = game
+    holder = Player(name="Holder", initial_cash=10000, verbose=False)
+    other = Player(name="Other", initial_cash=10000, verbose=False)
+    put = bank.sell_option('Put', asset, TODAY + timedelta(days=14), risk=2)
+    assert holder.buy_option(put, 2)
+    premiums = bank.book.premiums_received
+
+    assert not other.buy_option(put, 1)
+    assert other.cash == 10000 and put not in other.derivatives_portfolio
+    assert bank.book.quantity[put.contract_id] == 2 and bank.book.premiums_received == premiums
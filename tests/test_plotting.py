@@ -0,0 +1,59 @@
+import numpy as np
+
+from plotting import MinMaxDecimator
+
+
+def fill(decimator, series):
+    for row in series:
+        decimator.append(row)
+    return decimator
+
+
+def test_short_series_are_drawn_point_by_point():
+    series = np.random.default_rng(1).normal(size=(6, 2))
+    x, y = fill(MinMaxDecimator(2, max_buckets=8), series).xy()
+    np.testing.assert_array_equal(x, np.arange(1, 7))
+    np.testing.assert_array_equal(y, series)
+
+
+def test_full_buckets_merge_pairwise_and_keep_their_extremes():
+    series = np.random.default_rng(2).normal(size=(21, 3))
+    decimator = fill(MinMaxDecimator(3, max_buckets=8), series)
+    # 21 points overflow 8 buckets twice, leaving buckets of 4 points
+    assert decimator.bucket_size == 4
+    buckets = [series[start:start + 4] for start in range(0, 21, 4)]
+    np.testing.assert_array_equal(decimator.mins[:6], [bucket.min(axis=0) for bucket in buckets])
+    np.testing.assert_array_equal(decimator.maxs[:6], [bucket.max(axis=0) for bucket in buckets])
+
+    x, y = decimator.xy()
+    assert y.min() == decimator.low == series.min()
+    assert y.max() == decimator.high == series.max()
+    np.testing.assert_array_equal(y.min(axis=0), series.min(axis=0))
+    np.testing.assert_array_equal(y.max(axis=0), series.max(axis=0))
+    # Bucket centres in day numbers, the last bucket holds only day 21
+    np.testing.assert_array_equal(x, np.repeat([2.5, 6.5, 10.5, 14.5, 18.5, 21.0], 2))
+
+
+def test_odd_bucket_counts_are_rounded_down():
+    decimator = fill(MinMaxDecimator(1, max_buckets=5), np.arange(9.0)[:, None])
+    assert decimator.max_buckets == 4 and decimator.bucket_size == 4
+    x, y = decimator.xy()
+    np.testing.assert_array_equal(x, np.repeat([2.5, 6.5, 9.0], 2))
+    np.testing.assert_array_equal(y[:, 0], [0, 3, 4, 7, 8, 8])
+
+
+def test_ranges_span_their_bucket():
+    decimator = MinMaxDecimator(2, max_buckets=4)
+    decimator.append([10.0, 20.0], lows=[9.0, 18.0], highs=[12.0, 21.0])
+    decimator.append([11.0, 19.0], lows=[10.0, 17.0], highs=[11.5, 19.5])
+    x, y = decimator.xy()
+    np.testing.assert_array_equal(x, [1, 1, 2, 2])
+    np.testing.assert_array_equal(y, [[9, 18], [12, 21], [10, 17], [11.5, 19.5]])
+
+    for _ in range(3):
+        decimator.append([11.0, 19.0])
+    x, y = decimator.xy()
+    # Five points in buckets of two, the last one alone
+    np.testing.assert_array_equal(x, [1.5, 1.5, 3.5, 3.5, 5, 5])
+    np.testing.assert_array_equal(y[:2], [[9, 17], [12, 21]])
+    assert decimator.low == 9 and decimator.high == 21
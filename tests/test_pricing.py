@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from derivatives import Call, Put, black_scholes_prices
+
+
+def test_black_scholes_golden_values():
+    # Hull, Options, Futures and Other Derivatives: S = K = 100, T = 1, sigma = 0.2, r = 0.05
+    call, put = black_scholes_prices(100, 100, 1, 0.2, 0.05, [True, False])
+    assert call == pytest.approx(10.4506, abs=1e-4)
+    assert put == pytest.approx(5.5735, abs=1e-4)
+
+
+def test_black_scholes_put_call_parity():
+    rng = np.random.default_rng(1)
+    spot, strike = rng.uniform(50, 150, 2000), rng.uniform(50, 150, 2000)
+    time, vol = rng.uniform(0.01, 2, 2000), rng.uniform(0.05, 0.8, 2000)
+    calls = black_scholes_prices(spot, strike, time, vol, 0.03, True)
+    puts = black_scholes_prices(spot, strike, time, vol, 0.03, False)
+    np.testing.assert_allclose(calls - puts, spot - strike * np.exp(-0.03 * time), atol=1e-9)
+
+
+def test_expired_options_are_worth_their_intrinsic_value():
+    prices = black_scholes_prices([90, 110, 90, 110], 100, 0, 0.3, 0.05, [True, True, False, False])
+    np.testing.assert_allclose(prices, [0, 10, 10, 0])
+
+
+def test_option_objects_price_with_black_scholes():
+    call = Call(underlying_asset='A', strike_price=100, expiration_date=None, underlying_price=100,
+                time_to_expiration=1, volatility=0.2, risk_free_rate=0.05)
+    put = Put(underlying_asset='A', strike_price=100, expiration_date=None, underlying_price=100,
+              time_to_expiration=1, volatility=0.2, risk_free_rate=0.05)
+    assert call.premium == pytest.approx(10.4506, abs=1e-4)
+    assert put.premium == pytest.approx(5.5735, abs=1e-4)
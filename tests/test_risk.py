@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from bank import Bank
+from market import TRADING_DAYS_PER_YEAR, Asset, GBMModel, Market
+from player import Player
+from risk import ScenarioEngine, ScenarioReport
+
+TODAY = date(2024, 1, 2)
+
+
+@pytest.fixture
+def assets():
+    assets = [Asset(name=name, initial_price=price, mean_change_range=(0.98, 1.02), variance_change_range=(0.01, 0.03))
+              for name, price in (("Stock A", 100), ("Stock B", 50))]
+    Market.of(assets, seed=3).update_prices(30)
+    return assets
+
+
+def test_report_reads_var_and_expected_shortfall_off_the_losses():
+    report = ScenarioReport("Test", np.arange(-99.0, 1.0), confidence=0.9, bins=10)
+    assert report.value_at_risk == pytest.approx(89.1)
+    assert report.expected_shortfall == pytest.approx(np.mean(np.arange(90.0, 100.0)))
+    assert report.histogram.sum() == 100 and len(report.bin_edges) == 11
+
+
+def test_expected_shortfall_is_at_least_the_value_at_risk(assets):
+    bank = Bank(name="Bank")
+    bank.today = TODAY
+    player = Player(name="Player", initial_cash=10000, verbose=False)
+    player.buy_stock(assets[0], 5)
+    assert player.buy_option(bank.sell_option('Put', assets[1], TODAY + timedelta(days=5), risk=2), 3)
+
+    engine = ScenarioEngine(assets, seed=1)
+    for holder in (player, bank):
+        report = engine.report(holder, num_paths=5000, num_days=10, today=TODAY, confidence=0.95)
+        assert len(report.pnl) == 5000
+        assert report.value_at_risk <= report.expected_shortfall
+
+
+def test_stock_var_matches_the_lognormal_quantile(assets):
+    drift, volatility, num_days, quantity = 0.05, 0.3, 10, 4
+    engine = ScenarioEngine(assets[:1], model=GBMModel([drift], [volatility]), seed=5, max_bytes=2 ** 20)
+    player = Player(name="Player", initial_cash=10000, verbose=False)
+    player.buy_stock(assets[0], quantity)
+
+    report = engine.report(player, num_paths=200000, num_days=num_days, today=TODAY, confidence=0.99)
+    horizon = num_days / TRADING_DAYS_PER_YEAR
+    worst_return = ((drift - 0.5 * volatility ** 2) * horizon
+                    + volatility * np.sqrt(horizon) * NormalDist().inv_cdf(0.01))
+    expected = -quantity * assets[0].price_history[-1] * np.expm1(worst_return)
+    assert report.value_at_risk == pytest.approx(expected, rel=0.02)
+
+
+def test_fixed_seed_reproduces_the_scenarios(assets):
+    player = Player(name="Player", initial_cash=10000, verbose=False)
+    player.buy_stock(assets[0], 2)
+    player.buy_stock(assets[1], 3)
+    first, second, other = (ScenarioEngine(assets, seed=seed).simulate_pnl(player, 1000, 5, TODAY)
+                            for seed in (7, 7, 8))
+    np.testing.assert_array_equal(first, second)
+    assert not np.array_equal(first, other)
@@ -0,0 +1,121 @@
+import asyncio
+import random
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from bank import Bank
+from main import initialize_assets, initialize_players
+from market import Market
+from server import GameClient, GameServer, run_random_client
+
+
+def make_server(num_days=3, min_players=0, seed=1):
+    rng = random.Random(seed)
+    assets = initialize_assets(3, rng)
+    Market.of(assets, seed=seed)
+    player1, player2 = initialize_players()
+    player1.verbose = player2.verbose = False
+    return GameServer(assets, Bank(name="Bank"), [player1], [player2], num_days=num_days, day_seconds=5.0,
+                      min_players=min_players, start_date=date(2024, 1, 2), seed=seed)
+
+
+def connection():
+    return SimpleNamespace(player=None, topics=set(), ready=False)
+
+
+def test_random_clients_play_a_whole_game():
+    async def play():
+        server = make_server(num_days=3, min_players=3)
+        _, port = await server.start(port=0)
+        try:
+            clients = [asyncio.create_task(run_random_client(f"Client {i}", port=port, seed=i)) for i in range(3)]
+            await asyncio.wait_for(server.run(), 30)
+            return server, await asyncio.wait_for(asyncio.gather(*clients), 30)
+        finally:
+            await server.close()
+
+    server, results = asyncio.run(play())
+    assert server.day == 2
+    names = {"Client 0", "Client 1", "Client 2", "Player 1", "Player 2"}
+    for equity in results:
+        assert set(equity) == names
+        assert equity == results[0]
+    # Every client bought shares on every day
+    for name in ("Client 0", "Client 1", "Client 2"):
+        assert sum(server.players[name].stocks_portfolio.values()) >= 3 * len(server.assets)
+
+
+def test_client_sees_broadcasts_and_replies():
+    async def play():
+        server = make_server(num_days=None)
+        _, port = await server.start(port=0)
+        client = await GameClient.connect(port=port)
+        try:
+            welcome = await client.request({'type': 'join', 'name': "Alice"})
+            subscribed = await client.request({'type': 'subscribe', 'topics': ['prices', 'quotes', 'nonsense']})
+            server.advance_day(0)
+            prices = await client.receive_type('prices')
+            quotes = await client.receive_type('quotes')
+            error = await client.request({'type': 'order', 'kind': 'buy_stock', 'asset': "Nope", 'quantity': 1})
+            return welcome, subscribed, prices, quotes, error
+        finally:
+            await client.close()
+            await server.close()
+
+    welcome, subscribed, prices, quotes, error = asyncio.run(play())
+    assert welcome['type'] == 'welcome' and welcome['cash'] == 1000
+    assert subscribed['topics'] == ['prices', 'quotes']
+    assert prices['day'] == 0 and len(prices['prices']) == 3
+    assert len(quotes['quotes']) == 6
+    assert error['type'] == 'error' and "Nope" in error['message']
+
+
+def test_orders_through_the_protocol():
+    server = make_server(num_days=None)
+    server.advance_day(0)
+    client = connection()
+    with pytest.raises(ValueError):
+        server.handle_message(client, {'type': 'order', 'kind': 'buy_stock', 'asset': "Asset 1", 'quantity': 1})
+    server.handle_message(client, {'type': 'join', 'name': "Bob"})
+    asset = server.assets[0].name
+
+    fill = server.handle_message(client, {'type': 'order', 'kind': 'buy_stock', 'asset': asset, 'quantity': 2})
+    assert fill['type'] == 'fill' and server.players["Bob"].stocks_portfolio[asset] == 2
+    reject = server.handle_message(client, {'type': 'order', 'kind': 'sell_stock', 'asset': asset, 'quantity': 5})
+    assert reject['type'] == 'reject'
+
+    fill = server.handle_message(client, {'type': 'order', 'kind': 'buy_option', 'asset': asset, 'quantity': 1,
+                                          'option_type': 'Put', 'american': True, 'risk': 2})
+    assert fill['type'] == 'fill' and fill['american']
+    portfolio = server.handle_message(client, {'type': 'portfolio'})
+    assert len(portfolio['options']) == 1 and portfolio['options'][0]['quantity'] == 1
+    sold = server.handle_message(client, {'type': 'order', 'kind': 'sell_option', 'asset': asset, 'quantity': 1,
+                                          'option_type': 'Put'})
+    assert sold['quantity'] == 1 and server.players["Bob"].derivatives_portfolio.total_quantity == 0
+
+    with pytest.raises(ValueError):
+        server.handle_message(client, {'type': 'join', 'name': "Carol"})
+    with pytest.raises(ValueError):
+        server.handle_message(client, {'type': 'dance'})
+
+
+def test_oversized_message_gets_an_error_and_closes_the_connection():
+    async def play():
+        server = make_server(num_days=None)
+        _, port = await server.start(port=0)
+        client = await GameClient.connect(port=port)
+        try:
+            await client.request({'type': 'join', 'name': "Alice"})
+            client.writer.write(b'{"type": "portfolio", "padding": "' + b'x' * 2 ** 17 + b'"}\n')
+            await client.writer.drain()
+            error = await client.receive()
+            return error, await client.reader.read(), server.clients
+        finally:
+            await client.close()
+            await server.close()
+
+    error, rest, clients = asyncio.run(play())
+    assert error == {'type': 'error', 'message': "Message too long."}
+    assert rest == b'' and not clients
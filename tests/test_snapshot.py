@@ -0,0 +1,58 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from headless import SimulationConfig, run_headless
+from snapshot import GameSnapshot
+
+
+@pytest.fixture(scope='module')
+def config():
+    return SimulationConfig(num_assets=4, num_players=4, num_days=40, seed=3, snapshot_every=10)
+
+
+@pytest.fixture(scope='module')
+def result(config):
+    return run_headless(config)
+
+
+def test_same_seed_plays_the_same_game(config, result):
+    again = run_headless(config)
+    np.testing.assert_array_equal(again.prices, result.prices)
+    np.testing.assert_array_equal(again.equity, result.equity)
+    np.testing.assert_array_equal(again.bank_pnl, result.bank_pnl)
+
+
+def test_forks_continue_like_the_original(config, result):
+    assert sorted(result.snapshots) == [0, 10, 20, 30, 40]
+    snapshot = result.snapshots[20]
+    first = run_headless(config, snapshot.restore())
+    second = run_headless(config, snapshot.restore())
+    np.testing.assert_array_equal(first.equity, result.equity[20:])
+    np.testing.assert_array_equal(second.equity, result.equity[20:])
+    np.testing.assert_array_equal(first.prices, result.prices)
+
+
+def test_forks_are_independent(config, result):
+    snapshot = result.snapshots[10]
+    changed = snapshot.restore()
+    cash = changed.player("Player 1").cash
+    changed.player("Player 1").cash = cash + 1e6
+    untouched = snapshot.restore()
+    assert untouched.player("Player 1").cash == cash
+    assert changed.bank.book is not untouched.bank.book
+
+
+def test_saved_snapshots_load_and_reject_other_files(config, result, tmp_path):
+    path = tmp_path / "day_10.snapshot"
+    result.snapshots[10].save(path)
+    loaded = GameSnapshot.load(path)
+    assert loaded.day == 10 and loaded.date == result.snapshots[10].date
+    np.testing.assert_array_equal(run_headless(config, loaded.restore()).equity, result.equity[10:])
+
+    other = tmp_path / "other.snapshot"
+    other.write_bytes(pickle.dumps({'not': 'a snapshot'}))
+    with pytest.raises(ValueError):
+        GameSnapshot.load(other)
+
@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from bank import Bank
+from market import Asset, Market
+from player import Player
+from strategies import AgentPopulation, MarketSnapshot, Orders, RandomOptionBuyer, RandomStockBuyer, Strategy
+
+TODAY = date(2024, 1, 2)
+EXPIRY = TODAY + timedelta(days=14)
+
+
+class FixedOrders(Strategy):
+    def __init__(self, orders):
+        self.orders = orders
+
+    def decide(self, snapshot, population, rng):
+        return self.orders
+
+
+@pytest.fixture
+def game():
+    assets = [Asset(name=name, initial_price=price, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+              for name, price in (("Stock A", 100), ("Stock B", 50), ("Stock C", 20))]
+    market = Market.of(assets, seed=8)
+    market.update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = TODAY
+    return market, assets, bank, MarketSnapshot.from_market(market, 30, TODAY)
+
+
+def test_stock_orders_respect_cash_and_holdings(game):
+    market, assets, bank, snapshot = game
+    prices = snapshot.prices
+    population = AgentPopulation("Bots", 3, 3, None, initial_cash=1000)
+    population.positions[:] = [[0, 4, 0], [2, 0, 0], [0, 0, 0]]
+    population.cash[2] = prices[0] + 5  # Covers the first order but not the second
+    quantities = np.array([[1, -6, 2], [-1, 3, 0], [1, 1, 0]])
+
+    assert population.execute_stock_orders(quantities, prices) == 6
+    # Sells are capped at the shares held, buys stop once the cash runs out
+    np.testing.assert_array_equal(population.positions, [[1, 0, 2], [1, 3, 0], [1, 0, 0]])
+    expected = [1000 + 4 * prices[1] - prices[0] - 2 * prices[2] - 15, 1000 + prices[0] - 3 * prices[1] - 10, 0.0]
+    np.testing.assert_allclose(population.cash, expected, atol=1e-9)
+    assert (population.cash >= 0).all()
+
+
+def test_stock_orders_agree_with_players(game):
+    market, assets, bank, snapshot = game
+    rng = np.random.default_rng(3)
+    quantities = rng.integers(0, 4, (5, 3))
+    population = AgentPopulation("Bots", 5, 3, FixedOrders(Orders(quantities)), initial_cash=400)
+    population.step(snapshot, bank, EXPIRY)
+
+    for agent in range(5):
+        player = Player(name=f"Player {agent}", initial_cash=400, verbose=False)
+        for i, asset in enumerate(assets):
+            if quantities[agent, i] and not player.buy_stock(asset, int(quantities[agent, i])):
+                break
+        assert population.cash[agent] == pytest.approx(player.cash)
+        assert population.positions[agent].tolist() == [player.stocks_portfolio.get(asset.name, 0)
+                                                        for asset in assets]
+
+
+def test_option_orders_are_booked_per_agent_within_cash(game):
+    market, assets, bank, snapshot = game
+    orders = Orders(np.zeros((2, 3), dtype=np.int64), option_agents=np.array([0, 1, 1, 0]),
+                    option_assets=np.array([0, 1, 2, 2]), option_is_call=np.array([True, False, True, True]),
+                    option_quantities=np.array([1, 2, 1, 1]), option_risks=np.full(4, 3.0))
+    population = AgentPopulation("Bots", 2, 3, FixedOrders(orders), initial_cash=7)
+    assert population.step(snapshot, bank, EXPIRY) == (0, 4)
+    # Agent 1's puts cost 6 of its 7, so its call is rejected
+    np.testing.assert_allclose(population.cash, [1.0, 1.0])
+    ids = np.flatnonzero(bank.book.open[:bank.book.size])
+    assert bank.book.slot[ids].tolist() == [0, 1, 0] and bank.book.quantity[ids].tolist() == [1, 2, 1]
+
+    # The same option sold to a player has the same strike and premium
+    put = bank.sell_option('Put', assets[1], EXPIRY, risk=3)
+    assert put.strike_price == pytest.approx(bank.book.strike[ids[1]])
+    assert put.premium == pytest.approx(bank.book.premium[ids[1]])
+
+    # Marked at its premium on the day it is bought, an agent's option is worth what it paid
+    np.testing.assert_allclose(population.equity(snapshot, bank), [7.0, 7.0])
+
+
+def test_random_strategies_are_reproducible(game):
+    market, assets, bank, snapshot = game
+    for strategy in (RandomStockBuyer(), RandomOptionBuyer()):
+        first, second = (AgentPopulation("Bots", 50, 3, strategy, seed=4) for _ in range(2))
+        first.step(snapshot, bank, EXPIRY)
+        second.step(snapshot, bank, EXPIRY)
+        np.testing.assert_array_equal(first.cash, second.cash)
+        np.testing.assert_array_equal(first.positions, second.positions)
+        assert (first.cash >= 0).all()
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from bank import Bank
+from derivatives import black_scholes_prices, solve_strikes
+from market import Asset, Market
+
+
+def test_solved_strikes_reach_the_target_premium():
+    target = np.array([1.0, 2.0, 5.0, 1.0])
+    is_call = np.array([True, False, True, False])
+    strikes, premiums = solve_strikes(target, 100, 14 / 365.25, 0.3, 0.025, is_call)
+    np.testing.assert_allclose(premiums, target, rtol=1e-9)
+    np.testing.assert_allclose(black_scholes_prices(100, strikes, 14 / 365.25, 0.3, 0.025, is_call), target, rtol=1e-9)
+    # Calls are struck above and puts below the spot for small premiums
+    assert strikes[0] > 100 and strikes[1] < 100
+
+
+def test_unreachable_call_targets_get_the_lowest_strike():
+    strikes, premiums = solve_strikes(150.0, 100, 0.1, 0.3, 0.025, True)
+    assert strikes < 1e-3 and premiums < 150
+
+
+def test_bank_sells_options_at_the_target_premium():
+    asset = Asset(name="A", initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+    market = Market.of([asset], seed=1)
+    market.update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = date(2024, 1, 2)
+    options = bank.sell_options(['Call', 'Put'], [asset, asset], bank.today + timedelta(days=14), risks=[2, 3])
+    assert [option.premium for option in options] == pytest.approx([2, 3], rel=1e-6)
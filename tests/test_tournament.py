@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from headless import SimulationConfig, run_headless
+from tournament import play_games, run_tournament
+
+
+def test_tournament_is_reproducible_and_matches_single_games():
+    config = SimulationConfig(num_assets=2, num_players=2, num_days=5)
+    first = run_tournament(3, config, seed=11, max_workers=1, games_per_task=2)
+    second = run_tournament(3, config, seed=11, max_workers=1)
+    np.testing.assert_array_equal(first.final_equity, second.final_equity)
+    assert first.final_equity.shape == (3, 2) and first.bank_pnl.shape == (3,)
+
+    config.seed = first.seeds[1]
+    result = run_headless(config)
+    np.testing.assert_allclose(first.final_equity[1], result.equity[-1])
+    assert first.bank_pnl[1] == pytest.approx(result.bank_pnl[-1])
+
+
+def test_tournament_games_write_no_output_files(tmp_path):
+    config = SimulationConfig(num_assets=2, num_players=2, num_days=3, event_log_path=str(tmp_path / "log"),
+                              history_path=str(tmp_path / "history"), snapshot_every=1,
+                              snapshot_path=str(tmp_path / "snapshots"))
+    play_games(config, [1, 2])
+    assert list(tmp_path.iterdir()) == []
+    assert config.event_log_path == str(tmp_path / "log")
+
+
+def test_tournament_needs_at_least_one_day():
+    with pytest.raises(ValueError):
+        run_tournament(2, SimulationConfig(num_days=0), seed=1, max_workers=1)
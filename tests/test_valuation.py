@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from bank import Bank
+from derivatives import option_prices
+from market import Asset, Market
+from player import Player
+from valuation import ValuationEngine
+
+TODAY = date(2024, 1, 2)
+
+
+@pytest.fixture
+def game():
+    assets = [Asset(name=name, initial_price=price, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+              for name, price in (("Stock A", 100), ("Stock B", 50))]
+    market = Market.of(assets, seed=6)
+    market.update_prices(30)
+    bank = Bank(name="Bank")
+    bank.today = TODAY
+    players = [Player(name=f"Player {i}", initial_cash=5000, verbose=False) for i in range(3)]
+    return market, assets, bank, players
+
+
+def test_equity_of_stock_holders_is_their_portfolio_value(game):
+    market, assets, bank, players = game
+    players[0].buy_stock(assets[0], 4)
+    players[1].buy_stock(assets[1], 7)
+    players[1].buy_stock(assets[0], 1)
+    engine = ValuationEngine(assets, players)
+    for _ in range(3):
+        expected = [player.calculate_portfolio_value(assets) for player in players]
+        np.testing.assert_allclose(engine.equities(TODAY), expected)
+        assert engine.equity(players[1], TODAY) == pytest.approx(expected[1])
+        market.update_prices()
+
+
+def test_options_are_marked_to_model(game):
+    market, assets, bank, players = game
+    call = bank.sell_option('Call', assets[0], TODAY + timedelta(days=10), risk=2)
+    put = bank.sell_option('Put', assets[1], TODAY + timedelta(days=20), risk=2, american=True)
+    assert players[0].buy_option(call, 2) and players[2].buy_option(put, 3)
+    engine = ValuationEngine(assets, players, risk_free_rate=bank.risk_free_rate)
+
+    def mark(option, asset, days):
+        return option_prices(asset.price_history[-1], option.strike_price, days / 365.25, asset.volatility,
+                             bank.risk_free_rate, option.is_call, option.american)
+
+    expected = [players[0].calculate_portfolio_value(assets) + 2 * mark(call, assets[0], 10),
+                players[1].calculate_portfolio_value(assets),
+                players[2].calculate_portfolio_value(assets) + 3 * mark(put, assets[1], 20)]
+    np.testing.assert_allclose(engine.equities(TODAY), expected)
+
+
+def test_values_are_cached_per_tick_and_refreshed_on_changes(game):
+    market, assets, bank, players = game
+    players[0].buy_stock(assets[0], 2)
+    engine = ValuationEngine(assets, players)
+    values = engine._values(TODAY)
+    assert engine._values(TODAY) is values
+
+    # New holdings, a new day of prices and a new date each invalidate the cache
+    players[2].buy_stock(assets[1], 3)
+    refreshed = engine._values(TODAY)
+    assert refreshed is not values and refreshed[2] == pytest.approx(3 * assets[1].price_history[-1])
+    assert engine._values(TODAY) is refreshed
+    market.update_prices()
+    moved = engine._values(TODAY)
+    assert moved is not refreshed and moved[0] == pytest.approx(2 * assets[0].price_history[-1])
+    assert engine._values(TODAY + timedelta(days=1)) is not moved
+
+    # Players added later get their own row
+    late = Player(name="Late", initial_cash=100, verbose=False)
+    engine.add_player(late)
+    assert engine.equity(late, TODAY) == pytest.approx(100)
@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+import pytest
+
+from market import TRADING_DAYS_PER_YEAR, Asset, EWMAVolatility, Market, RollingVolatility, WelfordVolatility
+
+
+@pytest.fixture
+def returns():
+    return np.random.default_rng(4).normal(0.001, 0.02, (300, 3))
+
+
+def test_estimators_start_without_a_variance():
+    for estimator in (WelfordVolatility(shape=3), EWMAVolatility(shape=3), RollingVolatility(shape=3)):
+        assert estimator.variance.shape == (3,) and np.isnan(estimator.std).all()
+
+
+def test_welford_matches_the_population_std(returns):
+    estimator = WelfordVolatility(shape=3)
+    for row in returns:
+        estimator.update(row)
+    np.testing.assert_allclose(estimator.mean, returns.mean(axis=0))
+    np.testing.assert_allclose(estimator.std, np.std(returns, axis=0))
+
+
+def test_ewma_matches_the_explicit_weights(returns):
+    decay = 0.94
+    estimator = EWMAVolatility(decay=decay, shape=3)
+    for row in returns:
+        estimator.update(row)
+    # The first squared return seeds the variance and keeps the weight left over by the later ones
+    weights = (1 - decay) * decay ** np.arange(len(returns) - 1, -1, -1.0)
+    weights[0] = decay ** (len(returns) - 1)
+    np.testing.assert_allclose(estimator.variance, weights @ np.square(returns))
+    assert weights.sum() == pytest.approx(1.0)
+
+
+def test_rolling_matches_the_std_of_the_window(returns):
+    estimator = RollingVolatility(window=20, shape=3)
+    for i, row in enumerate(returns, 1):
+        estimator.update(row)
+        if i in (5, 20, 137, 300):
+            window = returns[max(0, i - 20):i]
+            np.testing.assert_allclose(estimator.mean, window.mean(axis=0))
+            np.testing.assert_allclose(estimator.std, np.std(window, axis=0), rtol=1e-9)
+
+
+def test_asset_volatility_reads_the_running_estimator():
+    random.seed(2)
+    asset = Asset(name="A", initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+    for _ in range(50):
+        asset.update_price()
+    prices = np.array(asset.price_history)
+    expected = np.std(prices[1:] / prices[:-1] - 1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    assert asset.volatility == pytest.approx(expected)
+
+    assets = [Asset(name=name, initial_price=100, mean_change_range=(0.99, 1.01), variance_change_range=(0.01, 0.02))
+              for name in "AB"]
+    market = Market.of(assets, seed=2)
+    market.update_prices(40)
+    prices = np.array(assets[1].price_history)
+    expected = np.std(prices[1:] / prices[:-1] - 1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    assert assets[1].volatility == pytest.approx(expected)
@@ -0,0 +1,126 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from headless import SimulationConfig, run_headless
+
+# Files and directories a game writes to, which tournament games do not write
+OUTPUT_PATHS = ('event_log_path', 'history_path', 'render_path', 'snapshot_path', 'metrics_path', 'profile_path')
+
+
+def play_games(config, seeds):
+    """
+    Play a batch of headless games, one per seed.
+
+    Parameters:
+    config (SimulationConfig): Parameters shared by all games, the seed is replaced per game and the OUTPUT_PATHS
+        are cleared.
+    seeds (list): Seeds of the games.
+
+    Returns:
+    numpy.ndarray: Final equity of every player followed by the bank's P&L, shape (games, players + 1).
+    """
+    results = np.empty((len(seeds), config.num_players + 1))
+    for i, seed in enumerate(seeds):
+        game_config = copy.copy(config)
+        game_config.seed = seed
+        # Only the final equities come back, and games in parallel workers would overwrite each other's files
+        for name in OUTPUT_PATHS:
+            setattr(game_config, name, None)
+        result = run_headless(game_config)
+        results[i, :-1] = result.equity[-1]
+        results[i, -1] = result.bank_pnl[-1]
+    return results
+
+
+class TournamentResult:
+    def __init__(self, config, seeds, final_equity, bank_pnl, ruin_level=0.1):
+        self.config = config
+        self.seeds = seeds
+        self.final_equity = final_equity  # Shape (games, players)
+        self.bank_pnl = bank_pnl
+        self.player_names = [f"Player {i+1}" for i in range(config.num_players)]
+        # Same split as the headless game: even-numbered players buy stocks, odd-numbered ones buy options
+        self.strategies = ['stock buyer' if i % 2 == 0 else 'option buyer' for i in range(config.num_players)]
+        self.ruin_level = ruin_level  # A player is ruined when its equity falls below this share of its initial cash
+
+    def statistics(self, equity):
+        return {
+            'mean': float(np.mean(equity)),
+            'q05': float(np.quantile(equity, 0.05)),
+            'median': float(np.median(equity)),
+            'q95': float(np.quantile(equity, 0.95)),
+            'ruin_rate': float(np.mean(equity < self.ruin_level * self.config.initial_cash)),
+        }
+
+    def player_statistics(self):
+        """
+        dict: Mean, quantiles and ruin rate of the final equity of every player.
+        """
+        return {name: self.statistics(self.final_equity[:, i]) for i, name in enumerate(self.player_names)}
+
+    def strategy_statistics(self):
+        """
+        dict: Mean, quantiles and ruin rate of the final equity, pooled over the players of each strategy.
+        """
+        strategies = np.array(self.strategies)
+        return {strategy: self.statistics(self.final_equity[:, strategies == strategy])
+                for strategy in dict.fromkeys(self.strategies)}
+
+    def print_info(self):
+        print(f"{len(self.seeds)} games of {self.config.num_days} days:")
+        for name, stats in list(self.player_statistics().items()) + list(self.strategy_statistics().items()):
+            print(f"{name}: mean {stats['mean']:.2f}, 5% {stats['q05']:.2f}, median {stats['median']:.2f}, "
+                  f"95% {stats['q95']:.2f}, ruin rate {stats['ruin_rate']:.1%}")
+        print(f"Bank P&L: mean {self.bank_pnl.mean():.2f}")
+
+
+def run_tournament(num_games, config=None, seed=None, max_workers=None, games_per_task=None, ruin_level=0.1):
+    """
+    Play many independent seeded games in parallel processes.
+
+    Every game gets its own seed spawned from one SeedSequence, so the games use independent random streams and the
+    whole tournament is reproducible from its seed. Games are sent to the workers in batches and come back as
+    compact arrays of final equities.
+
+    Parameters:
+    num_games (int): Number of games to play.
+    config (SimulationConfig): Parameters of every game, defaults to SimulationConfig(). Games write none of the
+        OUTPUT_PATHS.
+    seed (int): Seed of the tournament.
+    max_workers (int): Number of worker processes, defaults to the number of CPUs. 1 plays in this process.
+    games_per_task (int): Games per batch sent to a worker, by default about four batches per worker.
+    ruin_level (float): Share of the initial cash below which a player counts as ruined.
+
+    Returns:
+    TournamentResult: Final equities and their statistics.
+    """
+    config = config if config is not None else SimulationConfig()
+    if config.num_days < 1:
+        raise ValueError("Tournament games need at least one day to report a final equity.")
+    seeds = [int(child.generate_state(1, dtype=np.uint64)[0])
+             for child in np.random.SeedSequence(seed).spawn(num_games)]
+    max_workers = max_workers or os.cpu_count() or 1
+    games_per_task = games_per_task or max(1, -(-num_games // (4 * max_workers)))
+    batches = [seeds[i:i + games_per_task] for i in range(0, num_games, games_per_task)]
+
+    if max_workers == 1:
+        results = [play_games(config, batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(play_games, [config] * len(batches), batches))
+
+    results = np.concatenate(results)
+    return TournamentResult(config, seeds, results[:, :-1], results[:, -1], ruin_level)
+
+
+# Example usage:
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    tournament = run_tournament(64, SimulationConfig(num_assets=5, num_players=4, num_days=60), seed=2024)
+    tournament.print_info()
+    print(f"Played in {time.perf_counter() - start:.2f}s")
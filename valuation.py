@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import numpy as np
+
+from derivatives import option_prices
+
+
+class ValuationEngine:
+    """
+    Mark-to-market valuation of all players at once.
+
+    Stock holdings are kept in a (players x assets) position matrix, so every player's stock value is one
+    matrix-vector product with the last prices. Option holdings are marked to the Black-Scholes model in one
+    vectorized pass. Results are cached per tick (date and market day), and a player's row is only rebuilt after
+    its holdings changed.
+    """
+    def __init__(self, assets, players=(), risk_free_rate=0.025):
+        self.assets = list(assets)
+        self.asset_index = {asset.name: i for i, asset in enumerate(self.assets)}
+        self.risk_free_rate = risk_free_rate
+        self.players = []
+        self.player_index = {}  # id(player) -> row
+        self.positions = np.zeros((0, len(self.assets)))
+        self._options = []  # Per player: asset index, strike, expiry ordinal, is_call, quantity and american arrays
+        self._versions = []
+        self._all_options = None
+        self._tick = None
+        self._holdings_values = np.zeros(0)
+        for player in players:
+            self.add_player(player)
+
+    def add_player(self, player):
+        self.player_index[id(player)] = len(self.players)
+        self.players.append(player)
+        self.positions = np.vstack([self.positions, np.zeros(len(self.assets))])
+        self._options.append(None)
+        self._versions.append(None)
+        self._tick = None
+
+    def equity(self, player, today=None):
+        """
+        Total value of a player: cash, stocks at their last price and options marked to model.
+
+        Parameters:
+        player (Player): Player to value.
+        today (datetime.date): Current date of the game, defaults to today.
+
+        Returns:
+        float: Value of the player's portfolio.
+        """
+        row = self.player_index[id(player)]
+        return float(player.cash + self._values(today)[row])
+
+    def equities(self, today=None):
+        """
+        numpy.ndarray: Total value of every player, in the order they were added.
+        """
+        cash = np.array([player.cash for player in self.players], dtype=float)
+        return cash + self._values(today)
+
+    def _values(self, today):
+        today = today if today is not None else datetime.now().date()
+        tick = (today, self._price_tick())
+        stale = [row for row, player in enumerate(self.players) if self._versions[row] != player.holdings_version]
+        if tick == self._tick and not stale:
+            return self._holdings_values
+
+        for row in stale:
+            self._refresh(row)
+        if stale:
+            self._all_options = None
+
+        prices = np.array([asset.price_history[-1] for asset in self.assets], dtype=float)
+        values = self.positions @ prices
+
+        options = self._option_arrays()
+        if len(options[0]):
+            player_rows, asset_index, strike, expiry, is_call, quantity, american = options
+            volatilities = np.array([asset.volatility for asset in self.assets], dtype=float)
+            marks = option_prices(prices[asset_index], strike, (expiry - today.toordinal()) / 365.25,
+                                  volatilities[asset_index], self.risk_free_rate, is_call, american)
+            values += np.bincount(player_rows, weights=marks * quantity, minlength=len(self.players))
+
+        self._tick = tick
+        self._holdings_values = values
+        return values
+
+    def _price_tick(self):
+        markets = {id(asset.market) for asset in self.assets}
+        if len(markets) == 1 and self.assets[0].market is not None:
+            return self.assets[0].market.length
+        return tuple(len(asset.price_history) for asset in self.assets)
+
+    def _refresh(self, row):
+        player = self.players[row]
+        self.positions[row] = 0
+        for asset_name, quantity in player.stocks_portfolio.items():
+            self.positions[row, self.asset_index[asset_name]] = quantity
+
+        lots = list(player.derivatives_portfolio.items())
+        self._options[row] = (
+            np.array([self.asset_index[option.underlying_asset] for option, _ in lots], dtype=int),
+            np.array([option.strike_price for option, _ in lots], dtype=float),
+            np.array([option.expiration_date.toordinal() for option, _ in lots], dtype=np.int64),
+            np.array([option.is_call for option, _ in lots], dtype=bool),
+            np.array([quantity for _, quantity in lots], dtype=float),
+            np.array([option.american for option, _ in lots], dtype=bool),
+        )
+        self._versions[row] = player.holdings_version
+
+    def _option_arrays(self):
+        if self._all_options is None:
+            player_rows = np.concatenate([np.full(len(options[0]), row, dtype=int)
+                                          for row, options in enumerate(self._options)] + [np.zeros(0, dtype=int)])
+            columns = [np.concatenate([options[i] for options in self._options]) if self._options else np.zeros(0)
+                       for i in range(6)]
+            self._all_options = (player_rows, *columns)
+        return self._all_options